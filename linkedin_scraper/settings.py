@@ -77,11 +77,18 @@ WSGI_APPLICATION = 'linkedin_scraper.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
-# برای این پروژه به دیتابیس نیازی نداریم، از sqlite پیش‌فرض استفاده می‌کنیم
+# دیتابیس برای نگهداری وضعیت مشترک تسک‌ها بین پروسه‌ها استفاده می‌شود (sqlite پیش‌فرض)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # وضعیت تسک‌ها از چند نخ و چند پروسه در این دیتابیس نوشته می‌شود؛ تراکنش‌های IMMEDIATE
+        # و حالت WAL از خطای "database is locked" جلوگیری می‌کنند
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
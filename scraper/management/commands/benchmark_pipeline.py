@@ -0,0 +1,63 @@
+import json
+import logging
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper.services.benchmark_service import BenchmarkConfig, run_benchmark
+from scraper.services.output_sink_service import parse_output_sinks
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the full scraping pipeline offline against in-process fake Apify and Google Sheets backends "
+        "and reports throughput, per-job latency, peak memory and API call counts."
+    )
+
+    def add_arguments(self, parser):
+        defaults = BenchmarkConfig()
+        for config_field in fields(BenchmarkConfig):
+            option = f"--{config_field.name.replace('_', '-')}"
+            default = getattr(defaults, config_field.name)
+            if isinstance(default, bool):
+                # گزینه‌هایی که به صورت پیش‌فرض فعال هستند با --no-<name> غیرفعال می‌شوند
+                if default:
+                    option = f"--no-{option[2:]}"
+                parser.add_argument(option, dest=config_field.name, default=default,
+                                    action='store_false' if default else 'store_true')
+            elif config_field.name == 'engine':
+                parser.add_argument(option, dest=config_field.name, default=default, choices=['sync', 'async'])
+            else:
+                parser.add_argument(option, dest=config_field.name, default=default, type=type(default))
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+        parser.add_argument('--show-logs', action='store_true', help="Keep the pipeline's INFO logs.")
+
+    def handle(self, *args, **options):
+        config = BenchmarkConfig(**{f.name: options[f.name] for f in fields(BenchmarkConfig)})
+        if config.tasks < 1 or config.concurrent_tasks < 1:
+            raise CommandError("--tasks and --concurrent-tasks must be at least 1.")
+        try:
+            parse_output_sinks(config.output_sinks)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['show_logs']:
+            # لاگ‌های هر شغل زمان اجرا را تحت تأثیر قرار می‌دهند
+            logging.disable(logging.INFO)
+        try:
+            report = run_benchmark(config).as_dict()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Benchmark finished ({report['engine']} engine)"))
+        for key in ('elapsed_seconds', 'rows_written', 'jobs_per_second', 'latency_p50_seconds',
+                    'latency_p99_seconds', 'peak_traced_memory_mb', 'max_rss_mb'):
+            self.stdout.write(f"  {key:<24} {report[key]}")
+        for section in ('api_calls', 'task_statuses', 'stage_totals_seconds'):
+            self.stdout.write(f"  {section}:")
+            for name, value in report[section].items():
+                self.stdout.write(f"    {name:<28} {value}")
@@ -0,0 +1,68 @@
+import logging
+import os
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper.services.scrape_worker_service import ScrapeWorker, default_worker_id
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a scraping worker that claims country/keyword combinations from the database-backed queue "
+        "(TASK_QUEUE_BACKEND=database). Any number of workers can run on any number of hosts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=int(os.environ.get("SCRAPE_WORKER_CONCURRENCY", "3")),
+            help="Combinations processed at the same time by this worker."
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=float,
+            default=float(os.environ.get("SCRAPE_WORKER_VISIBILITY_TIMEOUT", "300")),
+            help="Seconds after which a combination claimed by a worker that stopped heartbeating is reclaimed."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=float(os.environ.get("SCRAPE_WORKER_POLL_INTERVAL", "2")),
+            help="Seconds between queue polls while idle."
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=int(os.environ.get("SCRAPE_WORKER_MAX_ATTEMPTS", "3")),
+            help="Attempts per combination before it is marked as failed."
+        )
+        parser.add_argument('--worker-id', default=None, help="Worker name in task statuses (default: host:pid).")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        from scraper import views
+
+        if views.TASK_STATUS_BACKEND != 'database':
+            raise CommandError("Scrape workers require TASK_STATUS_BACKEND=database.")
+        if views.combination_queue is None:
+            # بدون صف دیتابیسی تسک‌ها در پروسه وب اجرا می‌شوند و ترکیب‌های آن‌ها هرگز در صف قرار نمی‌گیرند
+            raise CommandError("Scrape workers require TASK_QUEUE_BACKEND=database.")
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        worker = ScrapeWorker(
+            worker_id=options['worker_id'] or default_worker_id(),
+            concurrency=options['concurrency'],
+            visibility_timeout=options['visibility_timeout'],
+            poll_interval=options['poll_interval'],
+            max_attempts=options['max_attempts'],
+        )
+
+        def request_stop(signum, frame):
+            # سیگنال دوم پروسه را بدون انتظار برای ترکیب‌های در حال اجرا متوقف می‌کند
+            signal.signal(signum, signal.SIG_DFL)
+            logger.info(f"Worker [{worker.worker_id}]: Received signal {signum}; finishing running combinations.")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        processed = worker.run(exit_when_idle=options['once'])
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker.worker_id} processed {processed} combinations."))
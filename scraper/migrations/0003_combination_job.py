@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0002_pending_job_row'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CombinationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(db_index=True, max_length=64)),
+                ('index', models.PositiveIntegerField()),
+                ('total', models.PositiveIntegerField()),
+                ('country', models.CharField(max_length=255)),
+                ('keyword', models.CharField(max_length=255)),
+                ('incremental', models.BooleanField(default=False)),
+                ('priority', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(default='queued', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=255)),
+                ('claimed_until', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'priority', 'created_at'], name='combination_job_claim'), models.Index(fields=['status', 'claimed_until'], name='combination_job_expiry')],
+                'constraints': [models.UniqueConstraint(fields=('task_id', 'index'), name='unique_combination_job')],
+            },
+        ),
+    ]
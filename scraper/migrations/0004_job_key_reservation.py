@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_combination_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobKeyReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=255)),
+                ('job_key', models.CharField(max_length=512)),
+                ('task_id', models.CharField(db_index=True, max_length=64)),
+                ('owner', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'job_key'), name='unique_job_key_reservation')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0004_job_key_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskWorkerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(max_length=64)),
+                ('worker_id', models.CharField(max_length=255)),
+                ('lease_until', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('task_id', 'worker_id'), name='unique_task_worker_lease')],
+            },
+        ),
+    ]
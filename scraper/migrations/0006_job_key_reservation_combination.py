@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0005_task_worker_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobkeyreservation',
+            name='combination',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobkeyreservation',
+            name='queued',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='jobkeyreservation',
+            index=models.Index(fields=['task_id', 'combination', 'queued'], name='job_key_reservation_release'),
+        ),
+    ]
@@ -0,0 +1,127 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class TaskStatus(models.Model):
+    """
+    وضعیت یک تسک اسکرپینگ که بین تمام پروسه‌های WSGI مشترک است.
+    """
+    task_id = models.CharField(max_length=64, primary_key=True)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # با هر تغییر یک واحد افزایش می‌یابد
+    version = models.PositiveIntegerField(default=0)
+    # تسک‌های تمام شده پس از مدت نگهداری و تسک‌های فعال پس از مدت طولانی بدون تغییر حذف می‌شوند
+    expires_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.task_id} ({self.data.get('status')})"
+
+
+class PendingJobRow(models.Model):
+    """
+    [جدید] checkpoint هر شغل: ردیفی که اطلاعات تماس آن استخراج شده ولی هنوز در شیت ثبت نشده است.
+    پس از ثبت در شیت حذف می‌شود و در ادامه یک تسک ناتمام بدون اسکرپ مجدد دوباره در صف نوشتن قرار می‌گیرد.
+    """
+    task_id = models.CharField(max_length=64, db_index=True)
+    # کلید canonical آگهی (مثلاً linkedin:<id>)
+    job_key = models.CharField(max_length=512)
+    row = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task_id', 'job_key'], name='unique_pending_job_row'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.job_key}"
+
+
+class CombinationJob(models.Model):
+    """
+    [جدید] یک ترکیب کشور/کلیدواژه در صف پایدار کارگرها (manage.py scrape_worker).
+    کارگر ردیف را با یک UPDATE شرطی برای خود claim می‌کند و تا پایان کار claimed_until را جلو می‌برد؛
+    اگر کارگر از کار بیفتد، پس از گذشتن claimed_until ردیف دوباره توسط کارگر دیگری برداشته می‌شود.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
+    task_id = models.CharField(max_length=64, db_index=True)
+    # شماره ترکیب در تسک (از ۱) و تعداد کل ترکیب‌های تسک
+    index = models.PositiveIntegerField()
+    total = models.PositiveIntegerField()
+    country = models.CharField(max_length=255)
+    keyword = models.CharField(max_length=255)
+    incremental = models.BooleanField(default=False)
+    # عدد کمتر یعنی اولویت بالاتر (همان TaskExecutor.PRIORITIES)
+    priority = models.PositiveSmallIntegerField(default=1)
+    status = models.CharField(max_length=16, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    claimed_by = models.CharField(max_length=255, blank=True, default='')
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority', 'created_at'], name='combination_job_claim'),
+            models.Index(fields=['status', 'claimed_until'], name='combination_job_expiry'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['task_id', 'index'], name='unique_combination_job'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}#{self.index} {self.keyword} / {self.country} ({self.status})"
+
+
+class JobKeyReservation(models.Model):
+    """
+    [جدید] رزرو کلید یک آگهی در یک مقصد خروجی (scope) برای کارگرهای صف دیتابیسی.
+    ایندکس لینک‌ها محلی (SQLite) است؛ این جدول مشترک تضمین می‌کند کارگرهای میزبان‌های مختلف که ترکیب‌های
+    یک شیت را همزمان اجرا می‌کنند یک شغل را دو بار پردازش نکنند. با پایان تسک رزروهای آن حذف می‌شوند.
+    """
+    scope = models.CharField(max_length=255)
+    job_key = models.CharField(max_length=512)
+    task_id = models.CharField(max_length=64, db_index=True)
+    # شناسه TaskContext رزروکننده (هر کارگر برای هر تسک یکی دارد)
+    owner = models.CharField(max_length=64)
+    # [جدید] شماره ترکیبی که کلید را رزرو کرده و اینکه ردیف آن در صف نوشتن (و checkpoint) قرار گرفته یا نه؛
+    # رزروهای بدون ردیف با تلاش مجدد یا بازپس‌گیری همان ترکیب آزاد می‌شوند
+    combination = models.PositiveIntegerField(null=True, blank=True)
+    queued = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['task_id', 'combination', 'queued'], name='job_key_reservation_release'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'job_key'], name='unique_job_key_reservation'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.job_key} ({self.task_id})"
+
+
+class TaskWorkerLease(models.Model):
+    """
+    [جدید] کارگری که TaskContext یک تسک (و در نتیجه ردیف‌های ثبت نشده آن) را در دست دارد یا در حال پایان دادن
+    تسک است. تسک فقط وقتی تمام می‌شود که lease زنده دیگری برای آن نمانده باشد؛ کارگر این lease را همراه
+    heartbeat تمدید می‌کند و lease کارگری که از کار افتاده پس از lease_until منقضی می‌شود.
+    """
+    task_id = models.CharField(max_length=64)
+    worker_id = models.CharField(max_length=255)
+    lease_until = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task_id', 'worker_id'], name='unique_task_worker_lease'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} @ {self.worker_id}"
@@ -0,0 +1,107 @@
+import math
+import os
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+
+class ActorRunError(Exception):
+    """
+    [جدید] اجرای یک اکتور Apify شروع نشد، با وضعیت ناموفق پایان یافت یا نتایج آن دریافت نشد.
+    برخلاف نتیجه خالی، یعنی داده‌ای وجود دارد که به دست نیامده است.
+    """
+
+    def __init__(self, message: str, actor_id: Optional[str] = None, run_id: Optional[str] = None,
+                 status: Optional[str] = None):
+        super().__init__(message)
+        self.actor_id = actor_id
+        self.run_id = run_id
+        self.status = status
+
+
+class ActorDeadlineExceeded(ActorRunError):
+    """[جدید] اجرای اکتور در مهلت تعیین شده (timeout اجرا در Apify یا مهلت محلی) تمام نشد."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    خطاهای 4xx درخواست (به جز 408 و 429) با تکرار درست نمی‌شوند؛ بقیه خطاها گذرا فرض می‌شوند.
+    [اصلاح شد] ActorDeadlineExceeded تکرار نمی‌شود: اجرای دوباره با همان مهلت به احتمال زیاد دوباره به مهلت
+    می‌رسد و فقط سهمیه اجرای همزمان و زمان تسک را مصرف می‌کند.
+    """
+    if isinstance(error, ActorDeadlineExceeded):
+        return False
+    status_code = getattr(error, 'status_code', None)
+    if isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in (408, 429):
+        return False
+    return True
+
+
+def as_actor_error(error: Exception, actor_id: str) -> ActorRunError:
+    """خطای دلخواه (مثلاً ApifyApiError یا خطای شبکه) را به ActorRunError تبدیل می‌کند."""
+    if isinstance(error, ActorRunError):
+        return error
+    actor_error = ActorRunError(f"Actor {actor_id} failed: {error}", actor_id=actor_id)
+    actor_error.__cause__ = error
+    return actor_error
+
+
+@dataclass(frozen=True)
+class ActorCallPolicy:
+    """
+    [جدید] مهلت و سیاست تلاش مجدد اجراهای یک اکتور.
+    timeout_secs به عنوان timeout اجرا به Apify داده می‌شود و پس از deadline_grace ثانیه بیشتر، اجرا به صورت
+    محلی رها (abort) می‌شود. تلاش‌های مجدد با backoff نمایی و jitter کامل انجام می‌شوند.
+    """
+    timeout_secs: int
+    retries: int = 2
+    retry_base_delay: float = 2.0
+    retry_max_delay: float = 30.0
+    deadline_grace: float = 30.0
+    # اجرای دوم (hedge) پس از گذشتن صدک ۹۵ زمان اجراهای قبلی، اگر اجرای اول هنوز تمام نشده باشد
+    hedge: bool = False
+    hedge_min_delay: float = 10.0
+
+    @property
+    def local_deadline(self) -> float:
+        """حداکثر مدت (ثانیه) انتظار محلی برای یک اجرا."""
+        return self.timeout_secs + self.deadline_grace
+
+    def retry_delay(self, attempt: int) -> float:
+        """مدت انتظار پیش از تلاش شماره attempt+1 (full jitter)."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+
+    @classmethod
+    def from_env(cls, prefix: str, default_timeout: int, hedge: bool = False) -> "ActorCallPolicy":
+        return cls(
+            timeout_secs=max(1, int(os.environ.get(f"{prefix}_TIMEOUT_SECS", str(default_timeout)))),
+            retries=max(0, int(os.environ.get("APIFY_ACTOR_RETRIES", "2"))),
+            retry_base_delay=float(os.environ.get("APIFY_RETRY_BASE_DELAY", "2")),
+            retry_max_delay=float(os.environ.get("APIFY_RETRY_MAX_DELAY", "30")),
+            deadline_grace=float(os.environ.get("APIFY_DEADLINE_GRACE", "30")),
+            hedge=hedge,
+            hedge_min_delay=float(os.environ.get("APIFY_HEDGE_MIN_DELAY", "10")),
+        )
+
+
+class LatencyTracker:
+    """[جدید] مدت اجراهای موفق اخیر یک اکتور برای محاسبه صدک‌ها (پنجره لغزان)."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """صدک q (بین ۰ و ۱) یا None اگر هنوز نمونه کافی ثبت نشده باشد."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
@@ -0,0 +1,141 @@
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# وضعیت‌های پایانی یک اجرای اکتور در Apify
+TERMINAL_RUN_STATUSES = ('SUCCEEDED', 'FAILED', 'TIMED-OUT', 'ABORTED')
+# رویدادهایی که وب‌هوک پایان اجرا برای آن‌ها فراخوانی می‌شود
+COMPLETION_EVENT_TYPES = ['ACTOR.RUN.SUCCEEDED', 'ACTOR.RUN.FAILED', 'ACTOR.RUN.TIMED_OUT', 'ACTOR.RUN.ABORTED']
+
+
+class ActorRunWaiter:
+    """
+    [جدید] اجراهای اکتوری که منتظر وب‌هوک پایان هستند. به جای یک نخ مسدود برای هر اجرا، برای هر اجرا یک
+    Future نگهداری می‌شود که با رسیدن وب‌هوک (یا بررسی پشتیبان) کامل می‌شود.
+
+    وب‌هوک ممکن است پیش از ثبت اجرا برسد (اجراهای خیلی کوتاه) یا به پروسه دیگری برسد یا گم شود؛
+    بنابراین وب‌هوک‌های زودرس مدتی نگهداری می‌شوند و یک نخ پشتیبان وضعیت اجراهایی را که بیش از
+    fallback_interval ثانیه منتظر مانده‌اند مستقیماً از Apify می‌پرسد.
+    [جدید] Future اجرایی که تا deadline خود تمام نشود با TimeoutError کامل می‌شود.
+    """
+
+    def __init__(self, fallback_interval: float = 60.0, early_ttl: float = 600.0):
+        self.fallback_interval = max(1.0, fallback_interval)
+        self.early_ttl = early_ttl
+        # run_id -> (Future، تابع خواندن وضعیت اجرا از Apify، زمان ثبت، deadline)
+        self._pending: Dict[str, Tuple[Future, Callable[[], dict], float, Optional[float]]] = {}
+        # run_id -> (اجرا، زمان دریافت) برای وب‌هوک‌هایی که پیش از ثبت اجرا رسیده‌اند
+        self._early: Dict[str, Tuple[dict, float]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    def watch(self, run_id: str, fetch_run: Callable[[], dict], deadline: Optional[float] = None) -> Future:
+        """
+        Futureی برمی‌گرداند که با آبجکت اجرا (پس از رسیدن به وضعیت پایانی) کامل می‌شود.
+        deadline (زمان monotonic) حداکثر زمان انتظار است.
+        """
+        future = Future()
+        with self._lock:
+            early = self._early.pop(run_id, None)
+            if early is None:
+                self._pending[run_id] = (future, fetch_run, time.monotonic(), deadline)
+                self._ensure_poller_locked()
+        if deadline is not None:
+            self._wakeup.set()
+        if early is not None:
+            future.set_result(early[0])
+        return future
+
+    def complete(self, run_id: str, run: dict) -> bool:
+        """
+        پایان یک اجرا را (از وب‌هوک) اعلام می‌کند. اگر اجرا در همین پروسه منتظر باشد True برمی‌گرداند.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pending.pop(run_id, None)
+            if entry is None:
+                self._early = {key: value for key, value in self._early.items() if now - value[1] < self.early_ttl}
+                self._early[run_id] = (run, now)
+                return False
+        entry[0].set_result(run)
+        return True
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _ensure_poller_locked(self):
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll_loop, name="apify-webhook-fallback", daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self):
+        while True:
+            with self._lock:
+                deadlines = [entry[3] for entry in self._pending.values() if entry[3] is not None]
+            timeout = self.fallback_interval
+            if deadlines:
+                timeout = min(timeout, max(0.0, min(deadlines) - time.monotonic()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    (run_id, self._pending.pop(run_id)[0]) for run_id, entry in list(self._pending.items())
+                    if entry[3] is not None and now >= entry[3]
+                ]
+                overdue = [
+                    (run_id, fetch_run) for run_id, (_, fetch_run, registered_at, _) in self._pending.items()
+                    if now - registered_at >= self.fallback_interval
+                ]
+                # بررسی بعدی هر اجرا پس از fallback_interval دیگر
+                for run_id, _ in overdue:
+                    future, fetch_run, _, deadline = self._pending[run_id]
+                    self._pending[run_id] = (future, fetch_run, now, deadline)
+            for run_id, future in expired:
+                future.set_exception(TimeoutError(f"Actor run {run_id} did not finish before its deadline."))
+            for run_id, fetch_run in overdue:
+                try:
+                    run = fetch_run() or {}
+                except Exception as e:
+                    logger.error(f"خطا در بررسی وضعیت اجرای {run_id}: {e}")
+                    continue
+                if run.get('status') in TERMINAL_RUN_STATUSES and self.complete(run_id, run):
+                    logger.warning(f"وب‌هوک پایان اجرای {run_id} دریافت نشد؛ پایان اجرا با بررسی پشتیبان تشخیص داده شد.")
+
+
+_shared_waiter: Optional[ActorRunWaiter] = None
+_shared_waiter_lock = threading.Lock()
+
+
+def get_actor_run_waiter() -> ActorRunWaiter:
+    """نمونه مشترک پروسه؛ به صورت تنبل ساخته می‌شود تا تنظیمات پس از load_dotenv خوانده شوند."""
+    global _shared_waiter
+    with _shared_waiter_lock:
+        if _shared_waiter is None:
+            _shared_waiter = ActorRunWaiter(
+                fallback_interval=float(os.environ.get("APIFY_WEBHOOK_FALLBACK_POLL", "60"))
+            )
+        return _shared_waiter
+
+
+def webhook_token() -> str:
+    """
+    توکن احراز هویت وب‌هوک که در آدرس آن قرار می‌گیرد. از APIFY_WEBHOOK_SECRET یا در صورت نبود آن
+    از SECRET_KEY جنگو ساخته می‌شود تا در تمام پروسه‌ها یکسان باشد.
+    """
+    secret = os.environ.get("APIFY_WEBHOOK_SECRET")
+    if not secret:
+        from django.conf import settings
+
+        secret = settings.SECRET_KEY
+    return hmac.new(secret.encode(), b"apify-actor-webhook", hashlib.sha256).hexdigest()
@@ -1,18 +1,85 @@
+import asyncio
+import contextvars
 import logging
+import math
 import os
-from apify_client import ApifyClient
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+from apify_client import ApifyClient, ApifyClientAsync
+
+from .actor_policy_service import (
+    ActorCallPolicy, ActorDeadlineExceeded, ActorRunError, LatencyTracker, as_actor_error, is_retryable,
+)
+from .actor_webhook_service import (
+    COMPLETION_EVENT_TYPES, TERMINAL_RUN_STATUSES, get_actor_run_waiter, webhook_token,
+)
+from .contact_crawl_service import DEFAULT_CRAWL_BUDGET, CrawlBudget
+from .metrics_service import metrics, record_duration, timed
+from .processing_service import normalize_domain
 
 logger = logging.getLogger(__name__)
 
+# [جدید] فاصله بررسی هر اجرا وقتی دو اجرا (اصلی و hedge) همزمان در جریان هستند
+_HEDGE_POLL_SECONDS = 1
+
+
+def _build_policies() -> Dict[str, ActorCallPolicy]:
+    """سیاست اجرای اکتور لینکدین و اکتور اطلاعات تماس از متغیرهای محیطی."""
+    hedge_contacts = os.environ.get("APIFY_CONTACT_HEDGE", "false").lower() in ('true', '1', 't')
+    return {
+        'linkedin': ActorCallPolicy.from_env("APIFY_LINKEDIN", 900),
+        'contact': ActorCallPolicy.from_env("APIFY_CONTACT", 300, hedge=hedge_contacts),
+    }
+
+
 class ApifyService:
     """
     این کلاس مسئولیت تمام تعاملات با Apify را بر عهده دارد.
+    [جدید] هر اجرا مهلت دارد (timeout اجرا در Apify و مهلت محلی)، خطاها پس از تلاش‌های مجدد با jitter به صورت
+    ActorRunError پرتاب می‌شوند و اجراهای اکتور اطلاعات تماس در صورت فعال بودن hedge می‌شوند.
     """
 
-    def __init__(self, api_token: str):
+    # [جدید] سقف اجرای همزمان اکتورها در کل پروسه (مشترک بین همه تسک‌ها و نمونه‌ها)
+    _run_slots = None
+    _run_slots_lock = threading.Lock()
+
+    # [جدید] مدت اجراهای موفق اکتور اطلاعات تماس در پروسه برای زمان‌بندی اجرای hedge
+    _contact_latency = LatencyTracker()
+
+    @classmethod
+    def _get_run_slots(cls) -> threading.BoundedSemaphore:
+        # به صورت تنبل ساخته می‌شود تا مقدار APIFY_MAX_CONCURRENT_RUNS پس از load_dotenv خوانده شود
+        with cls._run_slots_lock:
+            if cls._run_slots is None:
+                limit = max(1, int(os.environ.get("APIFY_MAX_CONCURRENT_RUNS", "10")))
+                cls._run_slots = threading.BoundedSemaphore(limit)
+            return cls._run_slots
+
+    # [جدید] نخ‌های مشترک دریافت دیتاست پس از وب‌هوک پایان اجرا (حالت غیرمسدود)
+    _completion_pool = None
+
+    @classmethod
+    def _get_completion_pool(cls) -> ThreadPoolExecutor:
+        with cls._run_slots_lock:
+            if cls._completion_pool is None:
+                workers = max(1, int(os.environ.get("APIFY_WEBHOOK_FETCH_WORKERS", "4")))
+                cls._completion_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="apify-fetch")
+            return cls._completion_pool
+
+    def __init__(self, api_token: str, client=None):
         if not api_token:
             raise ValueError("Apify API token is required.")
-        self.client = ApifyClient(api_token)
+        # [جدید] با APIFY_LOCAL_STUB به جای Apify از یک شبیه‌ساز محلی استفاده می‌شود (برای آزمایش حالت وب‌هوک)
+        if client is None and os.environ.get("APIFY_LOCAL_STUB", "false").lower() in ('true', '1', 't'):
+            from .apify_stub_service import LocalApifyClient
+            client = LocalApifyClient.get_shared()
+        self.client = client or ApifyClient(api_token)
+        # [جدید] آدرس عمومی endpoint وب‌هوک؛ در صورت تنظیم، اجراها به جای call() با وب‌هوک پایان شروع می‌شوند
+        # و تا پایان اجرا هیچ نخی مسدود نمی‌ماند
+        self.webhook_url = os.environ.get("APIFY_WEBHOOK_URL") or None
 
         # [اصلاح شد] شناسه‌ها از متغیرهای محیطی خوانده می‌شوند
         self.LINKEDIN_ACTOR_ID = os.environ.get("LINKEDIN_ACTOR_ID")
@@ -21,23 +88,464 @@ class ApifyService:
         if not self.LINKEDIN_ACTOR_ID or not self.CONTACT_SCRAPER_ACTOR_ID:
             raise ValueError("Actor IDs (LINKEDIN_ACTOR_ID, CONTACT_SCRAPER_ACTOR_ID) must be set in the .env file.")
 
+        # [جدید] مهلت و سیاست تلاش مجدد هر اکتور
+        self.policies = _build_policies()
+
+
+    @property
+    def uses_webhooks(self) -> bool:
+        return self.webhook_url is not None
+
+    def _policy(self, actor_id: str) -> ActorCallPolicy:
+        return self.policies['linkedin' if actor_id == self.LINKEDIN_ACTOR_ID else 'contact']
 
     def _run_actor(self, actor_id: str, run_input: dict) -> list:
         """
         یک متد عمومی برای اجرای هر اکتور و دریافت نتایج.
+        [اصلاح شد] خطاها دیگر به لیست خالی تبدیل نمی‌شوند: پس از تلاش‌های مجدد ActorRunError
+        (یا ActorDeadlineExceeded) پرتاب می‌شود تا از «نتیجه‌ای پیدا نشد» قابل تشخیص باشند.
         """
-        try:
+        if self.uses_webhooks:
+            return self.start_actor(actor_id, run_input).result()
+
+        policy = self._policy(actor_id)
+        attempt = 1
+        while True:
+            try:
+                return self._run_actor_once(actor_id, run_input, policy)
+            except Exception as e:
+                delay = self._retry_delay_or_raise(actor_id, policy, attempt, e)
+            time.sleep(delay)
+            attempt += 1
+
+    def _run_actor_once(self, actor_id: str, run_input: dict, policy: ActorCallPolicy) -> list:
+        """یک تلاش: اجرا تا پایان موفق (یا deadline) و سپس دریافت آیتم‌های دیتاست."""
+        with self._get_run_slots():
             logger.info(f"در حال اجرای اکتور با شناسه: {actor_id} و ورودی: {run_input}")
-            actor_run = self.client.actor(actor_id).call(run_input=run_input)
-            
-            logger.info(f"در حال دریافت نتایج از دیتاست {actor_run['defaultDatasetId']}...")
-            items = list(self.client.dataset(actor_run['defaultDatasetId']).iterate_items())
-            logger.info(f"تعداد {len(items)} آیتم با موفقیت دریافت شد.")
-            return items
-            
+            with timed(self._actor_stage(actor_id)):
+                run = self._wait_for_successful_run(actor_id, run_input, policy)
+        return self._fetch_items(run)
+
+    def _wait_for_successful_run(self, actor_id: str, run_input: dict, policy: ActorCallPolicy) -> dict:
+        """
+        اجرا را شروع کرده و تا پایان موفق آن منتظر می‌ماند. اجرایی که تا deadline محلی تمام نشود abort شده
+        و ActorDeadlineExceeded پرتاب می‌شود. اگر hedge فعال باشد و اجرا از صدک ۹۵ اجراهای قبلی طولانی‌تر شود،
+        اجرای دوم با همان ورودی شروع می‌شود (فقط اگر سهمیه اجرای همزمان آزاد باشد) و اولین اجرای موفق برنده است.
+        """
+        started = time.monotonic()
+        deadline = started + policy.local_deadline
+        hedge_at = self._hedge_at(actor_id, policy, started)
+        runs = [self._start_run(actor_id, run_input, policy)]
+        run_slots = self._get_run_slots()
+        hedge_slot = False
+        last_error = None
+        try:
+            while runs:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._record_deadline(actor_id)
+                    raise ActorDeadlineExceeded(
+                        f"Actor {actor_id} did not finish within {policy.local_deadline:.0f} seconds.",
+                        actor_id=actor_id, run_id=runs[0]['id'],
+                    )
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None
+                    hedge_slot = run_slots.acquire(blocking=False)
+                    if hedge_slot:
+                        runs.append(self._start_hedge_run(actor_id, run_input, policy, runs[0]))
+
+                wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+                # با دو اجرا هر کدام به نوبت برای مدت کوتاهی بررسی می‌شوند
+                wait_secs = wait_until - now if len(runs) == 1 else min(wait_until - now, _HEDGE_POLL_SECONDS)
+                for actor_run in list(runs):
+                    run = self.client.run(actor_run['id']).wait_for_finish(
+                        wait_secs=max(1, math.ceil(wait_secs))
+                    ) or {}
+                    status = run.get('status')
+                    if status == 'SUCCEEDED':
+                        runs.remove(actor_run)
+                        if actor_id == self.CONTACT_SCRAPER_ACTOR_ID:
+                            self._contact_latency.record(time.monotonic() - started)
+                        return run
+                    if status in TERMINAL_RUN_STATUSES:
+                        runs.remove(actor_run)
+                        last_error = self._run_error(actor_id, run)
+            raise last_error
+        finally:
+            # اجرای بازنده hedge یا اجرایی که مهلت آن تمام شده متوقف می‌شود
+            for actor_run in runs:
+                self._abort_run(actor_run)
+            if hedge_slot:
+                run_slots.release()
+
+    def _start_run(self, actor_id: str, run_input: dict, policy: ActorCallPolicy,
+                   webhooks: Optional[List[dict]] = None) -> dict:
+        """اجرا را با timeout_secs سیاست اکتور (و وب‌هوک‌های داده شده) شروع می‌کند."""
+        options = {'webhooks': webhooks} if webhooks else {}
+        return self.client.actor(actor_id).start(run_input=run_input, timeout_secs=policy.timeout_secs, **options)
+
+    def _start_hedge_run(self, actor_id: str, run_input: dict, policy: ActorCallPolicy, primary_run: dict,
+                         webhooks: Optional[List[dict]] = None) -> dict:
+        logger.warning(f"اجرای {primary_run['id']} از صدک ۹۵ زمان اجراها طولانی‌تر شد؛ شروع اجرای موازی (hedge).")
+        metrics.inc('scraper_actor_hedged_runs_total', labels={'stage': self._actor_stage(actor_id)},
+                    help_text='Second actor runs started because the first one exceeded the p95 latency.')
+        return self._start_run(actor_id, run_input, policy, webhooks)
+
+    def _hedge_at(self, actor_id: str, policy: ActorCallPolicy, started: float) -> Optional[float]:
+        """زمان (monotonic) شروع اجرای hedge یا None اگر hedge غیرفعال یا هنوز نمونه کافی ثبت نشده باشد."""
+        if not policy.hedge or actor_id != self.CONTACT_SCRAPER_ACTOR_ID:
+            return None
+        p95 = self._contact_latency.percentile(0.95)
+        if p95 is None:
+            return None
+        return started + max(policy.hedge_min_delay, p95)
+
+    def _abort_run(self, actor_run: dict):
+        try:
+            self.client.run(actor_run['id']).abort()
+            logger.info(f"اجرای {actor_run['id']} متوقف شد.")
         except Exception as e:
-            logger.error(f"خطا در حین اجرای اکتور {actor_id}: {e}")
-            return []
+            logger.warning(f"خطا در توقف اجرای {actor_run['id']}: {e}")
+
+    def _run_error(self, actor_id: str, run: dict) -> ActorRunError:
+        """خطای متناظر با اجرایی که با وضعیت ناموفق پایان یافته است."""
+        status = run.get('status')
+        error_class = ActorDeadlineExceeded if status == 'TIMED-OUT' else ActorRunError
+        if status == 'TIMED-OUT':
+            self._record_deadline(actor_id)
+        return error_class(
+            f"Actor run {run.get('id')} finished with status {status}.",
+            actor_id=actor_id, run_id=run.get('id'), status=status,
+        )
+
+    def _record_deadline(self, actor_id: str):
+        metrics.inc('scraper_actor_deadline_exceeded_total', labels={'stage': self._actor_stage(actor_id)},
+                    help_text='Actor runs that did not finish before their deadline.')
+
+    def _retry_delay_or_raise(self, actor_id: str, policy: ActorCallPolicy, attempt: int, error: Exception) -> float:
+        """
+        مدت انتظار پیش از تلاش بعدی را برمی‌گرداند؛ اگر تلاش دیگری مجاز نباشد خطا به صورت ActorRunError پرتاب می‌شود.
+        """
+        actor_error = as_actor_error(error, actor_id)
+        if attempt > policy.retries or not is_retryable(error):
+            logger.error(f"خطا در حین اجرای اکتور {actor_id} (پس از {attempt} تلاش): {error}")
+            raise actor_error
+        delay = policy.retry_delay(attempt)
+        logger.warning(
+            f"خطا در حین اجرای اکتور {actor_id} (تلاش {attempt} از {policy.retries + 1}): {error}؛ "
+            f"تلاش مجدد پس از {delay:.1f} ثانیه."
+        )
+        metrics.inc('scraper_actor_retries_total', labels={'stage': self._actor_stage(actor_id)},
+                    help_text='Actor runs retried after an error.')
+        return delay
+
+    def _fetch_items(self, run: dict) -> list:
+        logger.info(f"در حال دریافت نتایج از دیتاست {run['defaultDatasetId']}...")
+        with timed('apify_dataset_fetch'):
+            items = list(self.client.dataset(run['defaultDatasetId']).iterate_items())
+        logger.info(f"تعداد {len(items)} آیتم با موفقیت دریافت شد.")
+        return items
+
+    def start_actor(self, actor_id: str, run_input: dict) -> Future:
+        """
+        [جدید] اجرای غیرمسدود: اکتور با وب‌هوک پایان اجرا شروع می‌شود و Futureی از آیتم‌های دیتاست برمی‌گردد.
+        تا پایان اجرا هیچ نخی منتظر نمی‌ماند؛ دیتاست پس از رسیدن وب‌هوک در نخ‌های مشترک دریافت می‌شود.
+        [اصلاح شد] تلاش‌های مجدد با تایمر انجام می‌شوند و خطای نهایی (ActorRunError) از طریق Future می‌رسد.
+        """
+        policy = self._policy(actor_id)
+        items_future = Future()
+        context = contextvars.copy_context()
+
+        def attempt(number: int):
+            try:
+                run_future = self._start_hedged_webhook_run(actor_id, run_input, policy)
+            except Exception as e:
+                retry(number, e)
+                return
+            run_future.add_done_callback(lambda finished: on_finished(number, finished))
+
+        def on_finished(number: int, run_future: Future):
+            try:
+                run = run_future.result()
+            except Exception as e:
+                retry(number, e)
+                return
+            self._get_completion_pool().submit(context.run, fetch_items, number, run)
+
+        def fetch_items(number: int, run: dict):
+            try:
+                items_future.set_result(self._fetch_items(run))
+            except Exception as e:
+                retry(number, e)
+
+        def retry(number: int, error: Exception):
+            try:
+                delay = self._retry_delay_or_raise(actor_id, policy, number, error)
+            except ActorRunError as final_error:
+                items_future.set_exception(final_error)
+                return
+            timer = threading.Timer(delay, context.run, args=(attempt, number + 1))
+            timer.daemon = True
+            timer.start()
+
+        attempt(1)
+        return items_future
+
+    def _start_hedged_webhook_run(self, actor_id: str, run_input: dict, policy: ActorCallPolicy) -> Future:
+        """
+        معادل غیرمسدود _wait_for_successful_run: Futureی از اولین اجرای موفق برمی‌گرداند. اجرای hedge با تایمر
+        شروع می‌شود و اجرای بازنده abort می‌شود. خطای شروع اجرای اول مستقیماً پرتاب می‌شود.
+        """
+        winner = Future()
+        context = contextvars.copy_context()
+        started = time.monotonic()
+        deadline = started + policy.local_deadline
+        active: Dict[str, dict] = {}
+        lock = threading.Lock()
+
+        def launch(blocking: bool, primary_run: Optional[dict] = None) -> bool:
+            webhooks = self._completion_webhooks()
+            if primary_run is None:
+                started_run = self._start_with_webhook(actor_id, run_input, policy, deadline, blocking=blocking)
+            else:
+                started_run = self._start_with_webhook(
+                    actor_id, run_input, policy, deadline, blocking=blocking,
+                    start=lambda: self._start_hedge_run(actor_id, run_input, policy, primary_run, webhooks),
+                )
+            if started_run is None:
+                return False
+            actor_run, run_future = started_run
+            with lock:
+                active[actor_run['id']] = actor_run
+                already_decided = winner.done()
+            if already_decided:
+                self._abort_later(actor_run)
+            run_future.add_done_callback(lambda finished: on_run_finished(actor_run, finished))
+            return True
+
+        def on_run_finished(actor_run: dict, run_future: Future):
+            try:
+                # payload وب‌هوک ممکن است آبجکت کامل اجرا را نداشته باشد
+                run = {**actor_run, **(run_future.result() or {})}
+                error = None if run.get('status') == 'SUCCEEDED' else self._run_error(actor_id, run)
+            except TimeoutError:
+                self._record_deadline(actor_id)
+                self._abort_later(actor_run)
+                error = ActorDeadlineExceeded(
+                    f"Actor {actor_id} did not finish within {policy.local_deadline:.0f} seconds.",
+                    actor_id=actor_id, run_id=actor_run['id'],
+                )
+            except Exception as e:
+                error = e
+
+            with lock:
+                active.pop(actor_run['id'], None)
+                if winner.done() or (error is not None and active):
+                    # اجرای دیگر (hedge) هنوز در جریان است
+                    return
+                losers = list(active.values())
+                active.clear()
+            for loser in losers:
+                self._abort_later(loser)
+            if error is None:
+                if actor_id == self.CONTACT_SCRAPER_ACTOR_ID:
+                    self._contact_latency.record(time.monotonic() - started)
+                winner.set_result(run)
+            else:
+                winner.set_exception(error)
+
+        def hedge():
+            with lock:
+                if winner.done() or not active:
+                    return
+                primary_run = next(iter(active.values()))
+            try:
+                launch(blocking=False, primary_run=primary_run)
+            except Exception as e:
+                logger.warning(f"خطا در شروع اجرای موازی (hedge) اکتور {actor_id}: {e}")
+
+        launch(blocking=True)
+        hedge_at = self._hedge_at(actor_id, policy, started)
+        if hedge_at is not None:
+            timer = threading.Timer(max(0.0, hedge_at - time.monotonic()), context.run, args=(hedge,))
+            timer.daemon = True
+            timer.start()
+        return winner
+
+    def _abort_later(self, actor_run: dict):
+        """توقف اجرا در نخ‌های مشترک تا نخ وب‌هوک یا بررسی پشتیبان مسدود نشود."""
+        self._get_completion_pool().submit(self._abort_run, actor_run)
+
+    def _start_with_webhook(self, actor_id: str, run_input: dict, policy: ActorCallPolicy, deadline: float,
+                            blocking: bool = True, start=None) -> Optional[Tuple[dict, Future]]:
+        """
+        اکتور را با وب‌هوک پایان اجرا شروع می‌کند و (آبجکت اجرا، Future پایان اجرا) را برمی‌گرداند.
+        سهمیه اجرای همزمان تا رسیدن وب‌هوک نگه داشته می‌شود؛ با blocking=False اگر سهمیه آزاد نباشد None برمی‌گردد.
+        [جدید] Future اجرایی که تا deadline (زمان monotonic) تمام نشود با TimeoutError کامل می‌شود.
+        """
+        run_slots = self._get_run_slots()
+        if not run_slots.acquire(blocking=blocking):
+            return None
+        try:
+            if start is None:
+                logger.info(f"در حال شروع اکتور (حالت وب‌هوک) با شناسه: {actor_id} و ورودی: {run_input}")
+                actor_run = self._start_run(actor_id, run_input, policy, self._completion_webhooks())
+            else:
+                actor_run = start()
+        except Exception:
+            run_slots.release()
+            raise
+
+        context = contextvars.copy_context()
+        started = time.perf_counter()
+        run_future = get_actor_run_waiter().watch(
+            actor_run['id'], self.client.run(actor_run['id']).get, deadline=deadline
+        )
+
+        def on_finished(_):
+            run_slots.release()
+            # زمان اجرای اکتور به تسکی که آن را شروع کرده نسبت داده می‌شود
+            context.run(record_duration, self._actor_stage(actor_id), time.perf_counter() - started)
+
+        run_future.add_done_callback(on_finished)
+        return actor_run, run_future
+
+    def _completion_webhooks(self) -> List[dict]:
+        return [{'event_types': COMPLETION_EVENT_TYPES, 'request_url': self._webhook_request_url()}]
+
+    def _webhook_request_url(self) -> str:
+        separator = '&' if '?' in self.webhook_url else '?'
+        return f"{self.webhook_url}{separator}token={webhook_token()}"
+
+    def stream_actor_items(self, actor_id: str, run_input: dict, page_size: int = 25,
+                           poll_interval: float = 5.0) -> Iterator[List[dict]]:
+        """
+        [جدید] اکتور را بدون انتظار برای پایان اجرا شروع می‌کند و آیتم‌های دیتاست پیش‌فرض را
+        در حین اجرا صفحه به صفحه (با offset) برمی‌گرداند. در هر لحظه حداکثر یک صفحه در حافظه است.
+        [اصلاح شد] شروع اجرا با تلاش مجدد انجام می‌شود؛ خطای شروع، خطای دریافت آیتم‌ها، گذشتن از مهلت محلی
+        و پایان ناموفق اجرا پس از صفحه‌های دریافت شده به صورت ActorRunError پرتاب می‌شوند.
+        [اصلاح شد] اگر مصرف‌کننده پیش از پایان آیتم‌ها پیمایش را رها کند (close یا خطا)، اجرا متوقف می‌شود.
+        """
+        policy = self._policy(actor_id)
+        deadline = time.monotonic() + policy.local_deadline
+        attempt = 1
+        while True:
+            try:
+                actor_run, finished = self._start_streaming_run(actor_id, run_input, policy, deadline)
+                break
+            except Exception as e:
+                delay = self._retry_delay_or_raise(actor_id, policy, attempt, e)
+            time.sleep(delay)
+            attempt += 1
+
+        run_client = self.client.run(actor_run['id'])
+
+        dataset_client = self.client.dataset(actor_run['defaultDatasetId'])
+        offset = 0
+        completed = False
+        try:
+            while True:
+                run_was_finished = finished.is_set()
+                with timed('apify_dataset_fetch'):
+                    items = dataset_client.list_items(offset=offset, limit=page_size).items
+                if items:
+                    offset += len(items)
+                    logger.info(f"تعداد {len(items)} آیتم جدید از دیتاست {actor_run['defaultDatasetId']} دریافت شد (مجموع: {offset}).")
+                    yield items
+                    continue
+                if run_was_finished:
+                    break
+                if time.monotonic() >= deadline:
+                    self._record_deadline(actor_id)
+                    raise ActorDeadlineExceeded(
+                        f"Actor {actor_id} did not finish within {policy.local_deadline:.0f} seconds.",
+                        actor_id=actor_id, run_id=actor_run['id'],
+                    )
+                finished.wait(min(poll_interval, max(0.0, deadline - time.monotonic())))
+            completed = True
+        except ActorRunError:
+            raise
+        except Exception as e:
+            logger.error(f"خطا در دریافت آیتم‌های اجرای {actor_run['id']}: {e}")
+            raise as_actor_error(e, actor_id) from e
+        finally:
+            # [اصلاح شد] اجرایی که آیتم‌هایش تا انتها خوانده نشده (مهلت، خطا یا بستن generator) رها نمی‌شود؛
+            # با توقف آن انتظار release_when_finished هم تمام شده و سهمیه اجرای همزمان آزاد می‌شود
+            if not completed:
+                self._abort_run(actor_run)
+
+        run = run_client.get() or {}
+        logger.info(f"تعداد {offset} آیتم به صورت استریم دریافت شد.")
+        # [اصلاح شد] انتظار نخ release_when_finished با رسیدن به مهلت محلی تمام می‌شود و finished را علامت می‌زند؛
+        # اجرایی که هنوز در Apify تمام نشده متوقف و به صورت ActorDeadlineExceeded گزارش می‌شود
+        if run.get('status') not in TERMINAL_RUN_STATUSES:
+            self._record_deadline(actor_id)
+            self._abort_run(actor_run)
+            raise ActorDeadlineExceeded(
+                f"Actor {actor_id} did not finish within {policy.local_deadline:.0f} seconds.",
+                actor_id=actor_id, run_id=actor_run['id'],
+            )
+        if run['status'] != 'SUCCEEDED':
+            logger.warning(f"اجرای {actor_run['id']} با وضعیت {run.get('status')} پایان یافت.")
+            raise self._run_error(actor_id, {**actor_run, **run})
+
+    def _start_streaming_run(self, actor_id: str, run_input: dict, policy: ActorCallPolicy,
+                             deadline: float) -> Tuple[dict, threading.Event]:
+        """
+        اکتور را شروع کرده و (آبجکت اجرا، رویداد پایان اجرا) را برمی‌گرداند.
+        سهمیه اجرای همزمان با پایان اجرا در Apify آزاد می‌شود، نه با مصرف آیتم‌ها؛
+        در غیر این صورت مصرف‌کننده‌ای که خودش منتظر سهمیه است می‌تواند باعث بن‌بست شود.
+        """
+        finished = threading.Event()
+        if self.uses_webhooks:
+            # [جدید] پایان اجرا با وب‌هوک اعلام می‌شود و نخ جداگانه‌ای برای انتظار لازم نیست
+            actor_run, run_future = self._start_with_webhook(actor_id, run_input, policy, deadline)
+            run_future.add_done_callback(lambda _: finished.set())
+            return actor_run, finished
+
+        run_slots = self._get_run_slots()
+        run_slots.acquire()
+        try:
+            logger.info(f"در حال شروع اکتور (حالت استریم) با شناسه: {actor_id} و ورودی: {run_input}")
+            actor_run = self._start_run(actor_id, run_input, policy)
+        except Exception:
+            run_slots.release()
+            raise
+        run_client = self.client.run(actor_run['id'])
+
+        def release_when_finished():
+            try:
+                with timed(self._actor_stage(actor_id)):
+                    run_client.wait_for_finish(wait_secs=max(1, math.ceil(deadline - time.monotonic())))
+            except Exception as e:
+                logger.error(f"خطا در انتظار برای پایان اجرای {actor_run['id']}: {e}")
+            finally:
+                finished.set()
+                run_slots.release()
+
+        # context کپی می‌شود تا زمان اجرای اکتور به تسک جاری نسبت داده شود
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(release_when_finished,),
+            name=f"apify-run-{actor_run['id']}", daemon=True
+        ).start()
+        return actor_run, finished
+
+    def _actor_stage(self, actor_id: str) -> str:
+        """نام مرحله برای زمان‌بندی اجرای یک اکتور."""
+        return 'linkedin_actor_run' if actor_id == self.LINKEDIN_ACTOR_ID else 'contact_actor_run'
+
+    def stream_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "RESIDENTIAL",
+                                    page_size: int = 25) -> Iterator[List[dict]]:
+        """
+        [جدید] نسخه استریم run_linkedin_job_scraper که نتایج را صفحه به صفحه در حین اجرا برمی‌گرداند.
+        """
+        run_input = {
+            "search_url": search_url,
+            "include_company_details": True,
+            "max_results": max_results,
+            "proxy_group": proxy_group.upper()
+        }
+        return self.stream_actor_items(self.LINKEDIN_ACTOR_ID, run_input, page_size=page_size)
 
     def run_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "RESIDENTIAL") -> list:
         """
@@ -52,15 +560,276 @@ class ApifyService:
         }
         return self._run_actor(self.LINKEDIN_ACTOR_ID, run_input)
 
-    def run_contact_detail_scraper(self, website_url: str) -> list:
+    def run_contact_detail_scraper(self, website_url: str, budget: CrawlBudget = DEFAULT_CRAWL_BUDGET) -> list:
         """
         اکتور استخراج اطلاعات تماس از وب‌سایت را اجرا می‌کند (ماژول دوم).
         """
         run_input = {
             "startUrls": [{"url": website_url, "method": "GET"}],
-            "maxDepth": 2,
-            "maxRequests": 5,
+            "maxDepth": budget.max_depth,
+            "maxRequests": budget.max_requests,
             "sameDomain": True,
             "considerChildFrames": True,
         }
         return self._run_actor(self.CONTACT_SCRAPER_ACTOR_ID, run_input)
+
+    def run_contact_detail_scraper_batch(self, website_urls: List[str],
+                                         budget: CrawlBudget = DEFAULT_CRAWL_BUDGET) -> Dict[str, list]:
+        """
+        [جدید] اکتور اطلاعات تماس را یک بار برای چند وب‌سایت اجرا می‌کند و نتایج را
+        بر اساس دامنه (فیلد domain هر آیتم) تفکیک کرده و برمی‌گرداند.
+        [جدید] budget عمق پیمایش و تعداد درخواست هر وب‌سایت را تعیین می‌کند (پیمایش تطبیقی).
+        """
+        run_input, domains = _build_contact_batch_input(website_urls, budget)
+        if not run_input:
+            return {}
+        items = self._run_actor(self.CONTACT_SCRAPER_ACTOR_ID, run_input)
+        return _split_items_by_domain(items, domains)
+
+    def submit_contact_detail_scraper_batch(self, website_urls: List[str],
+                                            budget: CrawlBudget = DEFAULT_CRAWL_BUDGET) -> Future:
+        """
+        [جدید] نسخه غیرمسدود run_contact_detail_scraper_batch برای حالت وب‌هوک: Futureی از نتایج
+        تفکیک شده بر اساس دامنه برمی‌گرداند و هیچ نخی تا پایان اجرا منتظر نمی‌ماند.
+        """
+        result = Future()
+        run_input, domains = _build_contact_batch_input(website_urls, budget)
+        if not run_input:
+            result.set_result({})
+            return result
+
+        def split(items_future: Future):
+            try:
+                result.set_result(_split_items_by_domain(items_future.result(), domains))
+            except Exception as e:
+                result.set_exception(e)
+
+        self.start_actor(self.CONTACT_SCRAPER_ACTOR_ID, run_input).add_done_callback(split)
+        return result
+
+
+class AsyncApifyService:
+    """
+    [جدید] نسخه asyncio از ApifyService بر پایه ApifyClientAsync برای موتور اجرای async.
+    سقف اجرای همزمان اکتورها با ApifyService مشترک است.
+    [اصلاح شد] مهلت‌ها و تلاش‌های مجدد مانند ApifyService هستند؛ اجرای hedge فقط در ApifyService پشتیبانی می‌شود.
+    """
+
+    def __init__(self, api_token: str):
+        if not api_token:
+            raise ValueError("Apify API token is required.")
+        self.client = ApifyClientAsync(api_token)
+
+        self.LINKEDIN_ACTOR_ID = os.environ.get("LINKEDIN_ACTOR_ID")
+        self.CONTACT_SCRAPER_ACTOR_ID = os.environ.get("CONTACT_SCRAPER_ACTOR_ID")
+
+        if not self.LINKEDIN_ACTOR_ID or not self.CONTACT_SCRAPER_ACTOR_ID:
+            raise ValueError("Actor IDs (LINKEDIN_ACTOR_ID, CONTACT_SCRAPER_ACTOR_ID) must be set in the .env file.")
+
+        self.policies = _build_policies()
+
+    @staticmethod
+    async def _acquire_run_slot(poll_interval: float = 0.2) -> threading.BoundedSemaphore:
+        # سمافور بین نخ‌ها مشترک است؛ برای مسدود نکردن event loop به صورت غیرمسدود امتحان می‌شود
+        run_slots = ApifyService._get_run_slots()
+        while not run_slots.acquire(blocking=False):
+            await asyncio.sleep(poll_interval)
+        return run_slots
+
+    async def _run_actor(self, actor_id: str, run_input: dict) -> list:
+        """
+        [اصلاح شد] همان مهلت‌ها و سیاست تلاش مجدد ApifyService؛ خطای نهایی به صورت ActorRunError پرتاب می‌شود.
+        """
+        policy = self._policy(actor_id)
+        attempt = 1
+        while True:
+            try:
+                return await self._run_actor_once(actor_id, run_input, policy)
+            except Exception as e:
+                delay = self._retry_delay_or_raise(actor_id, policy, attempt, e)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _run_actor_once(self, actor_id: str, run_input: dict, policy: ActorCallPolicy) -> list:
+        run_slots = await self._acquire_run_slot()
+        try:
+            logger.info(f"در حال اجرای اکتور (async) با شناسه: {actor_id} و ورودی: {run_input}")
+            with timed(self._actor_stage(actor_id)):
+                run = await self.client.actor(actor_id).call(
+                    run_input=run_input, timeout_secs=policy.timeout_secs,
+                    wait_secs=math.ceil(policy.local_deadline),
+                ) or {}
+            if run.get('status') not in TERMINAL_RUN_STATUSES:
+                await self._abort_run(run)
+                self._record_deadline(actor_id)
+                raise ActorDeadlineExceeded(
+                    f"Actor {actor_id} did not finish within {policy.local_deadline:.0f} seconds.",
+                    actor_id=actor_id, run_id=run.get('id'),
+                )
+            if run['status'] != 'SUCCEEDED':
+                raise self._run_error(actor_id, run)
+        finally:
+            run_slots.release()
+
+        with timed('apify_dataset_fetch'):
+            items = [item async for item in self.client.dataset(run['defaultDatasetId']).iterate_items()]
+        logger.info(f"تعداد {len(items)} آیتم با موفقیت دریافت شد.")
+        return items
+
+    async def _abort_run(self, actor_run: dict):
+        if not actor_run.get('id'):
+            return
+        try:
+            await self.client.run(actor_run['id']).abort()
+            logger.info(f"اجرای {actor_run['id']} متوقف شد.")
+        except Exception as e:
+            logger.warning(f"خطا در توقف اجرای {actor_run['id']}: {e}")
+
+    async def stream_actor_items(self, actor_id: str, run_input: dict, page_size: int = 25,
+                                 poll_interval: float = 5.0) -> AsyncIterator[List[dict]]:
+        """
+        معادل async متد ApifyService.stream_actor_items.
+        [اصلاح شد] با رها شدن پیمایش پیش از پایان آیتم‌ها (aclose، لغو تسک یا خطا) اجرا متوقف و انتظار
+        پایان آن لغو می‌شود، به جای اینکه generator تا پایان اجرا در Apify منتظر بماند.
+        """
+        policy = self._policy(actor_id)
+        deadline = time.monotonic() + policy.local_deadline
+        attempt = 1
+        while True:
+            run_slots = await self._acquire_run_slot()
+            try:
+                logger.info(f"در حال شروع اکتور (async، حالت استریم) با شناسه: {actor_id} و ورودی: {run_input}")
+                actor_run = await self.client.actor(actor_id).start(
+                    run_input=run_input, timeout_secs=policy.timeout_secs
+                )
+                break
+            except Exception as e:
+                run_slots.release()
+                delay = self._retry_delay_or_raise(actor_id, policy, attempt, e)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        run_client = self.client.run(actor_run['id'])
+        finished = asyncio.Event()
+
+        async def release_when_finished():
+            try:
+                with timed(self._actor_stage(actor_id)):
+                    await run_client.wait_for_finish(wait_secs=max(1, math.ceil(deadline - time.monotonic())))
+            except Exception as e:
+                logger.error(f"خطا در انتظار برای پایان اجرای {actor_run['id']}: {e}")
+            finally:
+                finished.set()
+                run_slots.release()
+
+        watcher = asyncio.create_task(release_when_finished())
+
+        dataset_client = self.client.dataset(actor_run['defaultDatasetId'])
+        offset = 0
+        completed = False
+        try:
+            while True:
+                run_was_finished = finished.is_set()
+                with timed('apify_dataset_fetch'):
+                    items = (await dataset_client.list_items(offset=offset, limit=page_size)).items
+                if items:
+                    offset += len(items)
+                    yield items
+                    continue
+                if run_was_finished:
+                    break
+                try:
+                    await asyncio.wait_for(finished.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            completed = True
+        except Exception as e:
+            logger.error(f"خطا در دریافت آیتم‌های اجرای {actor_run['id']}: {e}")
+            raise as_actor_error(e, actor_id) from e
+        finally:
+            if not completed:
+                await self._abort_run(actor_run)
+                watcher.cancel()
+            # asyncio.wait خطای لغو watcher را پرتاب نمی‌کند، ولی لغو تسک جاری را منتقل می‌کند
+            await asyncio.wait([watcher])
+
+        run = await run_client.get() or {}
+        logger.info(f"تعداد {offset} آیتم به صورت استریم دریافت شد.")
+        if run.get('status') not in TERMINAL_RUN_STATUSES:
+            await self._abort_run(actor_run)
+            self._record_deadline(actor_id)
+            raise ActorDeadlineExceeded(
+                f"Actor {actor_id} did not finish within {policy.local_deadline:.0f} seconds.",
+                actor_id=actor_id, run_id=actor_run['id'],
+            )
+        if run['status'] != 'SUCCEEDED':
+            raise self._run_error(actor_id, {**actor_run, **run})
+
+    _actor_stage = ApifyService._actor_stage
+    _policy = ApifyService._policy
+    _retry_delay_or_raise = ApifyService._retry_delay_or_raise
+    _run_error = ApifyService._run_error
+    _record_deadline = ApifyService._record_deadline
+
+    def stream_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "RESIDENTIAL",
+                                    page_size: int = 25) -> AsyncIterator[List[dict]]:
+        run_input = {
+            "search_url": search_url,
+            "include_company_details": True,
+            "max_results": max_results,
+            "proxy_group": proxy_group.upper()
+        }
+        return self.stream_actor_items(self.LINKEDIN_ACTOR_ID, run_input, page_size=page_size)
+
+    async def run_linkedin_job_scraper(self, search_url: str, max_results: int = 100,
+                                       proxy_group: str = "RESIDENTIAL") -> list:
+        run_input = {
+            "search_url": search_url,
+            "include_company_details": True,
+            "max_results": max_results,
+            "proxy_group": proxy_group.upper()
+        }
+        return await self._run_actor(self.LINKEDIN_ACTOR_ID, run_input)
+
+    async def run_contact_detail_scraper_batch(self, website_urls: List[str],
+                                               budget: CrawlBudget = DEFAULT_CRAWL_BUDGET) -> Dict[str, list]:
+        run_input, domains = _build_contact_batch_input(website_urls, budget)
+        if not run_input:
+            return {}
+        items = await self._run_actor(self.CONTACT_SCRAPER_ACTOR_ID, run_input)
+        return _split_items_by_domain(items, domains)
+
+
+def _build_contact_batch_input(website_urls: List[str],
+                               budget: CrawlBudget = DEFAULT_CRAWL_BUDGET) -> Tuple[Optional[dict], Set[str]]:
+    """ورودی اکتور اطلاعات تماس برای چند وب‌سایت (هر دامنه یک بار) و مجموعه دامنه‌ها را می‌سازد."""
+    start_urls = []
+    seen_domains: Set[str] = set()
+    for website_url in website_urls:
+        domain = normalize_domain(website_url)
+        if domain and domain not in seen_domains:
+            seen_domains.add(domain)
+            start_urls.append({"url": website_url, "method": "GET"})
+
+    if not start_urls:
+        return None, seen_domains
+
+    run_input = {
+        "startUrls": start_urls,
+        "maxDepth": budget.max_depth,
+        # سقف درخواست‌ها برای کل اجرا است، پس به ازای هر وب‌سایت budget.max_requests درخواست در نظر گرفته می‌شود
+        "maxRequests": budget.max_requests * len(start_urls),
+        "sameDomain": True,
+        "considerChildFrames": True,
+    }
+    return run_input, seen_domains
+
+
+def _split_items_by_domain(items: List[dict], domains: Set[str]) -> Dict[str, list]:
+    """آیتم‌های دیتاست را بر اساس دامنه نرمال‌شده (فیلد domain) تفکیک می‌کند."""
+    results: Dict[str, list] = {}
+    for item in items:
+        domain = normalize_domain(item.get('domain') or item.get('url'))
+        if domain in domains:
+            results.setdefault(domain, []).append(item)
+    return results
@@ -0,0 +1,234 @@
+import copy
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from .benchmark_service import BenchmarkConfig, SyntheticData
+from .processing_service import normalize_domain
+
+logger = logging.getLogger(__name__)
+
+# رویداد وب‌هوک متناظر با وضعیت پایانی هر اجرا
+_EVENT_TYPES = {
+    'SUCCEEDED': 'ACTOR.RUN.SUCCEEDED',
+    'FAILED': 'ACTOR.RUN.FAILED',
+    'TIMED-OUT': 'ACTOR.RUN.TIMED_OUT',
+    'ABORTED': 'ACTOR.RUN.ABORTED',
+}
+
+
+def post_json(url: str, payload: dict, timeout: float = 10.0):
+    """payload را با یک درخواست POST واقعی به آدرس وب‌هوک ارسال می‌کند."""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+class LocalApifyClient:
+    """
+    [جدید] شبیه‌ساز محلی ApifyClient برای آزمایش حالت وب‌هوک بدون Apify و بدون مصرف اعتبار.
+    هر اجرا پس از run_seconds ثانیه با داده مصنوعی (همان داده‌های بنچمارک) تمام می‌شود و payload وب‌هوک
+    با همان قالب پیش‌فرض Apify به request_url وب‌هوک‌های ثبت شده برای اجرا ارسال می‌شود.
+    زمان‌بندی پایان تمام اجراها با یک نخ انجام می‌شود.
+    [جدید] اجرایی که timeout_secs آن کمتر از run_seconds باشد با وضعیت TIMED-OUT تمام می‌شود و abort پشتیبانی می‌شود.
+    [اصلاح شد] abort هم مانند پایان عادی اجرا وب‌هوک ACTOR.RUN.ABORTED را ارسال می‌کند.
+    """
+
+    _shared: Optional["LocalApifyClient"] = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls) -> "LocalApifyClient":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(run_seconds=float(os.environ.get("APIFY_LOCAL_STUB_RUN_SECONDS", "2")))
+            return cls._shared
+
+    def __init__(self, run_seconds: float = 2.0, post_webhook: Callable[[str, dict], None] = post_json,
+                 data: Optional[SyntheticData] = None):
+        self.run_seconds = run_seconds
+        self.post_webhook = post_webhook
+        self.data = data or SyntheticData(BenchmarkConfig(jobs_per_search=100))
+        self._runs: Dict[str, dict] = {}
+        self._datasets: Dict[str, List[dict]] = {}
+        self._webhooks: Dict[str, List[dict]] = {}
+        self._ids = itertools.count(1)
+        self._schedule = []  # heap: (finish_at, run_id, actor_id, run_input, timed_out)
+        self._condition = threading.Condition()
+        self._scheduler: Optional[threading.Thread] = None
+
+    def actor(self, actor_id: str) -> "_LocalActorClient":
+        return _LocalActorClient(self, actor_id)
+
+    def run(self, run_id: str) -> "_LocalRunClient":
+        return _LocalRunClient(self, run_id)
+
+    def dataset(self, dataset_id: str) -> "_LocalDatasetClient":
+        return _LocalDatasetClient(self, dataset_id)
+
+    def start_run(self, actor_id: str, run_input: dict, webhooks: Optional[List[dict]] = None,
+                  timeout_secs: Optional[float] = None) -> dict:
+        number = next(self._ids)
+        run_seconds = self.run_seconds if timeout_secs is None else min(self.run_seconds, timeout_secs)
+        run = {
+            'id': f"local-run-{number}", 'actId': actor_id, 'status': 'RUNNING',
+            'defaultDatasetId': f"local-dataset-{number}", 'startedAt': datetime.utcnow().isoformat(),
+            'finishedAt': None,
+        }
+        with self._condition:
+            self._runs[run['id']] = run
+            self._datasets[run['defaultDatasetId']] = []
+            self._webhooks[run['id']] = list(webhooks or [])
+            heapq.heappush(self._schedule, (
+                time.monotonic() + run_seconds, run['id'], actor_id, run_input, run_seconds < self.run_seconds
+            ))
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._scheduler_loop, name="apify-stub", daemon=True)
+                self._scheduler.start()
+            self._condition.notify_all()
+            return copy.deepcopy(run)
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        with self._condition:
+            run = self._runs.get(run_id)
+            return copy.deepcopy(run) if run else None
+
+    def wait_for_finish(self, run_id: str, wait_secs: Optional[float] = None) -> Optional[dict]:
+        """[اصلاح شد] مانند ApifyClient برای اجرای ناشناخته None برمی‌گرداند."""
+        with self._condition:
+            if run_id not in self._runs:
+                return None
+            self._condition.wait_for(lambda: self._runs[run_id]['status'] != 'RUNNING', timeout=wait_secs)
+            return copy.deepcopy(self._runs[run_id])
+
+    def abort_run(self, run_id: str) -> Optional[dict]:
+        with self._condition:
+            run = self._runs.get(run_id)
+            if not run:
+                return None
+            webhooks = []
+            if run['status'] == 'RUNNING':
+                run.update(status='ABORTED', finishedAt=datetime.utcnow().isoformat())
+                webhooks = self._webhooks.pop(run_id, [])
+                self._condition.notify_all()
+            payload_run = copy.deepcopy(run)
+        self._post_webhooks(run_id, run['actId'], payload_run, webhooks)
+        return payload_run
+
+    def dataset_items(self, dataset_id: str) -> List[dict]:
+        with self._condition:
+            return list(self._datasets.get(dataset_id, []))
+
+    def _items_for(self, actor_id: str, run_input: dict) -> List[dict]:
+        if 'search_url' in run_input:
+            return self.data.jobs_for(run_input['search_url'], run_input.get('max_results', 10))
+        items = []
+        for start_url in run_input.get('startUrls', []):
+            domain = normalize_domain(start_url.get('url'))
+            if domain:
+                items.extend(self.data.contact_items(domain, run_input.get('maxDepth')))
+        return items
+
+    def _scheduler_loop(self):
+        while True:
+            with self._condition:
+                while not self._schedule or self._schedule[0][0] > time.monotonic():
+                    timeout = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    self._condition.wait(timeout)
+                _, run_id, actor_id, run_input, timed_out = heapq.heappop(self._schedule)
+                if self._runs[run_id]['status'] != 'RUNNING':
+                    # اجرا پیش‌تر abort شده است
+                    continue
+            self._finish(run_id, actor_id, run_input, timed_out)
+
+    def _finish(self, run_id: str, actor_id: str, run_input: dict, timed_out: bool = False):
+        if timed_out:
+            items, status = [], 'TIMED-OUT'
+        else:
+            try:
+                items, status = self._items_for(actor_id, run_input), 'SUCCEEDED'
+            except Exception as e:
+                logger.error(f"خطا در تولید داده مصنوعی برای اجرای {run_id}: {e}")
+                items, status = [], 'FAILED'
+        with self._condition:
+            run = self._runs[run_id]
+            if run['status'] != 'RUNNING':
+                return
+            self._datasets[run['defaultDatasetId']] = items
+            run.update(status=status, finishedAt=datetime.utcnow().isoformat())
+            webhooks = self._webhooks.pop(run_id, [])
+            payload_run = copy.deepcopy(run)
+            self._condition.notify_all()
+        self._post_webhooks(run_id, actor_id, payload_run, webhooks)
+
+    def _post_webhooks(self, run_id: str, actor_id: str, payload_run: dict, webhooks: List[dict]):
+        """وب‌هوک‌های ثبت شده برای رویداد پایان اجرا (بر اساس وضعیت آن) را ارسال می‌کند."""
+        for webhook in webhooks:
+            event_type = _EVENT_TYPES[payload_run['status']]
+            if event_type not in [str(getattr(t, 'value', t)) for t in webhook.get('event_types', [])]:
+                continue
+            payload = {
+                'userId': 'local-stub',
+                'createdAt': datetime.utcnow().isoformat(),
+                'eventType': event_type,
+                'eventData': {'actorId': actor_id, 'actorRunId': run_id},
+                'resource': payload_run,
+            }
+            try:
+                self.post_webhook(webhook['request_url'], payload)
+            except Exception as e:
+                logger.error(f"خطا در ارسال وب‌هوک اجرای {run_id} به {webhook['request_url']}: {e}")
+
+
+class _LocalActorClient:
+    def __init__(self, stub: LocalApifyClient, actor_id: str):
+        self.stub = stub
+        self.actor_id = actor_id
+
+    def start(self, run_input: Optional[dict] = None, webhooks: Optional[List[dict]] = None,
+              timeout_secs: Optional[float] = None, **kwargs) -> dict:
+        return self.stub.start_run(self.actor_id, run_input or {}, webhooks, timeout_secs)
+
+    def call(self, run_input: Optional[dict] = None, timeout_secs: Optional[float] = None,
+             wait_secs: Optional[float] = None, **kwargs) -> dict:
+        run = self.start(run_input=run_input, timeout_secs=timeout_secs)
+        return self.stub.wait_for_finish(run['id'], wait_secs)
+
+
+class _LocalRunClient:
+    def __init__(self, stub: LocalApifyClient, run_id: str):
+        self.stub = stub
+        self.run_id = run_id
+
+    def get(self) -> Optional[dict]:
+        return self.stub.get_run(self.run_id)
+
+    def wait_for_finish(self, wait_secs: Optional[float] = None, **kwargs) -> Optional[dict]:
+        return self.stub.wait_for_finish(self.run_id, wait_secs)
+
+    def abort(self, **kwargs) -> Optional[dict]:
+        return self.stub.abort_run(self.run_id)
+
+
+class _LocalDatasetClient:
+    def __init__(self, stub: LocalApifyClient, dataset_id: str):
+        self.stub = stub
+        self.dataset_id = dataset_id
+
+    def iterate_items(self):
+        yield from self.stub.dataset_items(self.dataset_id)
+
+    def list_items(self, offset: int = 0, limit: Optional[int] = None) -> SimpleNamespace:
+        items = self.stub.dataset_items(self.dataset_id)
+        end = offset + limit if limit else None
+        return SimpleNamespace(items=items[offset:end], offset=offset, count=len(items[offset:end]))
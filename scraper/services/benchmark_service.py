@@ -0,0 +1,467 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import resource
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from .contact_crawl_service import DEFAULT_CRAWL_BUDGET, CrawlBudget
+from .metrics_service import timed
+from .output_sink_service import close_row_stores, parse_output_sinks
+from .processing_service import canonical_job_key, normalize_domain
+from .task_status_service import InMemoryTaskStatusStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BenchmarkConfig:
+    """
+    [جدید] پارامترهای یک اجرای بنچمارک آفلاین. تمام زمان‌ها به ثانیه هستند.
+    """
+    tasks: int = 1
+    concurrent_tasks: int = 1
+    countries: int = 3
+    keywords: int = 2
+    jobs_per_search: int = 10
+    companies: int = 200
+    sheet_rows: int = 0
+    # نسبت مشاغل جستجو که از قبل در شیت وجود دارند
+    existing_ratio: float = 0.0
+    search_latency: float = 0.5
+    page_latency: float = 0.05
+    contact_latency: float = 0.3
+    contact_latency_per_site: float = 0.02
+    contact_failure_rate: float = 0.0
+    # نسبت وب‌سایت‌هایی که ایمیل و تلفن آن‌ها فقط در صفحه‌های داخلی (عمق ۱ به بعد) پیدا می‌شود
+    deep_contact_ratio: float = 0.0
+    # پیمایش تطبیقی اطلاعات تماس (CONTACT_CRAWL_ADAPTIVE)
+    adaptive_crawl: bool = False
+    sheets_read_latency: float = 0.05
+    sheets_append_latency: float = 0.1
+    sheets_failure_rate: float = 0.0
+    # خروجی ردیف‌ها (OUTPUT_SINKS)؛ خروجی‌های محلی در پوشه موقت بنچمارک نوشته می‌شوند
+    output_sinks: str = 'sheets'
+    engine: str = 'sync'
+    seed: int = 42
+    trace_memory: bool = True
+
+
+class BenchmarkRecorder:
+    """زمان ورود هر شغل به پایپ‌لاین و زمان ثبت آن در شیت و تعداد فراخوانی‌های API را نگه می‌دارد."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._emitted_at: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def count(self, call: str, amount: int = 1):
+        with self._lock:
+            self.calls[call] += amount
+
+    def emitted(self, jobs: List[dict]):
+        now = time.perf_counter()
+        with self._lock:
+            for job in jobs:
+                self._emitted_at.setdefault(canonical_job_key(job['job_url']), now)
+
+    def written(self, links: List[str]):
+        now = time.perf_counter()
+        with self._lock:
+            for link in links:
+                emitted_at = self._emitted_at.pop(canonical_job_key(link), None)
+                if emitted_at is not None:
+                    self.latencies.append(now - emitted_at)
+
+
+class SyntheticData:
+    """تولید قطعی (با seed) نتایج جستجو و اطلاعات تماس مصنوعی."""
+
+    def __init__(self, config: BenchmarkConfig):
+        self.config = config
+        self.company_domains = [f"company{i}.example" for i in range(max(1, config.companies))]
+
+    def job_id(self, search_url: str, index: int) -> int:
+        digest = hashlib.sha1(f"{search_url}#{index}".encode()).hexdigest()
+        return 1_000_000_000 + int(digest[:12], 16) % 9_000_000_000
+
+    def jobs_for(self, search_url: str, max_results: int) -> List[dict]:
+        rng = random.Random(f"{self.config.seed}:{search_url}")
+        jobs = []
+        for index in range(min(max_results, self.config.jobs_per_search)):
+            domain = rng.choice(self.company_domains)
+            jobs.append({
+                'job_url': f"https://www.linkedin.com/jobs/view/{self.job_id(search_url, index)}/?trackingId=bench",
+                'title': f"Benchmark job {index}",
+                'company_name': domain.split('.')[0],
+                'company_website': f"https://www.{domain}",
+                'employment_type': 'Full-time',
+                'posted_at': '2024-01-01',
+                'location': {'city': 'Berlin', 'country': 'DE'},
+            })
+        return jobs
+
+    def contact_items(self, domain: str, max_depth: Optional[int] = None) -> List[dict]:
+        if max_depth is not None and max_depth < 1 and self.has_deep_contact(domain):
+            # صفحه اصلی فقط لینک شبکه‌های اجتماعی دارد
+            return [{'domain': domain, 'linkedIns': [f"https://www.linkedin.com/company/{domain.split('.')[0]}"]}]
+        return [{
+            'domain': domain,
+            'emails': [f"info@{domain}", f"jobs@{domain}"],
+            'phones': ["+49 30 123456"],
+            'linkedIns': [f"https://www.linkedin.com/company/{domain.split('.')[0]}"],
+        }]
+
+
+    def has_deep_contact(self, domain: str) -> bool:
+        digest = int(hashlib.sha1(f"{self.config.seed}:{domain}".encode()).hexdigest()[:8], 16)
+        return digest / 0xFFFFFFFF < self.config.deep_contact_ratio
+
+
+class FakeWorksheet:
+    """
+    ورک‌شیت حافظه‌ای. ردیف‌های اولیه فقط با ستون link نگهداری می‌شوند تا شیت‌هایی با صدها هزار ردیف
+    حافظه زیادی مصرف نکنند.
+    """
+
+    def __init__(self, headers: List[str], seeded_links: List[str]):
+        self.id = 0
+        self.headers = list(headers)
+        self.link_position = self.headers.index('link')
+        self.links = list(seeded_links)
+        self.appended_rows = 0
+
+
+class FakeGoogleSheetsService:
+    """جایگزین GoogleSheetsService با تأخیر و نرخ خطای قابل تنظیم."""
+
+    def __init__(self, worksheet: FakeWorksheet, config: BenchmarkConfig, recorder: BenchmarkRecorder,
+                 rng: random.Random):
+        self.worksheet = worksheet
+        self.config = config
+        self.recorder = recorder
+        self._rng = rng
+        self._rng_lock = threading.Lock()
+
+    def _fails(self, rate: float) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < rate
+
+    def get_shared(self, *args, **kwargs) -> "FakeGoogleSheetsService":
+        self.recorder.count('sheets_auth')
+        return self
+
+    def get_worksheet(self, sheet_name: str) -> FakeWorksheet:
+        return self.worksheet
+
+    def get_header_map(self, worksheet: FakeWorksheet) -> dict:
+        self.recorder.count('sheets_read')
+        with timed('sheets_header_read'):
+            time.sleep(self.config.sheets_read_latency)
+        return {header: i + 1 for i, header in enumerate(worksheet.headers)}
+
+    def get_header_map_and_column(self, worksheet: FakeWorksheet, column_name: str, start_row: int = 2):
+        self.recorder.count('sheets_read')
+        with timed('sheets_header_and_link_read'):
+            time.sleep(self.config.sheets_read_latency)
+        header_map = {header: i + 1 for i, header in enumerate(worksheet.headers)}
+        return header_map, worksheet.links[start_row - 2:]
+
+    def get_column_values(self, worksheet: FakeWorksheet, column_index: int) -> set:
+        self.recorder.count('sheets_read')
+        with timed('sheets_link_column_read'):
+            time.sleep(self.config.sheets_read_latency)
+        return set(worksheet.links)
+
+    def append_rows(self, worksheet: FakeWorksheet, rows: List[list]):
+        self.recorder.count('sheets_append')
+        with timed('sheets_append'):
+            time.sleep(self.config.sheets_append_latency)
+            if self._fails(self.config.sheets_failure_rate):
+                raise RuntimeError("Simulated Google Sheets API error.")
+        links = [row[worksheet.link_position] for row in rows]
+        worksheet.links.extend(links)
+        worksheet.appended_rows += len(rows)
+        self.recorder.written(links)
+
+    def append_row(self, worksheet: FakeWorksheet, row_data: list):
+        self.append_rows(worksheet, [row_data])
+
+
+class FakeApifyService:
+    """جایگزین ApifyService با نتایج مصنوعی، تأخیر و نرخ خطای قابل تنظیم."""
+
+    uses_webhooks = False
+
+    def __init__(self, data: SyntheticData, config: BenchmarkConfig, recorder: BenchmarkRecorder,
+                 rng: random.Random):
+        self.data = data
+        self.config = config
+        self.recorder = recorder
+        self._rng = rng
+        self._rng_lock = threading.Lock()
+
+    def __call__(self, api_token: str) -> "FakeApifyService":
+        # views نمونه را با ApifyService(token) می‌سازد
+        return self
+
+    def _contact_latency(self, sites: int) -> float:
+        return self.config.contact_latency + self.config.contact_latency_per_site * sites
+
+    def _contact_fails(self) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.config.contact_failure_rate
+
+    def _contact_results(self, website_urls: List[str], budget: Optional[CrawlBudget]) -> Dict[str, list]:
+        domains = {normalize_domain(url) for url in website_urls} - {''}
+        budget = budget or DEFAULT_CRAWL_BUDGET
+        # سقف درخواست‌ها (صفحه‌های پیمایش شده) به عنوان معیار هزینه اکتور ثبت می‌شود
+        self.recorder.count('contact_request_budget', budget.max_requests * len(domains))
+        return {domain: self.data.contact_items(domain, budget.max_depth) for domain in domains}
+
+    def stream_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "",
+                                    page_size: int = 25):
+        self.recorder.count('linkedin_runs')
+        jobs = self.data.jobs_for(search_url, max_results)
+        with timed('linkedin_actor_run'):
+            time.sleep(self.config.search_latency)
+        for i in range(0, len(jobs), max(1, page_size)):
+            self.recorder.count('dataset_pages')
+            with timed('apify_dataset_fetch'):
+                time.sleep(self.config.page_latency)
+            page = jobs[i:i + page_size]
+            self.recorder.emitted(page)
+            yield page
+
+    def run_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "") -> list:
+        return [job for page in self.stream_linkedin_job_scraper(search_url, max_results, proxy_group, 10 ** 6)
+                for job in page]
+
+    def run_contact_detail_scraper_batch(self, website_urls: List[str],
+                                         budget: Optional[CrawlBudget] = None) -> Dict[str, list]:
+        self.recorder.count('contact_runs')
+        self.recorder.count('contact_sites', len(website_urls))
+        with timed('contact_actor_run'):
+            time.sleep(self._contact_latency(len(website_urls)))
+        if self._contact_fails():
+            raise RuntimeError("Simulated contact actor failure.")
+        return self._contact_results(website_urls, budget)
+
+    def run_contact_detail_scraper(self, website_url: str) -> list:
+        return self.run_contact_detail_scraper_batch([website_url]).get(normalize_domain(website_url), [])
+
+
+class FakeAsyncApifyService(FakeApifyService):
+    """نسخه async جایگزین برای موتور asyncio."""
+
+    async def stream_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "",
+                                          page_size: int = 25):
+        self.recorder.count('linkedin_runs')
+        jobs = self.data.jobs_for(search_url, max_results)
+        with timed('linkedin_actor_run'):
+            await asyncio.sleep(self.config.search_latency)
+        for i in range(0, len(jobs), max(1, page_size)):
+            self.recorder.count('dataset_pages')
+            with timed('apify_dataset_fetch'):
+                await asyncio.sleep(self.config.page_latency)
+            page = jobs[i:i + page_size]
+            self.recorder.emitted(page)
+            yield page
+
+    async def run_linkedin_job_scraper(self, search_url: str, max_results: int = 100, proxy_group: str = "") -> list:
+        return [job async for page in self.stream_linkedin_job_scraper(search_url, max_results, proxy_group, 10 ** 6)
+                for job in page]
+
+    async def run_contact_detail_scraper_batch(self, website_urls: List[str],
+                                               budget: Optional[CrawlBudget] = None) -> Dict[str, list]:
+        self.recorder.count('contact_runs')
+        self.recorder.count('contact_sites', len(website_urls))
+        with timed('contact_actor_run'):
+            await asyncio.sleep(self._contact_latency(len(website_urls)))
+        if self._contact_fails():
+            raise RuntimeError("Simulated contact actor failure.")
+        return self._contact_results(website_urls, budget)
+
+
+@dataclass
+class BenchmarkReport:
+    config: BenchmarkConfig
+    elapsed_seconds: float
+    rows_written: int
+    jobs_per_second: float
+    latency_p50: Optional[float]
+    latency_p99: Optional[float]
+    peak_traced_memory_mb: Optional[float]
+    max_rss_mb: float
+    api_calls: Dict[str, int] = field(default_factory=dict)
+    task_statuses: Dict[str, int] = field(default_factory=dict)
+    stage_totals: Dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            'engine': self.config.engine,
+            'elapsed_seconds': round(self.elapsed_seconds, 3),
+            'rows_written': self.rows_written,
+            'jobs_per_second': round(self.jobs_per_second, 2),
+            'latency_p50_seconds': _round(self.latency_p50),
+            'latency_p99_seconds': _round(self.latency_p99),
+            'peak_traced_memory_mb': _round(self.peak_traced_memory_mb),
+            'max_rss_mb': round(self.max_rss_mb, 1),
+            'api_calls': dict(sorted(self.api_calls.items())),
+            'task_statuses': self.task_statuses,
+            'stage_totals_seconds': {k: round(v, 3) for k, v in sorted(self.stage_totals.items())},
+        }
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[int(percentile) - 1]
+
+
+def run_benchmark(config: BenchmarkConfig) -> BenchmarkReport:
+    """
+    [جدید] کل پایپ‌لاین (views.run_task_for_all_combinations یا نسخه async آن) را با جایگزین‌های حافظه‌ای
+    Apify و Google Sheets و فایل‌های SQLite موقت اجرا می‌کند؛ بدون شبکه و بدون مصرف اعتبار Apify یا سهمیه Sheets.
+    [اصلاح شد] جایگزین‌ها با views.use_pipeline_settings فقط به تسک‌های بنچمارک داده می‌شوند و متغیرهای ماژول views
+    و os.environ تغییر نمی‌کنند.
+    """
+    from .. import views
+
+    rng = random.Random(config.seed)
+    recorder = BenchmarkRecorder()
+    data = SyntheticData(config)
+
+    searches = [
+        (f"Country {c}", f"Keyword {k}") for c in range(max(1, config.countries)) for k in range(max(1, config.keywords))
+    ]
+    seeded_links = [f"https://www.linkedin.com/jobs/view/{9_000_000_000 + i}" for i in range(config.sheet_rows)]
+    # بخشی از نتایج جستجوها از قبل در شیت ثبت شده‌اند تا مسیر حذف تکراری‌ها هم سنجیده شود
+    for country, keyword in searches:
+        search_url = views.build_linkedin_url(keyword=keyword, location_name=country)
+        for job in data.jobs_for(search_url, config.jobs_per_search):
+            if rng.random() < config.existing_ratio:
+                seeded_links.append(job['job_url'])
+    worksheet = FakeWorksheet(views.EXPECTED_HEADERS, seeded_links)
+
+    sheets = FakeGoogleSheetsService(worksheet, config, recorder, random.Random(config.seed + 1))
+    apify_class = FakeAsyncApifyService if config.engine == 'async' else FakeApifyService
+    apify = apify_class(data, config, recorder, random.Random(config.seed + 2))
+    task_store = InMemoryTaskStatusStore(retention=timedelta(hours=1), active_ttl=timedelta(hours=1))
+    runner = views.TASK_RUNNERS[config.engine]
+
+    output_sinks = parse_output_sinks(config.output_sinks)
+    local_sinks = [sink for sink in output_sinks if sink != 'sheets']
+    if 'sheets' in output_sinks and local_sinks and 'sqlite' not in local_sinks:
+        local_sinks.append('sqlite')
+    record_flushed_rows = views.record_flushed_rows
+
+    def record_local_rows(link_index, link_scope, link_position, rows, task_id=None, sheet_rows=True, settings=None):
+        # با خروجی محلی، زمان ثبت هر شغل زمان نوشتن آن در خروجی محلی است
+        recorder.count('output_write')
+        recorder.written([row[link_position] for row in rows])
+        record_flushed_rows(link_index, link_scope, link_position, rows, task_id, sheet_rows, settings)
+
+    with tempfile.TemporaryDirectory(prefix="scraper-benchmark-") as temp_dir:
+        settings = views.default_pipeline_settings()._replace(
+            apify_service_class=apify,
+            async_apify_service_class=apify,
+            sheets_service_class=sheets,
+            task_store=task_store,
+            checkpoint_store=None,
+            environ={
+                "APIFY_API_TOKEN": "benchmark", "GOOGLE_SHEET_ID": "benchmark",
+                "GOOGLE_SERVICE_ACCOUNT_PATH": "benchmark",
+            },
+            search_max_results=config.jobs_per_search,
+            link_index_path=os.path.join(temp_dir, "link_index.sqlite3"),
+            contact_cache_path=os.path.join(temp_dir, "contact_cache.sqlite3"),
+            search_history_path=os.path.join(temp_dir, "search_history.sqlite3"),
+            contact_crawl_adaptive=config.adaptive_crawl,
+            contact_crawl_stats_path=os.path.join(temp_dir, "contact_crawl_stats.sqlite3"),
+            output_sinks=output_sinks,
+            local_output_sinks=local_sinks,
+            output_sink_paths={
+                kind: os.path.join(temp_dir, f"jobs_output.{kind}") for kind in ('jsonl', 'csv', 'sqlite')
+            },
+            sheets_feed_interval=0.2,
+            record_flushed_rows=record_local_rows if local_sinks else record_flushed_rows,
+        )
+        combinations = [{'country': country, 'job': keyword} for country, keyword in searches]
+        task_ids = [f"benchmark-{i + 1}" for i in range(max(1, config.tasks))]
+        for task_id in task_ids:
+            task_store.create(task_id, {'status': 'queued', 'rows_flushed': 0, 'rows_pending': 0,
+                                        'started_at': datetime.utcnow(), 'finished_at': None})
+
+        if config.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        pending = list(task_ids)
+        pending_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with pending_lock:
+                    if not pending:
+                        return
+                    task_id = pending.pop(0)
+                with views.use_pipeline_settings(settings):
+                    runner(task_id, combinations)
+
+        threads = [threading.Thread(target=worker, name=f"benchmark-{i + 1}")
+                   for i in range(max(1, min(config.concurrent_tasks, len(task_ids))))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # ارسال پس‌زمینه به شیت (خارج از زمان پایپ‌لاین) تمام می‌شود تا فایل‌های موقت پیش از حذف بسته شوند
+        views.SheetsFeeder.shutdown_all(drain_timeout=60)
+        close_row_stores()
+
+        peak_traced = None
+        if config.trace_memory:
+            peak_traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+        statuses: Counter = Counter()
+        stage_totals: Counter = Counter()
+        rows_written = 0 if local_sinks else worksheet.appended_rows
+        for task_id in task_ids:
+            info = task_store.get(task_id) or {}
+            statuses[info.get('status', 'missing')] += 1
+            if local_sinks:
+                rows_written += info.get('rows_flushed', 0)
+            for stage, timing in (info.get('timings') or {}).items():
+                stage_totals[stage] += timing['total_seconds']
+
+    return BenchmarkReport(
+        config=config,
+        elapsed_seconds=elapsed,
+        rows_written=rows_written,
+        jobs_per_second=rows_written / elapsed if elapsed else 0.0,
+        latency_p50=_percentile(recorder.latencies, 50),
+        latency_p99=_percentile(recorder.latencies, 99),
+        peak_traced_memory_mb=peak_traced,
+        # ru_maxrss در لینوکس بر حسب کیلوبایت است
+        max_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        api_calls=dict(recorder.calls),
+        task_statuses=dict(statuses),
+        stage_totals=dict(stage_totals),
+    )
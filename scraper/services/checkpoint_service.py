@@ -0,0 +1,53 @@
+import logging
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# حداکثر تعداد پارامترهای یک پرس‌وجو (محدودیت SQLite)
+_DELETE_CHUNK_SIZE = 500
+
+
+class TaskCheckpointStore:
+    """
+    [جدید] checkpoint ردیف‌های هر تسک در دیتابیس Django (مدل PendingJobRow).
+    هر ردیف پس از استخراج اطلاعات تماس ذخیره و پس از ثبت در شیت حذف می‌شود؛ بنابراین پس از راه‌اندازی مجدد
+    پروسه، ردیف‌های باقی‌مانده همان کارهایی هستند که انجام شده ولی هنوز نوشته نشده‌اند.
+    checkpoint ترکیب‌های تمام شده در خود وضعیت تسک (combinations) ثبت می‌شود.
+    """
+
+    def save_row(self, task_id: str, job_key: str, row: list):
+        from ..models import PendingJobRow
+
+        PendingJobRow.objects.update_or_create(task_id=task_id, job_key=job_key, defaults={'row': row})
+
+    def remove_rows(self, task_id: str, job_keys: Iterable[str]):
+        from ..models import PendingJobRow
+
+        job_keys = list(job_keys)
+        for i in range(0, len(job_keys), _DELETE_CHUNK_SIZE):
+            PendingJobRow.objects.filter(task_id=task_id, job_key__in=job_keys[i:i + _DELETE_CHUNK_SIZE]).delete()
+
+    def pending_rows(self, task_id: str) -> List[Tuple[str, list]]:
+        """ردیف‌های ثبت نشده تسک به ترتیب ذخیره: لیستی از (کلید آگهی، ردیف)."""
+        from ..models import PendingJobRow
+
+        return list(PendingJobRow.objects.filter(task_id=task_id).order_by('id').values_list('job_key', 'row'))
+
+    def pending_count(self, task_id: str) -> int:
+        from ..models import PendingJobRow
+
+        return PendingJobRow.objects.filter(task_id=task_id).count()
+
+    def clear(self, task_id: str):
+        from ..models import PendingJobRow
+
+        PendingJobRow.objects.filter(task_id=task_id).delete()
+
+    def purge_orphaned(self) -> int:
+        """ردیف‌های تسک‌هایی را که از مخزن وضعیت حذف شده‌اند پاک می‌کند."""
+        from ..models import PendingJobRow, TaskStatus
+
+        removed, _ = PendingJobRow.objects.exclude(task_id__in=TaskStatus.objects.values('pk')).delete()
+        if removed:
+            logger.info(f"تعداد {removed} ردیف checkpoint مربوط به تسک‌های حذف شده پاک شد.")
+        return removed
@@ -0,0 +1,233 @@
+import logging
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class CombinationQueue:
+    """
+    [جدید] صف پایدار ترکیب‌های کشور/کلیدواژه در دیتابیس Django (مدل CombinationJob) برای کارگرهای
+    manage.py scrape_worker که می‌توانند روی چند میزبان اجرا شوند.
+
+    هر ردیف با یک UPDATE شرطی (یا SELECT ... FOR UPDATE SKIP LOCKED در دیتابیس‌هایی که پشتیبانی می‌کنند)
+    توسط دقیقاً یک کارگر claim می‌شود و تا claimed_until (visibility timeout) متعلق به همان کارگر است.
+    کارگر در حین کار این زمان را جلو می‌برد؛ ردیف کارگری که از کار افتاده پس از انقضا دوباره برداشته می‌شود.
+    """
+
+    def enqueue(self, task_id: str, job_combinations: List[dict], priority: int = 1) -> int:
+        from ..models import CombinationJob
+
+        total = len(job_combinations)
+        CombinationJob.objects.bulk_create([
+            CombinationJob(
+                task_id=task_id, index=index, total=total, country=combo['country'], keyword=combo['job'],
+                incremental=combo.get('incremental', False), priority=priority,
+            )
+            for index, combo in enumerate(job_combinations, start=1)
+        ])
+        return total
+
+    def claim(self, worker_id: str, limit: int, visibility_timeout: float, max_attempts: int) -> list:
+        """
+        حداکثر limit ردیف آماده (در صف یا claim منقضی شده) را به ترتیب اولویت برای worker_id برمی‌دارد.
+        ردیف‌هایی که به max_attempts رسیده‌اند برداشته نمی‌شوند (expire_abandoned).
+        """
+        from ..models import CombinationJob
+
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        claimable = Q(status=CombinationJob.STATUS_QUEUED) | Q(
+            status=CombinationJob.STATUS_RUNNING, claimed_until__lt=now, attempts__lt=max_attempts
+        )
+        claim_fields = {
+            'status': CombinationJob.STATUS_RUNNING,
+            'claimed_by': worker_id,
+            'claimed_until': now + timedelta(seconds=visibility_timeout),
+            'attempts': F('attempts') + 1,
+        }
+        ordered = CombinationJob.objects.filter(claimable).order_by('priority', 'created_at', 'id')
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                claimed_ids = list(ordered.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+                CombinationJob.objects.filter(pk__in=claimed_ids).update(**claim_fields)
+        else:
+            # SQLite: هر ردیف با یک UPDATE شرطی جداگانه گرفته می‌شود؛ اگر کارگر دیگری زودتر آن را گرفته
+            # باشد شرط برقرار نیست و ردیف بعدی امتحان می‌شود
+            claimed_ids = []
+            for job_id in ordered.values_list('id', flat=True)[:limit * 4]:
+                if len(claimed_ids) >= limit:
+                    break
+                if CombinationJob.objects.filter(claimable, pk=job_id).update(**claim_fields):
+                    claimed_ids.append(job_id)
+
+        return list(CombinationJob.objects.filter(pk__in=claimed_ids, claimed_by=worker_id).order_by(
+            'priority', 'created_at', 'id'
+        ))
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], visibility_timeout: float) -> int:
+        """claim ردیف‌های در حال اجرای کارگر را تمدید می‌کند و تعداد ردیف‌هایی را که هنوز متعلق به آن هستند برمی‌گرداند."""
+        from ..models import CombinationJob
+
+        if not job_ids:
+            return 0
+        return CombinationJob.objects.filter(
+            pk__in=job_ids, claimed_by=worker_id, status=CombinationJob.STATUS_RUNNING
+        ).update(claimed_until=timezone.now() + timedelta(seconds=visibility_timeout))
+
+    def hold_task(self, task_id: str, worker_id: str, lease_seconds: float):
+        """
+        [جدید] lease کارگر روی تسک را می‌گیرد یا تمدید می‌کند: این کارگر ردیف‌هایی از تسک در صف نوشتن خود دارد
+        (یا در حال پایان دادن آن است) و کارگر دیگری نباید تسک را تمام کند.
+        """
+        from ..models import TaskWorkerLease
+
+        TaskWorkerLease.objects.update_or_create(
+            task_id=task_id, worker_id=worker_id,
+            defaults={'lease_until': timezone.now() + timedelta(seconds=lease_seconds)},
+        )
+
+    def renew_tasks(self, worker_id: str, task_ids: List[str], lease_seconds: float) -> int:
+        """[جدید] lease کارگر روی تسک‌های داده شده را (همراه heartbeat) تمدید می‌کند."""
+        from ..models import TaskWorkerLease
+
+        if not task_ids:
+            return 0
+        return TaskWorkerLease.objects.filter(task_id__in=task_ids, worker_id=worker_id).update(
+            lease_until=timezone.now() + timedelta(seconds=lease_seconds)
+        )
+
+    def release_task(self, task_id: str, worker_id: str):
+        from ..models import TaskWorkerLease
+
+        TaskWorkerLease.objects.filter(task_id=task_id, worker_id=worker_id).delete()
+
+    def is_held(self, task_id: str, worker_id: Optional[str] = None) -> bool:
+        """[جدید] آیا تسک (توسط worker_id یا اگر None باشد توسط هر کارگری) lease زنده دارد."""
+        from ..models import TaskWorkerLease
+
+        leases = TaskWorkerLease.objects.filter(task_id=task_id, lease_until__gte=timezone.now())
+        if worker_id is not None:
+            leases = leases.filter(worker_id=worker_id)
+        return leases.exists()
+
+    def expire_task_leases(self) -> List[str]:
+        """
+        [جدید] lease‌های منقضی شده (کارگرهایی که حین نگهداری ردیف‌ها یا پایان دادن تسک از کار افتاده‌اند)
+        را حذف کرده و task_id آن‌ها را برمی‌گرداند تا کارگر دیگری تسک را تمام کند.
+        """
+        from ..models import TaskWorkerLease
+
+        now = timezone.now()
+        task_ids = []
+        for lease_id, task_id in TaskWorkerLease.objects.filter(lease_until__lt=now).values_list('id', 'task_id'):
+            deleted, _ = TaskWorkerLease.objects.filter(pk=lease_id, lease_until__lt=now).delete()
+            if deleted and task_id not in task_ids:
+                task_ids.append(task_id)
+        return task_ids
+
+    def complete(self, job, worker_id: str) -> bool:
+        from ..models import CombinationJob
+
+        return bool(CombinationJob.objects.filter(
+            pk=job.pk, claimed_by=worker_id, status=CombinationJob.STATUS_RUNNING
+        ).update(status=CombinationJob.STATUS_COMPLETED, claimed_until=None, error='', finished_at=timezone.now()))
+
+    def fail(self, job, worker_id: str, error: str, max_attempts: int) -> Optional[str]:
+        """
+        اجرای ناموفق یک ردیف را ثبت می‌کند: تا رسیدن به max_attempts ردیف دوباره در صف قرار می‌گیرد.
+        وضعیت جدید ('queued' یا 'failed') یا None (اگر claim دیگر متعلق به این کارگر نباشد) برمی‌گردد.
+        """
+        from ..models import CombinationJob
+
+        if job.attempts < max_attempts:
+            new_status, fields = CombinationJob.STATUS_QUEUED, {'claimed_by': ''}
+        else:
+            new_status, fields = CombinationJob.STATUS_FAILED, {'finished_at': timezone.now()}
+        updated = CombinationJob.objects.filter(
+            pk=job.pk, claimed_by=worker_id, status=CombinationJob.STATUS_RUNNING
+        ).update(status=new_status, claimed_until=None, error=error[:2000], **fields)
+        return new_status if updated else None
+
+    def expire_abandoned(self, max_attempts: int) -> List[Tuple[str, int]]:
+        """
+        ردیف‌هایی را که claim آن‌ها منقضی شده و به max_attempts رسیده‌اند ناموفق علامت می‌زند
+        (کارگرها بارها حین اجرای آن‌ها از کار افتاده‌اند) و (task_id، شماره ترکیب) آن‌ها را برمی‌گرداند.
+        """
+        from ..models import CombinationJob
+
+        now = timezone.now()
+        expired = Q(status=CombinationJob.STATUS_RUNNING, claimed_until__lt=now, attempts__gte=max_attempts)
+        abandoned = []
+        for job_id, task_id, index in CombinationJob.objects.filter(expired).values_list('id', 'task_id', 'index'):
+            if CombinationJob.objects.filter(expired, pk=job_id).update(
+                status=CombinationJob.STATUS_FAILED, claimed_until=None, finished_at=now,
+                error=f"Worker stopped responding {max_attempts} times while running this combination.",
+            ):
+                abandoned.append((task_id, index))
+        return abandoned
+
+    def has_open(self, task_id: str) -> bool:
+        """آیا تسک ترکیبی در صف یا در حال اجرا دارد."""
+        from ..models import CombinationJob
+
+        return CombinationJob.objects.filter(
+            task_id=task_id, status__in=(CombinationJob.STATUS_QUEUED, CombinationJob.STATUS_RUNNING)
+        ).exists()
+
+    def requeue_failed(self, task_id: str) -> int:
+        """ترکیب‌های ناموفق تسک را با شمارنده تلاش صفر دوباره در صف قرار می‌دهد."""
+        from ..models import CombinationJob
+
+        return CombinationJob.objects.filter(task_id=task_id, status=CombinationJob.STATUS_FAILED).update(
+            status=CombinationJob.STATUS_QUEUED, attempts=0, claimed_by='', claimed_until=None,
+            error='', finished_at=None,
+        )
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """جایگاه تسک (از ۱) بین تسک‌هایی که ترکیب در صف دارند، یا None اگر ترکیبی از آن در صف نباشد."""
+        from ..models import CombinationJob
+
+        queued = CombinationJob.objects.filter(status=CombinationJob.STATUS_QUEUED)
+        first = queued.filter(task_id=task_id).order_by('priority', 'created_at').first()
+        if first is None:
+            return None
+        ahead = queued.filter(
+            Q(priority__lt=first.priority) | Q(priority=first.priority, created_at__lt=first.created_at)
+        ).exclude(task_id=task_id).values('task_id').distinct().count()
+        return ahead + 1
+
+    def queued_task_count(self) -> int:
+        from ..models import CombinationJob
+
+        return CombinationJob.objects.filter(
+            status=CombinationJob.STATUS_QUEUED
+        ).values('task_id').distinct().count()
+
+    def stats(self) -> dict:
+        """تعداد ردیف‌ها به تفکیک وضعیت."""
+        from ..models import CombinationJob
+
+        counts = {status: 0 for status in (
+            CombinationJob.STATUS_QUEUED, CombinationJob.STATUS_RUNNING,
+            CombinationJob.STATUS_COMPLETED, CombinationJob.STATUS_FAILED,
+        )}
+        for row in CombinationJob.objects.values('status').annotate(count=Count('id')):
+            counts[row['status']] = row['count']
+        return counts
+
+    def purge_orphaned(self) -> int:
+        """ردیف‌ها (و lease کارگرهای) تسک‌هایی را که از مخزن وضعیت حذف شده‌اند پاک می‌کند."""
+        from ..models import CombinationJob, TaskStatus, TaskWorkerLease
+
+        removed, _ = CombinationJob.objects.exclude(task_id__in=TaskStatus.objects.values('pk')).delete()
+        TaskWorkerLease.objects.exclude(task_id__in=TaskStatus.objects.values('pk')).delete()
+        if removed:
+            logger.info(f"تعداد {removed} ترکیب صف مربوط به تسک‌های حذف شده پاک شد.")
+        return removed
@@ -0,0 +1,158 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ContactCache:
+    """
+    کش ماندگار (SQLite) اطلاعات تماس پردازش شده شرکت‌ها با کلید دامنه نرمال‌شده.
+
+    - هر رکورد پس از ttl ثانیه منقضی می‌شود؛ نتیجه خالی (سایتی که اطلاعاتی نداشت) با
+      negative_ttl جداگانه ذخیره می‌شود تا مدتی دوباره اسکرپ نشود.
+    - تعداد رکوردها حداکثر max_entries است و قدیمی‌ترین رکوردها بر اساس زمان آخرین
+      استفاده (LRU) حذف می‌شوند.
+    - درخواست‌های همزمان برای یک دامنه در این پروسه ادغام می‌شوند: فقط یک نخ اسکرپ
+      می‌کند و بقیه منتظر نتیجه همان اجرا می‌مانند.
+    """
+
+    _instances: Dict[str, "ContactCache"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, db_path: str, **kwargs) -> "ContactCache":
+        with cls._instances_lock:
+            if db_path not in cls._instances:
+                cls._instances[db_path] = cls(db_path, **kwargs)
+            return cls._instances[db_path]
+
+    def __init__(self, db_path: str, ttl: float = 7 * 24 * 3600, negative_ttl: float = 24 * 3600,
+                 max_entries: int = 50000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max(1, max_entries)
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._counters = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS contacts ("
+                " domain TEXT PRIMARY KEY, record TEXT NOT NULL, is_negative INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS contacts_last_access ON contacts (last_access)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def claim(self, domains: Iterable[str]) -> Tuple[Dict[str, dict], List[str], Dict[str, Future]]:
+        """
+        دامنه‌ها را به سه دسته تقسیم می‌کند:
+        (رکوردهای موجود در کش، دامنه‌هایی که فراخواننده باید اسکرپ کند، Future دامنه‌هایی
+        که نخ دیگری در حال اسکرپ آن‌هاست). فراخواننده باید برای هر دامنه دسته دوم
+        resolve یا fail را صدا بزند.
+        """
+        domains = list(dict.fromkeys(d for d in domains if d))
+        hits: Dict[str, dict] = {}
+        owned: List[str] = []
+        waiting: Dict[str, Future] = {}
+
+        with self._lock:
+            cached = self._lookup_many([d for d in domains if d not in self._inflight])
+            for domain in domains:
+                if domain in self._inflight:
+                    waiting[domain] = self._inflight[domain]
+                    self._counters['coalesced'] += 1
+                elif domain in cached:
+                    record, is_negative = cached[domain]
+                    hits[domain] = record
+                    self._counters['negative_hits' if is_negative else 'hits'] += 1
+                else:
+                    self._inflight[domain] = Future()
+                    owned.append(domain)
+                    self._counters['misses'] += 1
+        return hits, owned, waiting
+
+    def resolve(self, domain: str, record: Optional[dict]):
+        """نتیجه اسکرپ یک دامنه را ذخیره کرده و منتظران را آزاد می‌کند. رکورد خالی کش منفی است."""
+        record = record or {}
+        now = time.time()
+        expires_at = now + (self.ttl if record else self.negative_ttl)
+        with self._lock:
+            try:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        "INSERT OR REPLACE INTO contacts (domain, record, is_negative, expires_at, last_access)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (domain, json.dumps(record), 0 if record else 1, expires_at, now),
+                    )
+                    if cursor.rowcount:
+                        self._size += 1
+                    self._evict_if_needed()
+            except sqlite3.Error as e:
+                logger.error(f"خطا در ذخیره اطلاعات تماس دامنه {domain} در کش: {e}")
+            future = self._inflight.pop(domain, None)
+        if future is not None and not future.done():
+            future.set_result(record)
+
+    def fail(self, domain: str, error: Exception):
+        """اسکرپ یک دامنه ناموفق بود؛ چیزی در کش ذخیره نمی‌شود و خطا به منتظران می‌رسد."""
+        with self._lock:
+            future = self._inflight.pop(domain, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = self._size
+            stats['inflight'] = len(self._inflight)
+        return stats
+
+    def _lookup_many(self, domains: List[str]) -> Dict[str, Tuple[dict, bool]]:
+        results: Dict[str, Tuple[dict, bool]] = {}
+        if not domains:
+            return results
+        now = time.time()
+        for i in range(0, len(domains), 500):
+            chunk = domains[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT domain, record, is_negative FROM contacts"
+                f" WHERE domain IN ({placeholders}) AND expires_at > ?",
+                (*chunk, now),
+            ).fetchall()
+            for domain, record, is_negative in rows:
+                results[domain] = (json.loads(record), bool(is_negative))
+        if results:
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE contacts SET last_access = ? WHERE domain = ?", ((now, d) for d in results)
+                )
+        return results
+
+    def _evict_if_needed(self):
+        # شمارنده اندازه تقریبی است (جایگزینی رکورد موجود هم شمرده می‌شود)؛ هنگام نیاز دقیق محاسبه می‌شود
+        if self._size <= self.max_entries:
+            return
+        self._size = self._conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+        if self._size <= self.max_entries:
+            return
+        # برای جلوگیری از حذف در هر درج، تا ۹۰٪ ظرفیت حذف می‌شود
+        overflow = self._size - int(self.max_entries * 0.9)
+        # رکوردهای منقضی شده اول و سپس کم‌استفاده‌ترین‌ها حذف می‌شوند
+        cursor = self._conn.execute(
+            "DELETE FROM contacts WHERE domain IN ("
+            " SELECT domain FROM contacts ORDER BY (expires_at <= ?) DESC, last_access ASC LIMIT ?)",
+            (time.time(), overflow),
+        )
+        self._size -= cursor.rowcount
+        self._counters['evictions'] += cursor.rowcount
@@ -0,0 +1,297 @@
+import asyncio
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .metrics_service import metrics
+from .processing_service import has_direct_contact, normalize_domain, process_contact_data
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlBudget(NamedTuple):
+    """عمق پیمایش و تعداد درخواست مجاز به ازای هر وب‌سایت در یک اجرای اکتور اطلاعات تماس."""
+    max_depth: int
+    max_requests: int
+
+
+# بودجه ثابت حالت غیرتطبیقی (رفتار قبلی)
+DEFAULT_CRAWL_BUDGET = CrawlBudget(max_depth=2, max_requests=5)
+
+
+def parse_crawl_ladder(spec: str) -> List[CrawlBudget]:
+    """
+    پله‌های بودجه را از رشته‌ای مانند "0:1,1:4,2:10" (عمق:درخواست) می‌خواند.
+    پله‌ها باید به ترتیب صعودی باشند؛ رشته نامعتبر یا خالی به بودجه ثابت قبلی برمی‌گردد.
+    """
+    ladder = []
+    try:
+        for step in filter(None, (part.strip() for part in spec.split(','))):
+            depth, requests = step.split(':')
+            ladder.append(CrawlBudget(max(0, int(depth)), max(1, int(requests))))
+    except ValueError:
+        logger.error(f"مقدار '{spec}' برای پله‌های پیمایش اطلاعات تماس نامعتبر است؛ از بودجه ثابت استفاده می‌شود.")
+        return [DEFAULT_CRAWL_BUDGET]
+    return ladder or [DEFAULT_CRAWL_BUDGET]
+
+
+class ContactCrawlStats:
+    """
+    [جدید] آمار پیمایش اطلاعات تماس هر دامنه در SQLite: پله‌ای که آخرین بار ایمیل یا تلفن در آن پیدا شد.
+    اجراهای بعدی همان دامنه (پس از انقضای کش اطلاعات تماس) مستقیماً از همان پله شروع می‌شوند.
+    """
+
+    _instances: Dict[str, "ContactCrawlStats"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, db_path: str) -> "ContactCrawlStats":
+        with cls._instances_lock:
+            if db_path not in cls._instances:
+                cls._instances[db_path] = cls(db_path)
+            return cls._instances[db_path]
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS crawl_stats ("
+                " domain TEXT PRIMARY KEY, found_level INTEGER, crawls INTEGER NOT NULL,"
+                " misses INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def start_levels(self, domains: Iterable[str], top_level: int) -> Dict[str, int]:
+        """پله شروع هر دامنه: پله‌ای که قبلاً موفق بوده (حداکثر top_level) و در غیر این صورت پله اول."""
+        domains = list(domains)
+        levels = {domain: 0 for domain in domains}
+        with self._lock:
+            for i in range(0, len(domains), 500):
+                chunk = domains[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT domain, found_level FROM crawl_stats"
+                    f" WHERE domain IN ({placeholders}) AND found_level IS NOT NULL",
+                    chunk,
+                ).fetchall()
+                for domain, found_level in rows:
+                    levels[domain] = min(found_level, top_level)
+        return levels
+
+    def record(self, domain: str, level: int, found: bool):
+        """
+        نتیجه نهایی پیمایش یک دامنه را ثبت می‌کند. دامنه‌ای که در هیچ پله‌ای اطلاعاتی نداشت پله موفق قبلی خود را
+        از دست می‌دهد تا دفعه بعد دوباره از پله اول شروع شود.
+        """
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO crawl_stats (domain, found_level, crawls, misses, updated_at)"
+                    " VALUES (?, ?, 1, ?, ?)"
+                    " ON CONFLICT(domain) DO UPDATE SET found_level = excluded.found_level,"
+                    " crawls = crawls + 1, misses = misses + excluded.misses, updated_at = excluded.updated_at",
+                    (domain, level if found else None, 0 if found else 1, time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"خطا در ثبت آمار پیمایش دامنه {domain}: {e}")
+
+    def summary(self) -> dict:
+        """تعداد دامنه‌ها به تفکیک پله موفق (none برای دامنه‌هایی که اطلاعاتی نداشتند)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT found_level, COUNT(*) FROM crawl_stats GROUP BY found_level"
+            ).fetchall()
+        return {('none' if level is None else str(level)): count for level, count in rows}
+
+
+class ContactCrawlPartialError(Exception):
+    """
+    [جدید] پیمایش تطبیقی برای برخی دامنه‌ها ناموفق بود. results آیتم‌های دامنه‌های پیمایش شده و errors خطای
+    دامنه‌هایی است که حتی پله اول آن‌ها اجرا نشد.
+    """
+
+    def __init__(self, results: Dict[str, list], errors: Dict[str, Exception]):
+        super().__init__(f"Contact crawl failed for {len(errors)} of {len(results) + len(errors)} domains.")
+        self.results = results
+        self.errors = errors
+
+
+class AdaptiveContactCrawl:
+    """
+    [جدید] پیمایش تطبیقی اطلاعات تماس یک دسته دامنه. هر دامنه از پله شروع خود با بودجه کم پیمایش می‌شود
+    و فقط اگر process_contact_data در نتایج آن ایمیل یا تلفنی پیدا نکند، در دور بعد با پله بالاتر
+    (عمق یا تعداد درخواست بیشتر) دوباره پیمایش می‌شود. آیتم‌های همه پله‌ها برای هر دامنه جمع می‌شوند.
+
+    اجرای اکتور با تابعی است که فراخواننده می‌دهد: run (مسدود)، submit (Future، برای حالت وب‌هوک)
+    یا run_async (asyncio)؛ هر سه حلقه next_runs() -> اجرای هر گروه -> record(...) را تا done شدن تکرار می‌کنند.
+    """
+
+    def __init__(self, websites_by_domain: Dict[str, str], ladder: List[CrawlBudget],
+                 stats: Optional[ContactCrawlStats] = None):
+        self.websites_by_domain = websites_by_domain
+        self.ladder = ladder
+        self.stats = stats
+        top_level = len(ladder) - 1
+        if stats is not None:
+            self.pending = stats.start_levels(websites_by_domain, top_level)
+        else:
+            self.pending = {domain: 0 for domain in websites_by_domain}
+        self.results: Dict[str, list] = {domain: [] for domain in websites_by_domain}
+        # [جدید] خطای دامنه‌هایی که اولین پیمایش آن‌ها ناموفق بود
+        self.errors: Dict[str, Exception] = {}
+        # دامنه‌هایی که دست کم یک پله آن‌ها با موفقیت اجرا شده است
+        self._crawled = set()
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    def next_runs(self) -> List[Tuple[int, CrawlBudget, List[str]]]:
+        """اجراهای دور بعد: (پله، بودجه، وب‌سایت‌ها)؛ دامنه‌های هم‌پله در یک اجرا ارسال می‌شوند."""
+        by_level: Dict[int, List[str]] = {}
+        for domain, level in self.pending.items():
+            by_level.setdefault(level, []).append(self.websites_by_domain[domain])
+        return [(level, self.ladder[level], websites) for level, websites in sorted(by_level.items())]
+
+    def record(self, level: int, websites: List[str], results_by_domain: Dict[str, list]):
+        """نتیجه اجرای یک پله را ثبت می‌کند و دامنه‌هایی را که هنوز ایمیل یا تلفن ندارند به پله بعد می‌برد."""
+        for website in websites:
+            domain = normalize_domain(website)
+            if self.pending.get(domain) != level:
+                continue
+            self._crawled.add(domain)
+            self.results[domain].extend(results_by_domain.get(domain) or [])
+            found = has_direct_contact(process_contact_data(self.results[domain]))
+            metrics.inc('scraper_contact_crawl_passes_total',
+                        labels={'level': str(level), 'found': 'true' if found else 'false'},
+                        help_text='Adaptive contact crawl passes per domain, by budget level and outcome.')
+            if found or level + 1 >= len(self.ladder):
+                del self.pending[domain]
+                if self.stats is not None:
+                    self.stats.record(domain, level, found)
+            else:
+                self.pending[domain] = level + 1
+
+    def abandon(self, level: int, websites: List[str], error: Exception):
+        """
+        اجرای یک پله ناموفق بود. برای دامنه‌هایی که پله قبلی آن‌ها اجرا شده، نتیجه همان پله نگه داشته می‌شود
+        و آماری ثبت نمی‌شود.
+        [اصلاح شد] تصمیم برای هر دامنه جداگانه گرفته می‌شود: دامنه‌هایی که اولین پیمایش آن‌ها بود در errors ثبت
+        و از نتایج حذف می‌شوند، بدون اینکه نتایج سایر دامنه‌های همین پیمایش از دست برود.
+        """
+        domains = [domain for domain in map(normalize_domain, websites) if self.pending.get(domain) == level]
+        first_time = [domain for domain in domains if domain not in self._crawled]
+        logger.warning(
+            f"خطا در پیمایش پله {level} برای {len(domains)} دامنه: {error}؛ برای {len(domains) - len(first_time)} "
+            f"دامنه از نتایج پله قبل استفاده می‌شود و {len(first_time)} دامنه بدون نتیجه می‌ماند."
+        )
+        for domain in domains:
+            del self.pending[domain]
+            if domain not in self._crawled:
+                del self.results[domain]
+                self.errors[domain] = error
+
+    def result(self) -> Dict[str, list]:
+        """
+        [جدید] آیتم‌های هر دامنه پس از پایان پیمایش. اگر هیچ دامنه‌ای پیمایش نشده باشد خطای اولین اجرا پرتاب می‌شود
+        (مانند حالت غیرتطبیقی) و اگر فقط برخی دامنه‌ها ناموفق باشند ContactCrawlPartialError.
+        """
+        if self.errors and not self.results:
+            raise next(iter(self.errors.values()))
+        if self.errors:
+            raise ContactCrawlPartialError(self.results, self.errors)
+        return self.results
+
+    def run(self, run_batch: Callable[[List[str], CrawlBudget], Dict[str, list]]) -> Dict[str, list]:
+        """پیمایش را با run_batch(وب‌سایت‌ها، بودجه) تا پایان اجرا کرده و آیتم‌های هر دامنه را برمی‌گرداند."""
+        while not self.done:
+            for level, budget, websites in self.next_runs():
+                self._log_round(level, budget, websites)
+                try:
+                    results = run_batch(websites, budget)
+                except Exception as e:
+                    self.abandon(level, websites, e)
+                    continue
+                self.record(level, websites, results)
+        return self.result()
+
+    async def run_async(self, run_batch: Callable[[List[str], CrawlBudget], Awaitable[Dict[str, list]]]
+                        ) -> Dict[str, list]:
+        """معادل asyncio متد run؛ گروه‌های هر دور همزمان اجرا می‌شوند."""
+        while not self.done:
+            runs = self.next_runs()
+            for level, budget, websites in runs:
+                self._log_round(level, budget, websites)
+            outcomes = await asyncio.gather(
+                *(run_batch(websites, budget) for _, budget, websites in runs), return_exceptions=True
+            )
+            for (level, _, websites), outcome in zip(runs, outcomes):
+                if isinstance(outcome, BaseException):
+                    if not isinstance(outcome, Exception):
+                        raise outcome
+                    self.abandon(level, websites, outcome)
+                else:
+                    self.record(level, websites, outcome)
+        return self.result()
+
+    def submit(self, submit_batch: Callable[[List[str], CrawlBudget], Future]) -> Future:
+        """
+        نسخه غیرمسدود run برای حالت وب‌هوک: submit_batch باید Future نتیجه هر اجرا را برگرداند.
+        دورهای بعدی در یک نخ کوتاه‌عمر شروع می‌شوند، چون شروع اجرا ممکن است منتظر سهمیه اجرای همزمان بماند
+        و نخ callback (وب‌هوک یا دریافت دیتاست) نباید مسدود شود.
+        """
+        result = Future()
+        lock = threading.Lock()
+        context = contextvars.copy_context()
+
+        def start_round():
+            runs = self.next_runs()
+            if not runs:
+                try:
+                    result.set_result(self.result())
+                except Exception as e:
+                    result.set_exception(e)
+                return
+            remaining = [len(runs)]
+            for level, budget, websites in runs:
+                self._log_round(level, budget, websites)
+                try:
+                    future = submit_batch(websites, budget)
+                except Exception as e:
+                    future = Future()
+                    future.set_exception(e)
+                future.add_done_callback(
+                    lambda finished, level=level, websites=websites: on_finished(level, websites, finished, remaining)
+                )
+
+        def on_finished(level: int, websites: List[str], finished: Future, remaining: list):
+            with lock:
+                if result.done():
+                    return
+                try:
+                    try:
+                        self.record(level, websites, finished.result())
+                    except Exception as e:
+                        self.abandon(level, websites, e)
+                except Exception as e:
+                    result.set_exception(e)
+                    return
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            threading.Thread(target=context.run, args=(start_round,), name="contact-crawl", daemon=True).start()
+
+        start_round()
+        return result
+
+    def _log_round(self, level: int, budget: CrawlBudget, websites: List[str]):
+        logger.info(
+            f"پیمایش تطبیقی اطلاعات تماس: پله {level} (عمق {budget.max_depth}، {budget.max_requests} درخواست) "
+            f"برای {len(websites)} وب‌سایت."
+        )
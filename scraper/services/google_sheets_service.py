@@ -1,17 +1,56 @@
 import gspread
 import logging
+import os
+import re
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics_service import metrics, timed
+from .processing_service import canonical_job_key
+from .sheets_quota_service import get_sheets_quota
 
 logger = logging.getLogger(__name__)
 
+
+def _column_letter(column_index: int) -> str:
+    """شماره ستون (از ۱) را به حرف ستون در نماد A1 تبدیل می‌کند."""
+    return re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, column_index))
+
 class GoogleSheetsService:
     """
     یک Wrapper برای سادگی کار با gspread جهت تعامل با Google Sheets (ماژول سوم).
     """
 
+    # [جدید] نشست‌های احراز هویت شده به ازای هر (فایل سرویس اکانت، شناسه شیت) در سطح پروسه
+    _shared_sessions: Dict[Tuple[str, str], Tuple["GoogleSheetsService", float]] = {}
+    _shared_sessions_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, service_account_path: str, spreadsheet_id: str, ttl: float = 1800.0) -> "GoogleSheetsService":
+        """
+        [جدید] یک نمونه مشترک در سطح پروسه برمی‌گرداند تا احراز هویت و open_by_key
+        فقط پس از گذشت ttl ثانیه دوباره انجام شوند.
+        """
+        key = (service_account_path, spreadsheet_id)
+        with cls._shared_sessions_lock:
+            cached = cls._shared_sessions.get(key)
+            if cached and time.monotonic() - cached[1] < ttl:
+                return cached[0]
+            with timed('sheets_auth'):
+                service = cls(service_account_path, spreadsheet_id)
+            cls._shared_sessions[key] = (service, time.monotonic())
+            return service
+
     def __init__(self, service_account_path: str, spreadsheet_id: str):
+        # نگاشت هدرهای خوانده شده به ازای هر ورک‌شیت؛ برای خواندن دسته‌ای در دفعات بعد
+        self._header_cache: Dict[int, dict] = {}
+        # [جدید] تمام درخواست‌های API از زمان‌بند سهمیه مشترک پروسه عبور می‌کنند
+        self.quota = get_sheets_quota()
         try:
             self.gc = gspread.service_account(filename=service_account_path)
-            self.spreadsheet = self.gc.open_by_key(spreadsheet_id)
+            self.spreadsheet = self.quota.call('read', 'sheets_open', self.gc.open_by_key, spreadsheet_id)
             logger.info("اتصال به Google Sheets با موفقیت برقرار شد.")
         except Exception as e:
             logger.error(f"عدم موفقیت در احراز هویت یا باز کردن Google Sheet: {e}")
@@ -19,14 +58,14 @@ class GoogleSheetsService:
 
     def get_worksheet(self, sheet_name: str) -> gspread.Worksheet:
         try:
-            return self.spreadsheet.worksheet(sheet_name)
+            return self.quota.call('read', 'sheets_worksheet_lookup', self.spreadsheet.worksheet, sheet_name)
         except gspread.exceptions.WorksheetNotFound:
             logger.error(f"ورک‌شیت با نام '{sheet_name}' یافت نشد.")
             raise
 
     def get_column_values(self, worksheet: gspread.Worksheet, column_index: int) -> set:
         try:
-            values = worksheet.col_values(column_index)
+            values = self.quota.call('read', 'sheets_link_column_read', worksheet.col_values, column_index)
             # اولین مقدار هدر است، آن را حذف می‌کنیم
             return set(values[1:]) if values else set()
         except Exception as e:
@@ -40,19 +79,369 @@ class GoogleSheetsService:
         این کار باعث می‌شود کد نسبت به جابجایی ستون‌ها مقاوم باشد.
         """
         try:
-            headers = worksheet.row_values(1)
+            headers = self.quota.call('read', 'sheets_header_read', worksheet.row_values, 1)
             # [جدید] لاگ برای نمایش هدرهای خوانده شده جهت خطایابی
             logger.info(f"Headers actually read from Google Sheet: {headers}")
             # [اصلاح شد] استفاده از strip() برای حذف فاصله‌های اضافی و نامرئی از نام هدرها
-            return {header.strip(): i + 1 for i, header in enumerate(headers)}
+            header_map = {header.strip(): i + 1 for i, header in enumerate(headers)}
+            self._header_cache[worksheet.id] = header_map
+            return header_map
         except Exception as e:
             logger.error(f"خطا در خواندن هدرهای شیت: {e}")
             return {}
 
+    def get_header_map_and_column(self, worksheet: gspread.Worksheet, column_name: str,
+                                  start_row: int = 2) -> Tuple[dict, List[str]]:
+        """
+        [جدید] هدرها و مقادیر یک ستون را از ردیف start_row به بعد (به ترتیب ردیف‌ها) برمی‌گرداند.
+        اگر جایگاه ستون از قبل معلوم باشد، هر دو با یک درخواست batch_get خوانده می‌شوند؛
+        در غیر این صورت دو درخواست جداگانه.
+        """
+        cached_map = self._header_cache.get(worksheet.id) or {}
+        column_index = cached_map.get(column_name)
+        if column_index:
+            column_letter = _column_letter(column_index)
+            try:
+                header_range, column_range = self.quota.call(
+                    'read', 'sheets_header_and_link_read',
+                    worksheet.batch_get, ['1:1', f'{column_letter}{start_row}:{column_letter}']
+                )
+            except Exception as e:
+                logger.error(f"خطا در خواندن دسته‌ای هدرها و ستون: {e}")
+                raise
+            headers = header_range[0] if header_range else []
+            header_map = {header.strip(): i + 1 for i, header in enumerate(headers)}
+            if header_map.get(column_name) == column_index:
+                self._header_cache[worksheet.id] = header_map
+                return header_map, [row[0] if row else '' for row in column_range]
+            logger.info(f"جایگاه ستون '{column_name}' تغییر کرده است؛ خواندن مجدد ستون...")
+
+        header_map = self.get_header_map(worksheet)
+        column_index = header_map.get(column_name)
+        if not column_index:
+            return header_map, []
+        column_letter = _column_letter(column_index)
+        try:
+            column_range = self.quota.call(
+                'read', 'sheets_link_column_read', worksheet.get, f'{column_letter}{start_row}:{column_letter}'
+            )
+        except Exception as e:
+            logger.error(f"خطا در دریافت مقادیر ستون: {e}")
+            raise
+        return header_map, [row[0] if row else '' for row in column_range]
+
     def append_row(self, worksheet: gspread.Worksheet, row_data: list):
         try:
-            worksheet.append_row(row_data)
+            self.quota.call('write', 'sheets_append', worksheet.append_row, row_data)
         except Exception as e:
             logger.error(f"خطا در افزودن ردیف: {e}")
             raise
 
+    def append_rows(self, worksheet: gspread.Worksheet, rows: List[list]):
+        """
+        [جدید] چند ردیف را با یک درخواست API به انتهای شیت اضافه می‌کند.
+        """
+        try:
+            self.quota.call('write', 'sheets_append', worksheet.append_rows, rows)
+        except Exception as e:
+            logger.error(f"خطا در افزودن {len(rows)} ردیف: {e}")
+            raise
+
+
+class BufferedSheetWriter:
+    """
+    [جدید] ردیف‌ها را در حافظه جمع می‌کند و آن‌ها را به صورت دسته‌ای با یک فراخوانی
+    append_rows در شیت می‌نویسد تا تعداد درخواست‌ها به API گوگل کم شود.
+
+    ارسال دسته زمانی انجام می‌شود که تعداد ردیف‌ها به max_rows برسد، از آخرین ارسال
+    بیش از max_delay ثانیه گذشته باشد یا flush به صورت دستی صدا زده شود.
+    اگر یک ارسال با خطا مواجه شود، ردیف‌ها در صف باقی می‌مانند و پیش از ارسال بعدی
+    ستون link دوباره خوانده می‌شود تا ردیف‌هایی که در واقع ثبت شده‌اند تکراری نوشته نشوند.
+    """
+
+    def __init__(self, sheets_service: GoogleSheetsService, worksheet: gspread.Worksheet,
+                 link_column_index: Optional[int] = None, link_position: Optional[int] = None,
+                 max_rows: int = 50, max_delay: float = 30.0,
+                 on_flush: Optional[Callable[[List[list]], None]] = None, verify_first: bool = False):
+        self.sheets_service = sheets_service
+        self.worksheet = worksheet
+        self.link_column_index = link_column_index
+        self.link_position = link_position
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        # [جدید] پس از ثبت قطعی ردیف‌ها در شیت با همان ردیف‌ها صدا زده می‌شود
+        self.on_flush = on_flush
+
+        self._lock = threading.Lock()
+        # [اصلاح شد] ارسال‌ها با قفل جداگانه پشت سر هم انجام می‌شوند تا add و pending_count در مدت انتظار
+        # برای سهمیه یا backoff خطای 429 (تا چند دقیقه) مسدود نشوند
+        self._flush_lock = threading.Lock()
+        self._pending: List[list] = []
+        # ردیف‌های دسته‌ای که هم‌اکنون در حال ارسال است
+        self._inflight: List[list] = []
+        self._flushed_count = 0
+        self._last_flush = time.monotonic()
+        # [جدید] با verify_first اولین ارسال هم پس از بررسی ستون link انجام می‌شود (مثلاً ادامه ارسال پس از توقف پروسه)
+        self._needs_verification = verify_first
+
+    @property
+    def flushed_count(self) -> int:
+        with self._lock:
+            return self._flushed_count
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._inflight)
+
+    def queued_rows(self) -> List[list]:
+        """[جدید] کپی ردیف‌هایی که هنوز ثبت نشده‌اند (صف و دسته در حال ارسال)."""
+        with self._lock:
+            return [*self._inflight, *self._pending]
+
+    def add(self, row: list) -> int:
+        """
+        یک ردیف را به صف اضافه می‌کند و در صورت رسیدن به آستانه، صف را ارسال می‌کند.
+        تعداد ردیف‌های ارسال شده در این فراخوانی را برمی‌گرداند.
+        [اصلاح شد] اگر نخ دیگری در حال ارسال باشد منتظر نمی‌ماند؛ ردیف در ارسال بعدی نوشته می‌شود.
+        """
+        with self._lock:
+            self._pending.append(row)
+            should_flush = (
+                len(self._pending) >= self.max_rows
+                or time.monotonic() - self._last_flush >= self.max_delay
+            )
+        return self._flush_once(blocking=False) if should_flush else 0
+
+    def restore(self, rows: List[list], verify: bool = True):
+        """
+        [جدید] ردیف‌های بازیابی شده از checkpoint را بدون ارسال فوری به صف اضافه می‌کند.
+        [اصلاح شد] ممکن است نویسنده قبلی این ردیف‌ها را پیش از توقف ثبت کرده باشد؛ با verify ارسال بعدی مانند
+        verify_first ابتدا ستون link را بررسی می‌کند.
+        """
+        with self._lock:
+            self._pending.extend(rows)
+            if rows and verify:
+                self._needs_verification = True
+
+    def flush(self, retries: int = 0, retry_delay: float = 2.0) -> int:
+        """
+        تمام ردیف‌های صف را با یک درخواست ارسال می‌کند. در صورت خطا ردیف‌ها در صف
+        می‌مانند و خطا (پس از retries تلاش مجدد) به فراخواننده پرتاب می‌شود.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._flush_once()
+            except Exception:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                logger.warning(f"تلاش مجدد برای ارسال ردیف‌های صف ({attempt}/{retries})...")
+                time.sleep(retry_delay * attempt)
+
+    def _flush_once(self, blocking: bool = True) -> int:
+        """
+        دسته فعلی صف را زیر _lock برمی‌دارد و بیرون از آن ارسال می‌کند. در صورت خطا ردیف‌ها به ابتدای صف
+        برمی‌گردند. با blocking=False اگر ارسال دیگری در جریان باشد بلافاصله ۰ برمی‌گردد.
+        """
+        if not self._flush_lock.acquire(blocking):
+            return 0
+        try:
+            with self._lock:
+                if not self._pending:
+                    self._last_flush = time.monotonic()
+                    return 0
+                rows, self._pending = self._pending, []
+                self._inflight = rows
+                needs_verification = self._needs_verification
+
+            written = []
+            try:
+                if needs_verification:
+                    rows, written = self._split_already_written(rows)
+                    with self._lock:
+                        self._needs_verification = False
+                        self._flushed_count += len(written)
+                        self._inflight = rows
+                    self._notify_flushed(written)
+                if rows:
+                    self.sheets_service.append_rows(self.worksheet, rows)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = rows
+                    self._inflight = []
+                    # ممکن است درخواست در سمت گوگل ثبت شده باشد؛ پیش از ارسال بعدی بررسی می‌شود
+                    self._needs_verification = True
+                raise
+
+            with self._lock:
+                self._inflight = []
+                self._flushed_count += len(rows)
+                self._last_flush = time.monotonic()
+            if rows:
+                logger.info(f"تعداد {len(rows)} ردیف به صورت دسته‌ای در شیت ثبت شد.")
+                self._notify_flushed(rows)
+            return len(rows)
+        finally:
+            self._flush_lock.release()
+
+    def _notify_flushed(self, rows: List[list]):
+        if not self.on_flush or not rows:
+            return
+        try:
+            self.on_flush(rows)
+        except Exception as e:
+            logger.error(f"خطا در پردازش ردیف‌های ثبت شده: {e}")
+
+    def _split_already_written(self, rows: List[list]) -> Tuple[List[list], List[list]]:
+        """ردیف‌ها را به (ثبت نشده، ثبت شده) تقسیم می‌کند؛ ثبت شده یعنی لینک آن هم‌اکنون در شیت وجود دارد."""
+        if not self.link_column_index or self.link_position is None:
+            return rows, []
+        existing_keys = set(map(
+            canonical_job_key, self.sheets_service.get_column_values(self.worksheet, self.link_column_index)
+        ))
+        remaining = [row for row in rows if canonical_job_key(row[self.link_position]) not in existing_keys]
+        written = [row for row in rows if canonical_job_key(row[self.link_position]) in existing_keys]
+        if written:
+            logger.info(f"تعداد {len(written)} ردیف از ارسال ناموفق قبلی در شیت ثبت شده بود و دوباره ارسال نمی‌شود.")
+        return remaining, written
+
+
+class SheetsFeeder:
+    """
+    [جدید] ردیف‌های خروجی SQLite محلی (SqliteRowStore) را در یک نخ پس‌زمینه و به ترتیب نوشتن در Google Sheets
+    ثبت می‌کند تا اسکرپ منتظر سهمیه یا خطاهای API گوگل نماند.
+
+    مکان‌نمای آخرین ردیف ارسال شده در همان فایل SQLite ذخیره می‌شود و فقط پس از ثبت موفق هر دسته جلو می‌رود.
+    پس از راه‌اندازی مجدد، اولین دسته با ستون link شیت مقایسه می‌شود (verify_first) تا ردیف‌هایی که پیش از
+    توقف ثبت شده بودند تکراری نوشته نشوند. با lease در همان فایل، در هر لحظه فقط یک پروسه یک شیت را تغذیه می‌کند.
+    """
+
+    _instances: Dict[Tuple[str, str], "SheetsFeeder"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, store, sheets_service: GoogleSheetsService, worksheet: gspread.Worksheet, scope: str,
+                   link_column_index: int, link_position: int, batch_size: int = 200,
+                   interval: float = 5.0) -> "SheetsFeeder":
+        """خوراک‌دهنده مشترک (و در حال اجرای) هر (فایل SQLite، شیت) در سطح پروسه."""
+        key = (os.path.abspath(store.path), scope)
+        with cls._instances_lock:
+            feeder = cls._instances.get(key)
+            if feeder is None:
+                feeder = cls(store, sheets_service, worksheet, scope, link_column_index, link_position,
+                             batch_size=batch_size, interval=interval)
+                cls._instances[key] = feeder
+                feeder.start()
+            else:
+                # نشست مشترک شیت پس از SHEETS_SESSION_TTL دوباره ساخته می‌شود
+                feeder.sheets_service = feeder.writer.sheets_service = sheets_service
+            return feeder
+
+    @staticmethod
+    def feed_name(scope: str) -> str:
+        """نام خوراک (و مکان‌نمای آن در feed_state) برای شیت scope."""
+        return f"sheets:{scope}"
+
+    @classmethod
+    def total_backlog(cls) -> int:
+        """تعداد ردیف‌های محلی که هنوز به شیت‌ها ارسال نشده‌اند (طبق آخرین بررسی هر خوراک‌دهنده)."""
+        with cls._instances_lock:
+            return sum(feeder.backlog for feeder in cls._instances.values())
+
+    def __init__(self, store, sheets_service: GoogleSheetsService, worksheet: gspread.Worksheet, scope: str,
+                 link_column_index: int, link_position: int, batch_size: int = 200, interval: float = 5.0,
+                 owner: Optional[str] = None):
+        self.store = store
+        self.sheets_service = sheets_service
+        self.worksheet = worksheet
+        self.link_column_index = link_column_index
+        self.link_position = link_position
+        self.batch_size = max(1, batch_size)
+        self.interval = max(0.1, interval)
+        self.name = self.feed_name(scope)
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        # تعداد ردیف‌های ارسال نشده در آخرین بررسی
+        self.backlog = 0
+
+        self.writer = self._new_writer()
+        self._batch_last_id = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _new_writer(self) -> BufferedSheetWriter:
+        return BufferedSheetWriter(
+            self.sheets_service, self.worksheet,
+            link_column_index=self.link_column_index, link_position=self.link_position,
+            max_rows=self.batch_size, verify_first=True,
+        )
+
+    @classmethod
+    def shutdown_all(cls, drain_timeout: float = 0.0):
+        """خوراک‌دهنده‌های پروسه را (پس از حداکثر drain_timeout ثانیه انتظار برای ارسال ردیف‌های باقی‌مانده) متوقف می‌کند."""
+        with cls._instances_lock:
+            feeders = list(cls._instances.values())
+            cls._instances.clear()
+        deadline = time.monotonic() + drain_timeout
+        for feeder in feeders:
+            feeder.drain(max(0.0, deadline - time.monotonic()))
+            feeder.stop()
+
+    def drain(self, timeout: float) -> bool:
+        """تا ارسال تمام ردیف‌های محلی (یا گذشت timeout ثانیه) منتظر می‌ماند؛ True اگر ردیفی باقی نمانده باشد."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = self.store.count_after(self.store.feed_cursor(self.name))
+            if not remaining or time.monotonic() >= deadline:
+                return not remaining
+            time.sleep(min(0.1, self.interval))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sheets-feeder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def feed_once(self) -> int:
+        """
+        یک دسته از ردیف‌های محلی را در شیت ثبت می‌کند و تعداد ردیف‌های ثبت شده را برمی‌گرداند
+        (۰ اگر ردیف جدیدی نباشد یا پروسه دیگری مالک این خوراک باشد). خطای ارسال به فراخواننده پرتاب می‌شود.
+        """
+        if not self.store.acquire_feed(self.name, self.owner, lease_seconds=max(60.0, self.interval * 6)):
+            if self.writer.pending_count:
+                # lease منقضی شده و پروسه دیگری ارسال را ادامه می‌دهد
+                self.writer = self._new_writer()
+            return 0
+
+        if not self.writer.pending_count:
+            cursor = self.store.feed_cursor(self.name)
+            self.backlog = self.store.count_after(cursor)
+            batch = self.store.rows_after(cursor, self.batch_size)
+            if not batch:
+                return 0
+            # مکان‌نما فقط پس از ثبت موفق جلو می‌رود؛ پس از خطا writer خودش ستون link را بررسی می‌کند
+            self.writer.restore([row for _, row in batch], verify=False)
+            self._batch_last_id = batch[-1][0]
+
+        flushed_before = self.writer.flushed_count
+        self.writer.flush()
+        written = self.writer.flushed_count - flushed_before
+        self.store.advance_feed(self.name, self.owner, self._batch_last_id)
+        self.backlog = max(0, self.backlog - written)
+        metrics.inc('scraper_sheet_rows_written_total', written, help_text='Rows appended to Google Sheets.')
+        return written
+
+    def _run(self):
+        logger.info(f"ارسال پس‌زمینه ردیف‌های خروجی محلی به شیت ({self.name}) شروع شد.")
+        while not self._stop.is_set():
+            try:
+                written = self.feed_once()
+            except Exception as e:
+                logger.error(f"خطا در ارسال ردیف‌های خروجی محلی به شیت: {e}؛ پس از {self.interval} ثانیه دوباره تلاش می‌شود.")
+                written = 0
+            if not written:
+                self._stop.wait(self.interval)
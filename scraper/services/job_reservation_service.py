@@ -0,0 +1,88 @@
+import logging
+import uuid
+from typing import Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# حداکثر تعداد پارامترهای یک پرس‌وجو (محدودیت SQLite)
+_CHUNK_SIZE = 500
+
+
+class JobKeyReservations:
+    """
+    [جدید] رزرو کلید آگهی‌های یک تسک در دیتابیس مشترک Django (مدل JobKeyReservation).
+    ایندکس لینک‌ها و صف نوشتن هر کارگر محلی هستند؛ با صف دیتابیسی، کارگرهای میزبان‌های مختلف ترکیب‌های
+    یک تسک (یا تسک‌های همزمان روی یک شیت) را اجرا می‌کنند و هر کلید با قید یکتای (scope, job_key) فقط
+    به یک کارگر داده می‌شود. هر نمونه (یک TaskContext) شناسه owner مستقل خود را دارد.
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.owner = uuid.uuid4().hex
+
+    def reserve(self, scope: str, job_keys: Iterable[str], include_task: bool = False,
+                combination: Optional[int] = None) -> Set[str]:
+        """
+        کلیدهای داده شده را رزرو کرده و کلیدهایی را که متعلق به همین نمونه هستند برمی‌گرداند.
+        با include_task=True کلیدهایی که پیش‌تر توسط همین تسک (مثلاً کارگری که از کار افتاده) رزرو شده‌اند
+        هم پذیرفته می‌شوند؛ این حالت فقط برای بازیابی checkpoint در پایان تسک است.
+        [جدید] combination شماره ترکیب رزروکننده است (release_unqueued).
+        """
+        from ..models import JobKeyReservation
+
+        job_keys = list(job_keys)
+        reserved: Set[str] = set()
+        for i in range(0, len(job_keys), _CHUNK_SIZE):
+            chunk = job_keys[i:i + _CHUNK_SIZE]
+            JobKeyReservation.objects.bulk_create(
+                [JobKeyReservation(scope=scope, job_key=key, task_id=self.task_id, owner=self.owner,
+                                   combination=combination) for key in chunk],
+                ignore_conflicts=True,
+            )
+            owned = JobKeyReservation.objects.filter(scope=scope, job_key__in=chunk, task_id=self.task_id)
+            if not include_task:
+                owned = owned.filter(owner=self.owner)
+            reserved.update(owned.values_list('job_key', flat=True))
+        return reserved
+
+    def mark_queued(self, scope: str, job_keys: Iterable[str]):
+        """[جدید] ردیف این کلیدها در صف نوشتن (و checkpoint) قرار گرفته و با تلاش مجدد ترکیب آزاد نمی‌شوند."""
+        from ..models import JobKeyReservation
+
+        job_keys = list(job_keys)
+        for i in range(0, len(job_keys), _CHUNK_SIZE):
+            JobKeyReservation.objects.filter(
+                scope=scope, job_key__in=job_keys[i:i + _CHUNK_SIZE], task_id=self.task_id
+            ).update(queued=True)
+
+    def release_unqueued(self, combination: int) -> Set[str]:
+        """
+        [جدید] رزروهای ترکیب combination از همین تسک را که ردیفی برایشان در صف قرار نگرفته (تلاش ناموفق قبلی
+        یا کارگری که حین اجرای ترکیب از کار افتاده) حذف کرده و کلیدهای آن‌ها را برمی‌گرداند تا تلاش بعدی
+        همان ترکیب دوباره آن‌ها را پردازش کند.
+        """
+        from ..models import JobKeyReservation
+
+        unqueued = JobKeyReservation.objects.filter(task_id=self.task_id, combination=combination, queued=False)
+        released = dict(unqueued.values_list('id', 'job_key'))
+        ids = list(released)
+        for i in range(0, len(ids), _CHUNK_SIZE):
+            JobKeyReservation.objects.filter(pk__in=ids[i:i + _CHUNK_SIZE], queued=False).delete()
+        return set(released.values())
+
+    @staticmethod
+    def release_task(task_id: str):
+        """رزروهای تسک تمام شده حذف می‌شوند؛ ردیف‌های آن تا این زمان در خروجی ثبت شده‌اند."""
+        from ..models import JobKeyReservation
+
+        JobKeyReservation.objects.filter(task_id=task_id).delete()
+
+    @staticmethod
+    def purge_orphaned() -> int:
+        """رزروهای تسک‌هایی را که از مخزن وضعیت حذف شده‌اند (مثلاً هرگز تمام نشده‌اند) پاک می‌کند."""
+        from ..models import JobKeyReservation, TaskStatus
+
+        removed, _ = JobKeyReservation.objects.exclude(task_id__in=TaskStatus.objects.values('pk')).delete()
+        if removed:
+            logger.info(f"تعداد {removed} رزرو کلید آگهی مربوط به تسک‌های حذف شده پاک شد.")
+        return removed
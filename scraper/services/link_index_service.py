@@ -0,0 +1,140 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import gspread
+
+from .google_sheets_service import GoogleSheetsService
+from .processing_service import canonical_job_key
+
+logger = logging.getLogger(__name__)
+
+
+class LinkIndex:
+    """
+    یک ایندکس محلی (SQLite) از لینک‌های شغلی ثبت شده در شیت.
+    به جای خواندن کل ستون link در هر ترکیب، فقط ردیف‌هایی که پس از آخرین همگام‌سازی
+    به شیت اضافه شده‌اند خوانده می‌شوند و بررسی تکراری بودن با یک کوئری ایندکس‌دار انجام می‌شود.
+    [اصلاح شد] به جای رشته خام لینک، کلید canonical_job_key (شناسه آگهی لینکدین) ذخیره و مقایسه می‌شود.
+    """
+
+    # نمونه‌های مشترک به ازای مسیر فایل در سطح پروسه
+    _instances: Dict[str, "LinkIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, db_path: str) -> "LinkIndex":
+        with cls._instances_lock:
+            if db_path not in cls._instances:
+                cls._instances[db_path] = cls(db_path)
+            return cls._instances[db_path]
+
+    def __init__(self, db_path: str, full_sync_interval: float = 24 * 3600):
+        self.db_path = db_path
+        # برای تشخیص ردیف‌های حذف شده از شیت، هر چند وقت یک بار کل ستون دوباره خوانده می‌شود
+        self.full_sync_interval = full_sync_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " scope TEXT PRIMARY KEY, synced_rows INTEGER NOT NULL,"
+                " last_full_sync REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            # ایندکس‌های قدیمی لینک‌های خام را نگه می‌داشتند؛ با حذف وضعیت همگام‌سازی، کلیدها از نو ساخته می‌شوند
+            if self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'links'").fetchone():
+                self._conn.execute("DROP TABLE links")
+                self._conn.execute("DELETE FROM sync_state")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_keys ("
+                " scope TEXT NOT NULL, job_key TEXT NOT NULL, PRIMARY KEY (scope, job_key)"
+                ") WITHOUT ROWID"
+            )
+
+    @staticmethod
+    def scope_for(spreadsheet_id: str, worksheet: gspread.Worksheet) -> str:
+        return f"{spreadsheet_id}:{worksheet.id}"
+
+    def sync(self, sheets_service: GoogleSheetsService, worksheet: gspread.Worksheet,
+             scope: str, column_name: str = 'link',
+             unsent_links: Optional[Callable[[], Iterable[str]]] = None) -> Tuple[dict, int]:
+        """
+        ایندکس را با ردیف‌های جدید شیت همگام می‌کند و نگاشت هدرها را هم برمی‌گرداند
+        (هر دو در صورت امکان با یک درخواست خوانده می‌شوند).
+        [اصلاح شد] همگام‌سازی کامل کلیدهای scope را از نو می‌سازد؛ unsent_links (در صورت وجود) لینک ردیف‌هایی را
+        برمی‌گرداند که نوشته شده‌اند ولی هنوز به شیت نرسیده‌اند (خروجی محلی SheetsFeeder) تا کلید آن‌ها از ایندکس
+        حذف نشود و دوباره اسکرپ نشوند. این تابع در همان تراکنش حذف و درج فراخوانی می‌شود.
+        خروجی: (نگاشت هدرها، تعداد ردیف‌های خوانده شده).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_rows, last_full_sync FROM sync_state WHERE scope = ?", (scope,)
+            ).fetchone()
+        synced_rows, last_full_sync = row if row else (0, 0.0)
+        full_sync = time.time() - last_full_sync >= self.full_sync_interval
+
+        start_row = 2 if full_sync else synced_rows + 2
+        header_map, values = sheets_service.get_header_map_and_column(worksheet, column_name, start_row=start_row)
+        if not header_map.get(column_name):
+            return header_map, 0
+
+        now = time.time()
+        values_to_index = values
+        with self._lock, self._conn:
+            if full_sync:
+                self._conn.execute("DELETE FROM job_keys WHERE scope = ?", (scope,))
+                last_full_sync = now
+                if unsent_links is not None:
+                    values_to_index = [*values, *unsent_links()]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_keys (scope, job_key) VALUES (?, ?)",
+                ((scope, key) for key in map(canonical_job_key, values_to_index) if key),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (scope, synced_rows, last_full_sync, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                (scope, start_row - 2 + len(values), last_full_sync, now),
+            )
+
+        logger.info(
+            f"ایندکس لینک‌ها همگام شد: {len(values)} ردیف از ردیف {start_row} خوانده شد"
+            f"{' (همگام‌سازی کامل)' if full_sync else ''}."
+        )
+        return header_map, len(values)
+
+    def filter_new(self, scope: str, links: Iterable[str]) -> Set[str]:
+        """
+        [اصلاح شد] کلید canonical لینک‌های داده شده را محاسبه کرده و کلیدهایی را که در ایندکس نیستند برمی‌گرداند.
+        """
+        keys = list(dict.fromkeys(key for key in map(canonical_job_key, links) if key))
+        if not keys:
+            return set()
+        known: Set[str] = set()
+        with self._lock:
+            # محدودیت تعداد پارامترهای SQLite رعایت می‌شود
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT job_key FROM job_keys WHERE scope = ? AND job_key IN ({placeholders})", (scope, *chunk)
+                ).fetchall()
+                known.update(r[0] for r in rows)
+        return set(keys) - known
+
+    def add(self, scope: str, links: Iterable[str]):
+        """
+        لینک‌هایی را که این پروسه در شیت ثبت کرده به ایندکس اضافه می‌کند.
+        شمارنده ردیف‌ها تغییر نمی‌کند تا ردیف‌های سایر نویسنده‌ها در همگام‌سازی بعدی از دست نروند.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_keys (scope, job_key) VALUES (?, ?)",
+                ((scope, key) for key in map(canonical_job_key, links) if key),
+            )
+
+    def count(self, scope: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM job_keys WHERE scope = ?", (scope,)).fetchone()[0]
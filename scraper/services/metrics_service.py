@@ -0,0 +1,155 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# مرزهای پیش‌فرض هیستوگرام مدت زمان مراحل (ثانیه)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class StageTimings:
+    """
+    [جدید] خلاصه زمان‌بندی مراحل یک تسک (تعداد، مجموع و بیشینه زمان هر مرحله) برای نمایش در scrapStatus.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {'count': count, 'total_seconds': round(total, 3), 'max_seconds': round(longest, 3)}
+                for stage, (count, total, longest) in sorted(self._stages.items())
+            }
+
+
+class MetricsRegistry:
+    """
+    [جدید] یک رجیستری ساده و thread-safe از شمارنده‌ها، گیج‌ها و هیستوگرام‌ها در سطح پروسه
+    که خروجی آن با فرمت متنی Prometheus تولید می‌شود.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Optional[dict]) -> LabelKey:
+        return tuple(sorted((labels or {}).items()))
+
+    def inc(self, name: str, value: float = 1, labels: Optional[dict] = None, help_text: str = ''):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = self._labels(labels)
+            series[key] = series.get(key, 0) + value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None, help_text: str = ''):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = self._labels(labels)
+            # [شمارنده هر bucket، مجموع، تعداد]
+            entry = series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """خروجی متنی Prometheus (نسخه 0.0.4)؛ گیج‌ها در لحظه درخواست از فراخواننده گرفته می‌شوند."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for key, (bucket_counts, total, count) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets, bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list, name: str, metric_type: str):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    pairs = []
+    for name, value in key:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# رجیستری مشترک پروسه و زمان‌بندی تسک جاری (در نخ‌ها و taskهای asyncio از طریق context منتقل می‌شود)
+metrics = MetricsRegistry()
+_current_timings: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar(
+    'current_stage_timings', default=None
+)
+
+
+def bind_task_timings(timings: Optional[StageTimings]):
+    """زمان‌بندی‌های ثبت شده در context فعلی (و نخ‌ها/taskهایی که context را کپی می‌کنند) به این تسک نسبت داده می‌شوند."""
+    _current_timings.set(timings)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    مدت اجرای یک مرحله را در هیستوگرام scraper_stage_duration_seconds و در خلاصه تسک جاری ثبت می‌کند.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_duration(stage, time.perf_counter() - started)
+
+
+def record_duration(stage: str, seconds: float):
+    """
+    [جدید] مدت یک مرحله را که شروع و پایان آن در یک بلوک کد نیست (مثلاً اجرای اکتوری که با وب‌هوک تمام می‌شود) ثبت می‌کند.
+    برای نسبت دادن به تسک جاری باید در context همان تسک صدا زده شود.
+    """
+    metrics.observe(
+        'scraper_stage_duration_seconds', seconds, {'stage': stage},
+        help_text='Duration of pipeline stages in seconds.'
+    )
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
@@ -0,0 +1,369 @@
+import abc
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .metrics_service import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+# خروجی‌های محلی قابل استفاده در OUTPUT_SINKS (در کنار 'sheets')
+LOCAL_SINK_KINDS = ('jsonl', 'csv', 'sqlite')
+
+
+def parse_output_sinks(spec: str) -> List[str]:
+    """
+    فهرست خروجی‌ها را از رشته‌ای مانند "sqlite,sheets" می‌خواند (بدون تکرار و به همان ترتیب).
+    نام ناشناخته خطای ValueError ایجاد می‌کند؛ رشته خالی همان رفتار قبلی ('sheets') است.
+    """
+    sinks = []
+    for name in filter(None, (part.strip().lower() for part in spec.split(','))):
+        if name != 'sheets' and name not in LOCAL_SINK_KINDS:
+            raise ValueError(f"Unknown output sink: {name}")
+        if name not in sinks:
+            sinks.append(name)
+    return sinks or ['sheets']
+
+
+def _ensure_parent(path: str):
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+
+
+class _AppendOnlyFile(abc.ABC):
+    """
+    فایل فقط-افزودنی که هر دسته ردیف را با یک write و یک fsync می‌نویسد. اگر نوشتن دسته نیمه‌کاره بماند
+    فایل به طول پیش از آن برگردانده می‌شود تا تلاش مجدد همان دسته خط ناقص یا تکراری به جا نگذارد.
+    """
+
+    def __init__(self, path: str, headers: Sequence[str]):
+        self.path = path
+        self.headers = list(headers)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write_rows(self, rows: List[list]):
+        if not rows:
+            return
+        with self._lock:
+            file = self._open()
+            start = file.tell()
+            try:
+                file.write(self._encode(rows, start == 0))
+                file.flush()
+                os.fsync(file.fileno())
+            except Exception:
+                self._rollback(start)
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        if self._file is None:
+            _ensure_parent(self.path)
+            self._file = open(self.path, 'ab')
+            self._file.seek(0, os.SEEK_END)
+        return self._file
+
+    def _rollback(self, length: int):
+        try:
+            os.truncate(self.path, length)
+        except OSError as e:
+            logger.error(f"خطا در بازگرداندن فایل خروجی {self.path} پس از نوشتن ناموفق: {e}")
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    @abc.abstractmethod
+    def _encode(self, rows: List[list], new_file: bool) -> bytes:
+        """ردیف‌ها را به بایت‌های قالب فایل تبدیل می‌کند (new_file: فایل هنوز خالی است و سرآیند لازم است)."""
+
+
+class JsonlRowStore(_AppendOnlyFile):
+    """[جدید] خروجی JSON Lines: هر ردیف یک آبجکت با کلیدهای EXPECTED_HEADERS در یک خط."""
+
+    kind = 'jsonl'
+
+    def _encode(self, rows: List[list], new_file: bool) -> bytes:
+        return ''.join(
+            json.dumps(dict(zip(self.headers, row)), ensure_ascii=False, default=str) + '\n' for row in rows
+        ).encode('utf-8')
+
+
+class CsvRowStore(_AppendOnlyFile):
+    """[جدید] خروجی CSV با ستون‌های EXPECTED_HEADERS؛ ردیف هدر فقط در ابتدای فایل جدید نوشته می‌شود."""
+
+    kind = 'csv'
+
+    def _encode(self, rows: List[list], new_file: bool) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if new_file:
+            writer.writerow(self.headers)
+        writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+
+class SqliteRowStore:
+    """
+    [جدید] خروجی SQLite: یک جدول با ستون‌های EXPECTED_HEADERS و ایندکس یکتا روی link، تا ردیفی که دوباره
+    نوشته می‌شود (مثلاً تلاش مجدد پس از خطا) نادیده گرفته شود. هر دسته در یک تراکنش نوشته می‌شود.
+
+    جدول feed_state مکان‌نمای خوراک‌دهنده‌های پس‌زمینه (SheetsFeeder) را نگه می‌دارد: آخرین شناسه ردیفی که
+    به مقصد رسیده و مالک فعلی (lease) تا چند پروسه یک خوراک را همزمان ارسال نکنند.
+    """
+
+    kind = 'sqlite'
+
+    def __init__(self, path: str, headers: Sequence[str]):
+        if 'link' not in headers:
+            raise ValueError("The SQLite output sink requires a 'link' column.")
+        self.path = path
+        self.headers = list(headers)
+        self._lock = threading.Lock()
+        _ensure_parent(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_rows (id INTEGER PRIMARY KEY AUTOINCREMENT, written_at REAL NOT NULL)"
+            )
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(job_rows)")}
+            for header in self.headers:
+                if header not in existing:
+                    self._conn.execute(f"ALTER TABLE job_rows ADD COLUMN {self._quote(header)} TEXT")
+            self._conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS job_rows_link ON job_rows ("link")')
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS feed_state ("
+                " name TEXT PRIMARY KEY, last_id INTEGER NOT NULL, owner TEXT, lease_until REAL)"
+            )
+        columns = ', '.join(self._quote(header) for header in self.headers)
+        self._insert_sql = (
+            f"INSERT OR IGNORE INTO job_rows (written_at, {columns}) VALUES (?, {', '.join('?' * len(self.headers))})"
+        )
+        self._select_sql = f"SELECT id, {columns} FROM job_rows WHERE id > ? ORDER BY id LIMIT ?"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    def write_rows(self, rows: List[list]):
+        if not rows:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(self._insert_sql, [(now, *row) for row in rows])
+
+    def rows_after(self, last_id: int, limit: int) -> List[Tuple[int, list]]:
+        """حداکثر limit ردیف با شناسه بزرگ‌تر از last_id به ترتیب نوشتن: (شناسه، ردیف)."""
+        with self._lock:
+            rows = self._conn.execute(self._select_sql, (last_id, limit)).fetchall()
+        return [(row[0], ['' if value is None else value for value in row[1:]]) for row in rows]
+
+    def links_after(self, last_id: int) -> List[str]:
+        """[جدید] ستون link ردیف‌های با شناسه بزرگ‌تر از last_id (مثلاً ردیف‌هایی که هنوز به شیت نرسیده‌اند)."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                'SELECT "link" FROM job_rows WHERE id > ? AND "link" IS NOT NULL', (last_id,)
+            )]
+
+    def count_after(self, last_id: int) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM job_rows WHERE id > ?", (last_id,)).fetchone()[0]
+
+    def feed_cursor(self, name: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT last_id FROM feed_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def acquire_feed(self, name: str, owner: str, lease_seconds: float) -> bool:
+        """
+        مالکیت خوراک name را برای lease_seconds ثانیه می‌گیرد یا تمدید می‌کند. اگر پروسه دیگری مالک فعال
+        آن باشد False برمی‌گردد.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO feed_state (name, last_id, owner, lease_until) VALUES (?, 0, NULL, 0)", (name,)
+            )
+            updated = self._conn.execute(
+                "UPDATE feed_state SET owner = ?, lease_until = ?"
+                " WHERE name = ? AND (owner = ? OR owner IS NULL OR lease_until < ?)",
+                (owner, now + lease_seconds, name, owner, now),
+            ).rowcount
+        return bool(updated)
+
+    def advance_feed(self, name: str, owner: str, last_id: int) -> bool:
+        """مکان‌نمای خوراک را (فقط اگر هنوز مالک آن باشیم) به last_id می‌برد."""
+        with self._lock, self._conn:
+            return bool(self._conn.execute(
+                "UPDATE feed_state SET last_id = ? WHERE name = ? AND owner = ? AND last_id < ?",
+                (last_id, name, owner, last_id),
+            ).rowcount)
+
+
+_STORE_CLASSES = {store.kind: store for store in (JsonlRowStore, CsvRowStore, SqliteRowStore)}
+_shared_stores: Dict[Tuple[str, str], object] = {}
+_shared_stores_lock = threading.Lock()
+
+
+def get_row_store(kind: str, path: str, headers: Sequence[str]):
+    """
+    خروجی محلی مشترک در سطح پروسه برای (نوع، مسیر). تمام تسک‌ها در یک فایل می‌نویسند و قفل هر خروجی
+    نوشتن دسته‌های آن‌ها را پشت سر هم انجام می‌دهد.
+    """
+    if kind not in _STORE_CLASSES:
+        raise ValueError(f"Unknown output sink: {kind}")
+    key = (kind, os.path.abspath(path))
+    with _shared_stores_lock:
+        if key not in _shared_stores:
+            _shared_stores[key] = _STORE_CLASSES[kind](path, headers)
+        return _shared_stores[key]
+
+
+def close_row_stores():
+    """خروجی‌های مشترک پروسه را می‌بندد (مثلاً پس از بنچمارک که فایل‌های آن در پوشه موقت هستند)."""
+    with _shared_stores_lock:
+        stores = list(_shared_stores.values())
+        _shared_stores.clear()
+    for store in stores:
+        store.close()
+
+
+class LocalRowWriter:
+    """
+    [جدید] صف نوشتن ردیف‌ها در خروجی‌های محلی (JSONL، CSV، SQLite) با همان رابط BufferedSheetWriter
+    (add، restore، flush، pending_count، flushed_count و on_flush) تا پایپ‌لاین بدون تغییر از آن استفاده کند.
+
+    هر دسته با یک نوشتن (و یک fsync یا یک تراکنش) به هر خروجی ارسال می‌شود. اگر یکی از خروجی‌ها خطا دهد،
+    ردیف‌ها در صف می‌مانند و برای هر خروجی فقط ردیف‌هایی که هنوز در آن نوشته نشده‌اند دوباره ارسال می‌شوند.
+    on_flush زمانی صدا زده می‌شود که ردیف‌ها در تمام خروجی‌ها ثبت شده باشند.
+    [اصلاح شد] مانند BufferedSheetWriter دسته زیر _lock برداشته و بیرون از آن (زیر _flush_lock) نوشته می‌شود
+    تا add و pending_count در حین نوشتن فایل و fsync منتظر نمانند.
+    """
+
+    def __init__(self, stores: list, max_rows: int = 200, max_delay: float = 2.0,
+                 on_flush: Optional[Callable[[List[list]], None]] = None):
+        self.stores = list(stores)
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        self.on_flush = on_flush
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List[list] = []
+        # ردیف‌های دسته‌ای که هم‌اکنون در حال نوشتن است
+        self._inflight: List[list] = []
+        # تعداد ردیف‌های ابتدای صف که هر خروجی پیش‌تر (در ارسال ناموفق قبلی) نوشته است؛ فقط زیر _flush_lock
+        self._written = [0] * len(self.stores)
+        self._flushed_count = 0
+        self._last_flush = time.monotonic()
+
+    @property
+    def flushed_count(self) -> int:
+        with self._lock:
+            return self._flushed_count
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._inflight)
+
+    def queued_rows(self) -> List[list]:
+        """[جدید] کپی ردیف‌هایی که هنوز در تمام خروجی‌ها ثبت نشده‌اند (صف و دسته در حال نوشتن)."""
+        with self._lock:
+            return [*self._inflight, *self._pending]
+
+    def add(self, row: list) -> int:
+        """
+        یک ردیف را به صف اضافه می‌کند و در صورت رسیدن به آستانه، صف را ارسال می‌کند.
+        [اصلاح شد] اگر نخ دیگری در حال نوشتن باشد منتظر نمی‌ماند؛ ردیف در نوشتن بعدی ثبت می‌شود.
+        """
+        with self._lock:
+            self._pending.append(row)
+            should_flush = (
+                len(self._pending) >= self.max_rows
+                or time.monotonic() - self._last_flush >= self.max_delay
+            )
+        return self._flush_once(blocking=False) if should_flush else 0
+
+    def restore(self, rows: List[list]):
+        """ردیف‌های بازیابی شده از checkpoint را بدون ارسال فوری به صف اضافه می‌کند."""
+        with self._lock:
+            self._pending.extend(rows)
+
+    def flush(self, retries: int = 0, retry_delay: float = 0.5) -> int:
+        """تمام ردیف‌های صف را در خروجی‌ها می‌نویسد؛ در صورت خطا (پس از retries تلاش مجدد) خطا پرتاب می‌شود."""
+        attempt = 0
+        while True:
+            try:
+                return self._flush_once()
+            except Exception:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+                logger.warning(f"تلاش مجدد برای نوشتن ردیف‌های صف در خروجی‌های محلی ({attempt}/{retries})...")
+                time.sleep(retry_delay * attempt)
+
+    def _flush_once(self, blocking: bool = True) -> int:
+        """
+        [اصلاح شد] دسته فعلی صف را زیر _lock برمی‌دارد و بیرون از آن می‌نویسد. در صورت خطا ردیف‌ها به ابتدای صف
+        برمی‌گردند و _written برای ارسال بعدی معتبر می‌ماند. با blocking=False اگر نوشتن دیگری در جریان باشد
+        بلافاصله ۰ برمی‌گردد.
+        """
+        if not self._flush_lock.acquire(blocking):
+            return 0
+        try:
+            with self._lock:
+                if not self._pending:
+                    self._last_flush = time.monotonic()
+                    return 0
+                rows, self._pending = self._pending, []
+                self._inflight = rows
+
+            try:
+                for i, store in enumerate(self.stores):
+                    if self._written[i] >= len(rows):
+                        continue
+                    with timed(f'output_{store.kind}_write'):
+                        store.write_rows(rows[self._written[i]:])
+                    self._written[i] = len(rows)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = rows
+                    self._inflight = []
+                raise
+
+            self._written = [0] * len(self.stores)
+            with self._lock:
+                self._inflight = []
+                self._flushed_count += len(rows)
+                self._last_flush = time.monotonic()
+            for store in self.stores:
+                metrics.inc('scraper_output_rows_written_total', len(rows), labels={'sink': store.kind},
+                            help_text='Rows written to local output sinks.')
+            logger.info(f"تعداد {len(rows)} ردیف در خروجی‌های محلی ثبت شد.")
+            if self.on_flush:
+                try:
+                    self.on_flush(rows)
+                except Exception as e:
+                    logger.error(f"خطا در پردازش ردیف‌های ثبت شده: {e}")
+            return len(rows)
+        finally:
+            self._flush_lock.release()
@@ -1,27 +1,146 @@
 import re
-from typing import List, Dict, Any, Set
-from urllib.parse import urlencode
+from dataclasses import dataclass
+from typing import Iterable, List, Dict, Any, Optional, Set
+from urllib.parse import parse_qs, urlencode, urlparse
 
 #=====================================================#
 #  بخش مربوط به ساخت URL لینکدین
 #=====================================================#
 
-def build_linkedin_url(keyword: str, location_name: str) -> str:
+def build_linkedin_url(keyword: str, location_name: str, posted_within: Optional[int] = None) -> str:
     """
     یک URL معتبر برای جستجوی مشاغل در لینکدین با پارامترهای اصلی می‌سازد.
     این تابع ساده‌سازی شده تا با اکتور جدید که URL کامل را می‌پذیرد، سازگار باشد.
+    [جدید] posted_within (ثانیه) فیلتر زمان انتشار لینکدین (f_TPR) را اضافه می‌کند.
+    [اصلاح شد] با posted_within نتایج بر اساس تاریخ (sortBy=DD) مرتب می‌شوند تا اجرایی که به سقف نتایج می‌رسد
+    جدیدترین آگهی‌های بازه را دریافت کند.
     """
     base_url = "https://www.linkedin.com/jobs/search/"
     params = {
         "keywords": keyword,
         "location": location_name,
     }
+    if posted_within:
+        params["f_TPR"] = f"r{int(posted_within)}"
+        params["sortBy"] = "DD"
     # سایر فیلترها مانند زمان انتشار یا نوع کار، باید توسط کاربر در فرانت‌اند
     # یا مستقیماً در URL اعمال شوند، مطابق با مستندات اکتور جدید.
     query_string = urlencode(params)
     return f"{base_url}?{query_string}"
 
 
+def normalize_domain(url: str) -> str:
+    """
+    دامنه یک آدرس وب‌سایت را به شکل یکسان (حروف کوچک، بدون www و پورت) برمی‌گرداند.
+    از این مقدار برای تطبیق نتایج اکتور تماس با هر شرکت استفاده می‌شود.
+    """
+    if not url or not isinstance(url, str):
+        return ""
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    host = (urlparse(url).hostname or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+
+_LINKEDIN_JOB_ID_PATTERN = re.compile(r'/jobs/view/(?:[^/?#]*?-)?(\d{6,})(?:[/?#]|$)')
+# مسیر سریع برای شکل رایج لینک آگهی‌ها (بدون urlparse)؛ ستون link شیت می‌تواند صدها هزار ردیف داشته باشد
+_LINKEDIN_JOB_URL_PATTERN = re.compile(
+    r'(?:https?://)?(?:[a-z0-9-]+\.)?linkedin\.com/jobs/view/(?:[^/?#]*?-)?(\d{6,})(?:[/?#]|$)', re.IGNORECASE
+)
+
+
+def canonical_job_key(url: str) -> str:
+    """
+    [جدید] کلید یکتای یک آگهی برای تشخیص تکراری‌ها.
+    برای آگهی‌های لینکدین شناسه عددی آگهی استخراج می‌شود (مستقل از زیردامنه کشور، پارامترهای
+    ردیابی و اسلش انتهایی)؛ برای سایر آدرس‌ها، آدرس بدون query string و با دامنه نرمال‌شده استفاده می‌شود.
+    """
+    if not url or not isinstance(url, str):
+        return ""
+    url = url.strip()
+    match = _LINKEDIN_JOB_URL_PATTERN.match(url)
+    if match:
+        return f"linkedin:{match.group(1)}"
+    if "://" not in url:
+        url = f"https://{url}"
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower().rstrip(".")
+
+    if host == "linkedin.com" or host.endswith(".linkedin.com"):
+        match = _LINKEDIN_JOB_ID_PATTERN.search(parsed.path + "/")
+        if match:
+            return f"linkedin:{match.group(1)}"
+        current_job_id = parse_qs(parsed.query).get("currentJobId", [""])[0]
+        if current_job_id.isdigit():
+            return f"linkedin:{current_job_id}"
+        host = "linkedin.com"
+    elif host.startswith("www."):
+        host = host[4:]
+    return f"{host}{parsed.path.rstrip('/')}"
+
+
+#=====================================================#
+#   [جدید] رکورد فشرده آگهی
+#=====================================================#
+
+def format_address(job_dict: dict) -> str:
+    """
+    آدرس را از فیلدهای مستقیم آبجکت شغل می‌خواند و به رشته تبدیل می‌کند.
+    """
+    if not isinstance(job_dict, dict):
+        return ""
+
+    parts = [
+        job_dict.get('company_street'),
+        job_dict.get('company_locality'),
+        job_dict.get('company_region'),
+        job_dict.get('company_postal_code'),
+        job_dict.get('company_country')
+    ]
+    return ', '.join(filter(None, parts))
+
+
+@dataclass(frozen=True, slots=True)
+class JobRecord:
+    """
+    [جدید] فقط فیلدهایی از آیتم اکتور لینکدین که در پایپ‌لاین استفاده می‌شوند. آیتم‌های اکتور (با
+    include_company_details) توضیحات شرکت و فیلدهای تو در توی حجیم دارند؛ هر صفحه نتایج بلافاصله پس از
+    دریافت به این رکوردها تبدیل می‌شود تا آیتم‌های کامل در طول استخراج اطلاعات تماس در حافظه نمانند.
+    """
+    key: str
+    job_url: str
+    title: str
+    company_name: str
+    company_website: str
+    company_country: str
+    company_address: str
+    employment_type: str
+    posted_datetime: str
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "JobRecord":
+        job_url = item.get('job_url') or ''
+        return cls(
+            key=canonical_job_key(job_url),
+            job_url=job_url,
+            title=item.get('title') or '',
+            company_name=item.get('company_name') or '',
+            company_website=item.get('company_website') or '',
+            company_country=item.get('company_country') or '',
+            company_address=format_address(item),
+            employment_type=item.get('employment_type') or '',
+            posted_datetime=item.get('posted_datetime') or '',
+        )
+
+
+def project_job_items(items: Iterable[Dict[str, Any]]) -> List[JobRecord]:
+    """آیتم‌های خام یک صفحه از نتایج اکتور را به JobRecord تبدیل می‌کند."""
+    return [JobRecord.from_item(item) for item in items if isinstance(item, dict)]
+
+
 #=====================================================#
 #   بخش مربوط به پردازش داده
 #=====================================================#
@@ -57,9 +176,11 @@ def _clean_emails(emails: List[str]) -> List[str]:
     return list(email_set)
 
 
-def process_contact_data(scraped_items: List[Dict[str, Any]], original_job_data: Dict[str, Any]) -> Dict[str, Any]:
+def process_contact_data(scraped_items: List[Dict[str, Any]], original_job: Optional[JobRecord] = None) -> Dict[str, Any]:
     """
     داده‌های خام استخراج شده از اسکرپر اطلاعات تماس را پردازش و تجمیع می‌کند.
+    [اصلاح شد] original_job یک JobRecord (اولین شغل همان دامنه) یا None است؛ اگر آیتم‌های اکتور دامنه
+    نداشته باشند، دامنه از company_website همین رکورد به دست می‌آید.
     """
     if not scraped_items:
         return {}
@@ -95,8 +216,9 @@ def process_contact_data(scraped_items: List[Dict[str, Any]], original_job_data:
         unique_links = _clean_and_get_unique_items(links)
         return unique_links[0] if unique_links else ''
 
+    domain = scraped_items[0].get('domain') or (normalize_domain(original_job.company_website) if original_job else '')
     clean_data = {
-        "domain": scraped_items[0].get('domain', ''),
+        "domain": domain,
         "phones": ', '.join(unique_phones),
         "emails": ', '.join(unique_emails),
         "linkedin": get_first_unique_link(all_linkedins),
@@ -109,3 +231,8 @@ def process_contact_data(scraped_items: List[Dict[str, Any]], original_job_data:
         "discord": get_first_unique_link(all_discords),
     }
     return clean_data
+
+
+def has_direct_contact(contact_info: Dict[str, Any]) -> bool:
+    """[جدید] آیا اطلاعات تماس پردازش شده ایمیل یا شماره تلفن دارد (لینک شبکه‌های اجتماعی کافی نیست)."""
+    return bool(contact_info.get('emails') or contact_info.get('phones'))
@@ -0,0 +1,311 @@
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from django.db import connections
+
+from .combination_queue_service import CombinationQueue
+from .metrics_service import StageTimings, bind_task_timings, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ScrapeWorker:
+    """
+    [جدید] کارگر صف پایدار ترکیب‌ها (manage.py scrape_worker). حداکثر concurrency ترکیب را همزمان از صف
+    برمی‌دارد و هر کدام را با همان پایپ‌لاین views.run_combination اجرا می‌کند.
+
+    - منابع هر تسک (TaskContext) تا زمانی که این کارگر ترکیبی از آن تسک در دست دارد مشترک هستند.
+    - یک نخ heartbeat هر visibility_timeout/3 ثانیه claim ترکیب‌های در حال اجرا را تمدید می‌کند.
+    - ترکیب ناموفق تا max_attempts بار دوباره در صف قرار می‌گیرد.
+    - کارگری که آخرین ترکیب یک تسک را تمام کند، ردیف‌های checkpoint باقی‌مانده (از کارگرهای از کار افتاده)
+      را می‌نویسد و تسک را تمام شده علامت می‌زند.
+    """
+
+    def __init__(self, queue: Optional[CombinationQueue] = None, worker_id: Optional[str] = None,
+                 concurrency: int = 3, visibility_timeout: float = 300.0, poll_interval: float = 2.0,
+                 max_attempts: int = 3):
+        self.queue = queue or CombinationQueue()
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = max(1, concurrency)
+        self.visibility_timeout = max(5.0, visibility_timeout)
+        self.poll_interval = max(0.1, poll_interval)
+        self.max_attempts = max(1, max_attempts)
+
+        self._stop = threading.Event()
+        # پس از پایان تمام ترکیب‌های در حال اجرا (توقف کامل کارگر) تنظیم می‌شود
+        self._finished = threading.Event()
+        # شناسه ردیف -> ردیف CombinationJob در حال اجرا در این کارگر
+        self._active: Dict[int, object] = {}
+        self._active_lock = threading.Lock()
+        # task_id -> {'lock', 'context', 'users'}
+        self._contexts: Dict[str, dict] = {}
+        self._contexts_lock = threading.Lock()
+        # [جدید] تسک‌هایی که این کارگر در حال پایان دادن آن‌هاست (lease آن‌ها هم با heartbeat تمدید می‌شود)
+        self._finalizing: Set[str] = set()
+        self.processed = 0
+
+    def stop(self):
+        """برداشتن ترکیب جدید متوقف می‌شود؛ ترکیب‌های در حال اجرا تمام می‌شوند."""
+        self._stop.set()
+
+    def run(self, exit_when_idle: bool = False) -> int:
+        """
+        حلقه اصلی کارگر تا فراخوانی stop (یا خالی شدن صف با exit_when_idle). تعداد ترکیب‌های پردازش شده برمی‌گردد.
+        """
+        logger.info(
+            f"Worker [{self.worker_id}]: Started with concurrency={self.concurrency}, "
+            f"visibility_timeout={self.visibility_timeout:.0f}s."
+        )
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="scrape-worker-heartbeat", daemon=True)
+        heartbeat.start()
+
+        futures = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="scrape-worker") as pool:
+            while not self._stop.is_set():
+                try:
+                    self._fail_abandoned()
+                    jobs = self.queue.claim(
+                        self.worker_id, self.concurrency - len(futures), self.visibility_timeout, self.max_attempts
+                    )
+                except Exception as e:
+                    logger.error(f"Worker [{self.worker_id}]: Could not claim combinations: {e}")
+                    connections.close_all()
+                    jobs = []
+
+                for job in jobs:
+                    with self._active_lock:
+                        self._active[job.pk] = job
+                    futures.add(pool.submit(self._process, job))
+
+                if not futures:
+                    if exit_when_idle and not jobs:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                _, futures = wait(futures, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+            if futures:
+                logger.info(f"Worker [{self.worker_id}]: Stopping; waiting for {len(futures)} running combinations.")
+        self._stop.set()
+        self._finished.set()
+        logger.info(f"Worker [{self.worker_id}]: Stopped after processing {self.processed} combinations.")
+        return self.processed
+
+    def _process(self, job):
+        from .. import views
+
+        task_id = job.task_id
+        combo = {'country': job.country, 'job': job.keyword, 'incremental': job.incremental}
+        logger.info(
+            f"Worker [{self.worker_id}]: Task [{task_id}]: Claimed combination {job.index}/{job.total} "
+            f"(attempt {job.attempts})."
+        )
+        acquired = False
+        try:
+            views.update_combination_status(task_id, job.index, worker=self.worker_id, attempts=job.attempts)
+            context = self._acquire_context(task_id)
+            acquired = True
+            if context is None:
+                # خطای اتصال یا اعتبارسنجی شیت؛ prepare_task_context تسک را ناموفق علامت زده است
+                self.queue.fail(job, self.worker_id, "Could not prepare the task context.", max_attempts=0)
+                views.update_combination_status(
+                    task_id, job.index, status='failed', error="Could not prepare the task context.",
+                    finished_at=datetime.utcnow()
+                )
+                return
+
+            bind_task_timings(context.timings)
+            # [اصلاح شد] شغل‌هایی که تلاش قبلی این ترکیب رزرو کرده ولی به صف نوشتن نرسانده بود دوباره پردازش می‌شوند
+            released = context.release_combination(job.index)
+            if released:
+                logger.info(
+                    f"Worker [{self.worker_id}]: Task [{task_id}]: Released {released} jobs reserved by an earlier "
+                    f"attempt of combination {job.index}."
+                )
+            error = views.run_combination(context, task_id, combo, job.index, job.total)
+            if error is None:
+                claimed = self.queue.complete(job, self.worker_id)
+            else:
+                new_status = self.queue.fail(job, self.worker_id, error, self.max_attempts)
+                claimed = new_status is not None
+                if new_status == 'queued':
+                    logger.warning(
+                        f"Worker [{self.worker_id}]: Task [{task_id}]: Combination {job.index} will be retried "
+                        f"({job.attempts}/{self.max_attempts} attempts used)."
+                    )
+                    views.update_combination_status(task_id, job.index, status='queued', finished_at=None)
+            if not claimed:
+                logger.warning(
+                    f"Worker [{self.worker_id}]: Task [{task_id}]: Lost the claim on combination {job.index} "
+                    f"while running it; another worker has taken it over."
+                )
+            metrics.inc('scraper_worker_combinations_total',
+                        labels={'status': 'completed' if error is None else 'failed'},
+                        help_text='Queued combinations processed by scrape workers.')
+            with self._active_lock:
+                self.processed += 1
+        except Exception as e:
+            logger.error(f"Worker [{self.worker_id}]: Task [{task_id}]: Unhandled error in combination {job.index}: {e}")
+        finally:
+            bind_task_timings(None)
+            if acquired:
+                self._release_context(task_id)
+            with self._active_lock:
+                self._active.pop(job.pk, None)
+            connections.close_all()
+
+    def _acquire_context(self, task_id: str):
+        """
+        TaskContext مشترک تسک در این کارگر؛ فقط برای اولین ترکیب تسک ساخته می‌شود.
+        [اصلاح شد] تا زمان آزاد شدن context، کارگر lease تسک را در دیتابیس نگه می‌دارد (TaskWorkerLease).
+        """
+        from .. import views
+
+        with self._contexts_lock:
+            entry = self._contexts.setdefault(task_id, {'lock': threading.Lock(), 'context': None, 'users': 0})
+            entry['users'] += 1
+        try:
+            with entry['lock']:
+                if entry['context'] is None:
+                    self.queue.hold_task(task_id, self.worker_id, self.visibility_timeout)
+                    entry['context'] = views.prepare_task_context(task_id, StageTimings())
+                return entry['context']
+        except Exception:
+            self._release_context(task_id)
+            raise
+
+    def _release_context(self, task_id: str):
+        """
+        با پایان آخرین ترکیب تسک در این کارگر، ردیف‌های صف نوشتن ارسال شده و منابع آزاد می‌شوند.
+        [اصلاح شد] پس از ارسال، lease کارگر روی تسک آزاد می‌شود و اگر ترکیب باز و lease زنده دیگری نمانده باشد،
+        تسک (با همین context که صف نوشتن آن خالی است) تمام می‌شود.
+        """
+        from .. import views
+
+        with self._contexts_lock:
+            entry = self._contexts[task_id]
+            entry['users'] -= 1
+            if entry['users'] > 0:
+                return
+            del self._contexts[task_id]
+        context = entry['context']
+        if context is not None and context.writer.pending_count:
+            views.flush_writer(task_id, context.writer)
+        self.queue.release_task(task_id, self.worker_id)
+        if context is None:
+            return
+        try:
+            self._finalize_if_done(task_id, context)
+        except Exception as e:
+            logger.error(f"Worker [{self.worker_id}]: Task [{task_id}]: Could not finish the task: {e}")
+
+    def _finalize_if_done(self, task_id: str, context):
+        """
+        اگر ترکیبی از تسک در صف یا در حال اجرا نمانده باشد، تسک را تمام می‌کند.
+        [اصلاح شد] تا وقتی کارگر دیگری lease تسک را دارد (ردیف‌های ثبت نشده‌ای در صف نوشتن خود دارد) تسک تمام
+        نمی‌شود؛ آخرین کارگری که context خود را آزاد کند آن را تمام می‌کند. lease این کارگر را از ابتدای تلاش تا
+        پایان تسک نگه می‌دارد تا اگر حین پایان دادن از کار بیفتد، پس از انقضای آن کارگر دیگری تسک را تمام کند.
+        """
+        from .. import views
+
+        if self.queue.has_open(task_id) or self.queue.is_held(task_id):
+            return
+        self.queue.hold_task(task_id, self.worker_id, self.visibility_timeout)
+        with self._contexts_lock:
+            self._finalizing.add(task_id)
+        try:
+            # چند کارگر ممکن است همزمان به اینجا برسند؛ فقط کارگری که پایان تسک را به صورت اتمیک claim کند
+            # آن را تمام می‌کند (و checkpointها دو بار نوشته نمی‌شوند)
+            if not self._claim_finalization(task_id):
+                return
+            task = views.pipeline_settings().task_store.get(task_id)
+            # ردیف‌هایی که کارگرهای از کار افتاده استخراج کرده ولی ننوشته بودند
+            views.restore_checkpoint(context, task_id)
+            views.finish_task(task_id, context, task.get('total_combinations') or len(task.get('combinations') or []))
+            logger.info(
+                f"Worker [{self.worker_id}]: Task [{task_id}]: All combinations have been processed. Task completed."
+            )
+        finally:
+            with self._contexts_lock:
+                self._finalizing.discard(task_id)
+            self.queue.release_task(task_id, self.worker_id)
+
+    def _claim_finalization(self, task_id: str) -> bool:
+        """
+        [جدید] وضعیت تسک را با یک تغییر شرطی اتمیک به 'finalizing' می‌برد و فقط در صورت موفقیت True برمی‌گرداند.
+        claim کارگری که lease آن منقضی شده (حین پایان دادن تسک از کار افتاده) دوباره قابل گرفتن است.
+        تسک ناموفق وضعیت 'failed' خود را حفظ می‌کند.
+        """
+        from .. import views
+
+        def claimable(task: dict) -> bool:
+            if task.get('status') == 'completed':
+                return False
+            finalizing_by = task.get('finalizing_by')
+            return (task.get('status') != 'finalizing' or finalizing_by == self.worker_id
+                    or not self.queue.is_held(task_id, finalizing_by))
+
+        def claim(task: dict):
+            if task.get('status') != 'failed':
+                task['status'] = 'finalizing'
+                task['progress'] = 'Writing the remaining rows.'
+            task['finalizing_by'] = self.worker_id
+
+        return views.pipeline_settings().task_store.claim(task_id, claimable, claim)
+
+    def _fail_abandoned(self):
+        """
+        ترکیب‌هایی که کارگرها بارها حین اجرای آن‌ها از کار افتاده‌اند ناموفق علامت زده می‌شوند.
+        [اصلاح شد] تسک‌هایی که lease کارگر از کار افتاده‌ای روی آن‌ها منقضی شده هم (در صورت نبود ترکیب باز) تمام می‌شوند.
+        """
+        from .. import views
+
+        task_ids = []
+        for task_id, index in self.queue.expire_abandoned(self.max_attempts):
+            logger.error(f"Worker [{self.worker_id}]: Task [{task_id}]: Combination {index} was abandoned too many times.")
+            views.update_combination_status(
+                task_id, index, status='failed', finished_at=datetime.utcnow(),
+                error="Worker stopped responding while running this combination."
+            )
+            task_ids.append(task_id)
+        for task_id in self.queue.expire_task_leases():
+            logger.warning(f"Worker [{self.worker_id}]: Task [{task_id}]: The lease of a stopped worker expired.")
+            task_ids.append(task_id)
+
+        for task_id in dict.fromkeys(task_ids):
+            if self.queue.has_open(task_id) or self.queue.is_held(task_id):
+                continue
+            # context ساخته و بلافاصله آزاد می‌شود؛ _release_context تسک را تمام می‌کند
+            self._acquire_context(task_id)
+            self._release_context(task_id)
+
+    def _heartbeat_loop(self):
+        interval = self.visibility_timeout / 3
+        while not self._finished.wait(interval):
+            with self._active_lock:
+                job_ids = list(self._active)
+            with self._contexts_lock:
+                task_ids = [*self._contexts, *self._finalizing]
+            if not job_ids and not task_ids:
+                continue
+            try:
+                self.queue.renew_tasks(self.worker_id, task_ids, self.visibility_timeout)
+                owned = self.queue.heartbeat(self.worker_id, job_ids, self.visibility_timeout)
+                if owned < len(job_ids):
+                    logger.warning(
+                        f"Worker [{self.worker_id}]: {len(job_ids) - owned} running combinations were "
+                        f"claimed by another worker after their visibility timeout expired."
+                    )
+            except Exception as e:
+                logger.error(f"Worker [{self.worker_id}]: Heartbeat failed: {e}")
+            finally:
+                connections.close_all()
@@ -0,0 +1,123 @@
+import logging
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SharedSearch:
+    """
+    نتایج یک اجرای در حال انجام اکتور جستجو که بین چند تسک به اشتراک گذاشته می‌شود.
+    اجراکننده صفحه‌ها را منتشر می‌کند و هر تعداد دنبال‌کننده می‌توانند (حتی با تأخیر) همه صفحه‌ها را از ابتدا بخوانند.
+    """
+
+    def __init__(self, on_finish: Optional[Callable[["SharedSearch"], None]] = None):
+        self._pages: List[list] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+        self._on_finish = on_finish
+        self.followers = 0
+
+    def publish(self, page: list):
+        with self._condition:
+            self._pages.append(page)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._condition:
+            if self._done:
+                return
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+        if self._on_finish:
+            self._on_finish(self)
+
+    def iter_pages(self) -> Iterator[list]:
+        """صفحه‌ها را به ترتیب برمی‌گرداند و تا پایان اجرا منتظر صفحه‌های جدید می‌ماند."""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._pages) and not self._done:
+                    self._condition.wait()
+                if index < len(self._pages):
+                    page = self._pages[index]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            index += 1
+            yield page
+
+
+class SearchCoalescer:
+    """
+    ادغام درخواست‌های همزمان یکسان (Single-flight): برای هر کلید فقط یک اجرای اکتور انجام می‌شود
+    و تسک‌هایی که در حین اجرا همان جستجو را درخواست می‌کنند به نتایج همان اجرا متصل می‌شوند.
+    پس از پایان اجرا کلید آزاد می‌شود؛ یعنی نتایج کش نمی‌شوند و درخواست بعدی اجرای جدیدی می‌سازد.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, SharedSearch] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable) -> Tuple[SharedSearch, bool]:
+        """
+        اجرای مشترک مربوط به کلید را برمی‌گرداند؛ مقدار دوم True است اگر فراخواننده باید خودش اجرا را انجام دهد
+        (در این صورت باید صفحه‌ها را publish کرده و در پایان finish را صدا بزند).
+        """
+        with self._lock:
+            search = self._inflight.get(key)
+            if search is not None:
+                search.followers += 1
+                return search, False
+            search = SharedSearch(on_finish=lambda s: self._release(key, s))
+            self._inflight[key] = search
+            return search, True
+
+    def fetch(self, key: Hashable, produce: Callable[[], Iterable[list]]) -> Tuple[Iterator[list], bool]:
+        """
+        صفحه‌های نتیجه جستجو را برمی‌گرداند؛ اگر اجرای یکسانی در جریان باشد به آن متصل می‌شود.
+        خروجی: (صفحه‌ها، آیا از اجرای مشترک تسک دیگری استفاده شده است).
+        """
+        search, is_leader = self.join(key)
+        if not is_leader:
+            return search.iter_pages(), True
+        return self._lead(key, search, produce), False
+
+    def inflight_count(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def _lead(self, key: Hashable, search: SharedSearch, produce: Callable[[], Iterable[list]]) -> Iterator[list]:
+        pages = iter(produce())
+        try:
+            for page in pages:
+                search.publish(page)
+                yield page
+        except GeneratorExit:
+            # مصرف‌کننده اجراکننده زودتر متوقف شد؛ پس از بستن کلید به روی تسک‌های جدید،
+            # بقیه صفحه‌ها فقط در صورت وجود دنبال‌کننده خوانده می‌شوند
+            if self._release(key, search):
+                try:
+                    for page in pages:
+                        search.publish(page)
+                except Exception as e:
+                    search.finish(e)
+            search.finish()
+            raise
+        except BaseException as e:
+            search.finish(e)
+            raise
+        search.finish()
+
+    def _release(self, key: Hashable, search: SharedSearch) -> int:
+        with self._lock:
+            if self._inflight.get(key) is not search:
+                return search.followers
+            del self._inflight[key]
+            followers = search.followers
+        if followers:
+            logger.info(f"نتایج یک اجرای جستجو با {followers} تسک دیگر به اشتراک گذاشته شد.")
+        return followers
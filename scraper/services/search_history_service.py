@@ -0,0 +1,134 @@
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SearchPlan(NamedTuple):
+    """
+    پارامترهای یک جستجوی افزایشی: بازه زمانی انتشار (ثانیه یا None برای جستجوی کامل) و تعداد نتایج.
+    [جدید] result_limit سقف پیکربندی شده (SEARCH_MAX_RESULTS) است که max_results از آن بیشتر نمی‌شود.
+    """
+    posted_within: Optional[int]
+    max_results: int
+    started_at: float
+    result_limit: Optional[int] = None
+
+
+class SearchHistory:
+    """
+    [جدید] زمان آخرین جستجوی موفق هر (کلیدواژه، کشور) در SQLite تا در حالت افزایشی فقط آگهی‌های
+    منتشر شده پس از آن درخواست شوند.
+    نرخ انتشار آگهی‌ها (آگهی در ساعت) از اجراهای افزایشی قبلی تخمین زده می‌شود و max_results بر اساس آن
+    و طول بازه تعیین می‌شود تا برای صفحه‌هایی که قبلاً دریافت شده‌اند هزینه پرداخت نشود.
+    """
+
+    _instances: Dict[str, "SearchHistory"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_shared(cls, db_path: str, **kwargs) -> "SearchHistory":
+        with cls._instances_lock:
+            if db_path not in cls._instances:
+                cls._instances[db_path] = cls(db_path, **kwargs)
+            return cls._instances[db_path]
+
+    def __init__(self, db_path: str, overlap: float = 3600, max_window: float = 30 * 24 * 3600,
+                 min_results: int = 5, headroom: float = 1.5):
+        self.db_path = db_path
+        # همپوشانی بازه‌ها تا آگهی‌هایی که با تأخیر در نتایج لینکدین ظاهر می‌شوند از دست نروند
+        self.overlap = overlap
+        # اگر آخرین اجرای موفق قدیمی‌تر از این باشد، جستجوی کامل انجام می‌شود
+        self.max_window = max_window
+        self.min_results = max(1, min_results)
+        self.headroom = headroom
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                " keyword TEXT NOT NULL, country TEXT NOT NULL, last_success_at REAL NOT NULL,"
+                " jobs_per_hour REAL, PRIMARY KEY (keyword, country))"
+            )
+            # [اصلاح شد] سقف نتایج اجرای افزایشی قبلی اگر به آن رسیده باشد (بازه آن کامل دریافت نشده است)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(searches)")}
+            if 'capped_at' not in columns:
+                self._conn.execute("ALTER TABLE searches ADD COLUMN capped_at INTEGER")
+
+    @staticmethod
+    def _key(keyword: str, country: str):
+        return keyword.strip().lower(), country.strip().lower()
+
+    def plan(self, keyword: str, country: str, max_results: int) -> SearchPlan:
+        """بازه زمانی و تعداد نتایج جستجوی بعدی را بر اساس آخرین اجرای موفق تعیین می‌کند."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_success_at, jobs_per_hour, capped_at FROM searches WHERE keyword = ? AND country = ?",
+                self._key(keyword, country),
+            ).fetchone()
+        if row is None or now - row[0] > self.max_window:
+            return SearchPlan(None, max_results, now, max_results)
+
+        last_success_at, jobs_per_hour, capped_at = row
+        # بازه به ساعت کامل گرد می‌شود تا جستجوهای همزمان یکسان آدرس یکسانی داشته باشند و ادغام شوند
+        posted_within = int(math.ceil((now - last_success_at + self.overlap) / 3600) * 3600)
+        if jobs_per_hour is None:
+            return SearchPlan(posted_within, max_results, now, max_results)
+        expected = max(self.min_results, math.ceil(jobs_per_hour * posted_within / 3600 * self.headroom))
+        if capped_at:
+            # [اصلاح شد] اجرای قبلی به سقف رسید و بازه آن دوباره جستجو می‌شود؛ سقف دست کم دو برابر می‌شود
+            expected = max(expected, capped_at * 2)
+        return SearchPlan(posted_within, min(max_results, expected), now, max_results)
+
+    def record_success(self, keyword: str, country: str, plan: SearchPlan, scraped: int):
+        """
+        پایان موفق یک جستجو را ثبت می‌کند. زمان شروع اجرا (نه پایان آن) ذخیره می‌شود تا بازه‌ها فاصله نداشته باشند.
+        نرخ انتشار از اجراهای افزایشی به‌روز می‌شود؛ اجرایی که به سقف max_results رسیده فقط حد پایین نرخ را مشخص می‌کند.
+        [اصلاح شد] اجرای افزایشی که به سقف رسیده زمان آخرین جستجو را جلو نمی‌برد، چون آگهی‌هایی از بازه آن که
+        زیر سقف جا نشدند هنوز دریافت نشده‌اند؛ اجرای بعدی همان بازه را با سقف بزرگ‌تر جستجو می‌کند.
+        [اصلاح شد] اگر سقف همان result_limit باشد بزرگ‌تر نمی‌شود و جستجوی دوباره همان صفحه اول را برمی‌گرداند؛
+        در این حالت زمان جستجو جلو می‌رود (نتایج به ترتیب تاریخ هستند، پس جدیدترین آگهی‌ها دریافت شده‌اند).
+        اجرای بدون نتیجه هم ثبت می‌شود تا نرخ انتشار کاهش یابد و بازه جستجو بی‌دلیل بزرگ نشود.
+        """
+        rate = scraped / (plan.posted_within / 3600) if plan.posted_within else None
+        capped = plan.posted_within is not None and scraped >= plan.max_results
+        # بازه فقط وقتی دوباره جستجو می‌شود که سقف آن هنوز قابل افزایش باشد
+        widen = capped and plan.max_results < (plan.result_limit or plan.max_results)
+        with self._lock, self._conn:
+            previous = self._conn.execute(
+                "SELECT jobs_per_hour, last_success_at FROM searches WHERE keyword = ? AND country = ?",
+                self._key(keyword, country),
+            ).fetchone()
+            jobs_per_hour = previous[0] if previous else None
+            last_success_at = previous[1] if widen and previous else plan.started_at
+            if rate is not None:
+                if jobs_per_hour is None:
+                    jobs_per_hour = rate
+                elif scraped >= plan.max_results:
+                    jobs_per_hour = max(jobs_per_hour, rate)
+                else:
+                    jobs_per_hour = 0.7 * jobs_per_hour + 0.3 * rate
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (keyword, country, last_success_at, jobs_per_hour, capped_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (*self._key(keyword, country), last_success_at, jobs_per_hour, plan.max_results if widen else None),
+            )
+        if widen:
+            logger.info(
+                f"جستجوی '{keyword}' در '{country}' به سقف {plan.max_results} نتیجه رسید؛ "
+                f"بازه آن در اجرای بعدی با سقف بزرگ‌تر دوباره جستجو می‌شود."
+            )
+        elif capped:
+            logger.warning(
+                f"جستجوی '{keyword}' در '{country}' به حداکثر {plan.max_results} نتیجه رسید؛ آگهی‌های قدیمی‌تر این "
+                f"بازه دریافت نشدند. برای این جستجو SEARCH_MAX_RESULTS را افزایش دهید."
+            )
+        else:
+            logger.info(f"آخرین جستجوی موفق '{keyword}' در '{country}' ثبت شد ({scraped} نتیجه).")
@@ -0,0 +1,178 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, TypeVar
+
+from .metrics_service import metrics, record_duration, timed
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SheetsQuotaExceeded(Exception):
+    """سهمیه Google Sheets پس از حداکثر زمان انتظار و تلاش‌های مجدد همچنان در دسترس نیست."""
+
+
+class TokenBucket:
+    """
+    [جدید] یک Token Bucket با نرخ تطبیقی (AIMD): پس از هر خطای 429 نرخ مجاز کاهش یافته و تا پایان
+    زمان backoff درخواستی ارسال نمی‌شود؛ با هر درخواست موفق نرخ به تدریج تا سقف سهمیه بالا می‌رود.
+    """
+
+    def __init__(self, limit_per_minute: float, min_rate_ratio: float = 0.1,
+                 base_backoff: float = 1.0, max_backoff: float = 64.0):
+        self.limit_per_minute = max(1.0, limit_per_minute)
+        self.max_rate = self.limit_per_minute / 60.0
+        self.min_rate = self.max_rate * min_rate_ratio
+        self.rate = self.max_rate
+        # ظرفیت انفجاری معادل ۶ ثانیه سهمیه تا پنجره دقیقه‌ای گوگل با یک انفجار پر نشود
+        self.capacity = max(1.0, self.limit_per_minute / 10.0)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._consecutive_throttles = 0
+        self._calls = deque()
+        self._throttled = 0
+        self._waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> float:
+        """
+        تا در دسترس بودن یک توکن منتظر می‌ماند و مدت انتظار (ثانیه) را برمی‌گرداند.
+        اگر انتظار از deadline (زمان monotonic) بگذرد SheetsQuotaExceeded پرتاب می‌شود.
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill_locked(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._calls.append(now)
+                        waited = now - started
+                        self._waited += waited
+                        return waited
+                    wait = (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise SheetsQuotaExceeded("Timed out waiting for Google Sheets quota.")
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self._consecutive_throttles = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttled(self) -> float:
+        """یک خطای 429 را ثبت می‌کند و مدت backoff (با jitter) را برمی‌گرداند."""
+        with self._lock:
+            self._throttled += 1
+            self._consecutive_throttles += 1
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            # توکن‌های ذخیره شده دور ریخته می‌شوند تا پس از backoff یک انفجار دیگر ارسال نشود
+            self._tokens = 0.0
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_throttles - 1))
+            delay *= random.uniform(0.5, 1.0)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim_locked(now)
+            used = len(self._calls)
+            return {
+                'limit_per_minute': self.limit_per_minute,
+                'allowed_per_minute': round(self.rate * 60, 1),
+                'used_last_minute': used,
+                'utilization': round(used / self.limit_per_minute, 3),
+                'throttled_total': self._throttled,
+                'waited_seconds_total': round(self._waited, 3),
+                'backoff_seconds_remaining': round(max(0.0, self._blocked_until - now), 3),
+            }
+
+    def _refill_locked(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        self._trim_locked(now)
+
+    def _trim_locked(self, now: float):
+        while self._calls and now - self._calls[0] > 60:
+            self._calls.popleft()
+
+
+class SheetsQuotaScheduler:
+    """
+    [جدید] زمان‌بند سهمیه Google Sheets در سطح پروسه با Token Bucket جداگانه برای خواندن و نوشتن.
+    تمام فراخوانی‌های API شیت از این زمان‌بند عبور می‌کنند؛ خطای 429 به جای رد شدن ردیف‌ها
+    باعث کاهش نرخ، backoff و تلاش مجدد همان درخواست می‌شود (حداکثر تا max_wait ثانیه).
+    """
+
+    def __init__(self, read_per_minute: float = 60, write_per_minute: float = 60, max_wait: float = 600.0):
+        self.buckets: Dict[str, TokenBucket] = {
+            'read': TokenBucket(read_per_minute),
+            'write': TokenBucket(write_per_minute),
+        }
+        self.max_wait = max_wait
+
+    def call(self, kind: str, stage: str, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        func را پس از گرفتن توکن از bucket مربوط (read یا write) اجرا می‌کند. فقط زمان خود درخواست
+        در مرحله stage ثبت می‌شود و زمان انتظار برای سهمیه در sheets_quota_wait.
+        """
+        bucket = self.buckets[kind]
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            waited = bucket.acquire(deadline)
+            if waited > 0:
+                record_duration('sheets_quota_wait', waited)
+            try:
+                with timed(stage):
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                delay = bucket.on_throttled()
+                metrics.inc('scraper_sheets_throttled_total', labels={'kind': kind},
+                            help_text='Google Sheets requests rejected with 429.')
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(f"سهمیه {kind} گوگل شیت تمام شده است (429)؛ تلاش مجدد پس از {delay:.1f} ثانیه.")
+                continue
+            bucket.on_success()
+            return result
+
+    def snapshot(self) -> dict:
+        return {kind: bucket.snapshot() for kind, bucket in self.buckets.items()}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """آیا خطا پاسخ 429 (RESOURCE_EXHAUSTED) از API گوگل است."""
+    code = getattr(error, 'code', None)
+    response = getattr(error, 'response', None)
+    return code == 429 or getattr(response, 'status_code', None) == 429
+
+
+_shared_scheduler: Optional[SheetsQuotaScheduler] = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_sheets_quota() -> SheetsQuotaScheduler:
+    """نمونه مشترک پروسه؛ به صورت تنبل ساخته می‌شود تا تنظیمات پس از load_dotenv خوانده شوند."""
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = SheetsQuotaScheduler(
+                read_per_minute=float(os.environ.get("SHEETS_READ_QUOTA_PER_MINUTE", "60")),
+                write_per_minute=float(os.environ.get("SHEETS_WRITE_QUOTA_PER_MINUTE", "60")),
+                max_wait=float(os.environ.get("SHEETS_QUOTA_MAX_WAIT", "600")),
+            )
+        return _shared_scheduler
@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """صف تسک‌ها پر است؛ retry_after زمان پیشنهادی (ثانیه) برای تلاش مجدد است."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Task queue is full. Retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class TaskExecutor:
+    """
+    یک Worker Pool با تعداد نخ ثابت و صف اولویت‌دار با ظرفیت محدود.
+    به جای ساختن یک نخ جدید برای هر درخواست، تسک‌ها در صف قرار می‌گیرند و در صورت
+    پر بودن صف، درخواست با QueueFullError رد می‌شود (Admission Control).
+    """
+
+    PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+    def __init__(self, max_workers: int = 2, max_queue_size: int = 20,
+                 on_queue_change: Optional[Callable[[Dict[str, int]], None]] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        # [جدید] با نگاشت task_id به جایگاه فعلی در صف، پس از هر تغییر صف صدا زده می‌شود
+        self.on_queue_change = on_queue_change
+
+        self._queue = []  # heap: (priority, seq, task_id, func, args)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._running = 0
+        # [جدید] شناسه تسک‌هایی که هم‌اکنون در حال اجرا هستند
+        self._active = set()
+        # میانگین نمایی مدت اجرای تسک‌ها برای تخمین زمان تلاش مجدد
+        self._avg_duration = 300.0
+
+    def submit(self, task_id: str, func: Callable, *args, priority: str = 'normal') -> int:
+        """
+        تسک را در صف قرار می‌دهد و جایگاه آن در صف (از ۱) را برمی‌گرداند.
+        """
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"Invalid priority '{priority}'. Expected one of: {', '.join(self.PRIORITIES)}.")
+
+        with self._condition:
+            if len(self._queue) >= self.max_queue_size:
+                raise QueueFullError(self._retry_after_locked())
+            heapq.heappush(self._queue, (self.PRIORITIES[priority], next(self._sequence), task_id, func, args))
+            self._ensure_workers_locked()
+            self._condition.notify()
+            positions = self._positions_locked()
+        self._notify_queue_change(positions)
+        return positions[task_id]
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """جایگاه تسک در صف (از ۱) یا None اگر در صف نباشد."""
+        with self._condition:
+            return self._position_locked(task_id)
+
+    def is_active(self, task_id: str) -> bool:
+        """[جدید] آیا تسک در صف یا در حال اجرا در همین پروسه است."""
+        with self._condition:
+            return task_id in self._active or any(entry[2] == task_id for entry in self._queue)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'queued': len(self._queue),
+                'running': self._running,
+                'max_workers': self.max_workers,
+                'max_queue_size': self.max_queue_size,
+            }
+
+    def _position_locked(self, task_id: str) -> Optional[int]:
+        return self._positions_locked().get(task_id)
+
+    def _positions_locked(self) -> Dict[str, int]:
+        return {entry[2]: position for position, entry in enumerate(sorted(self._queue), start=1)}
+
+    def _notify_queue_change(self, positions: Dict[str, int]):
+        if not self.on_queue_change:
+            return
+        try:
+            self.on_queue_change(positions)
+        except Exception as e:
+            logger.error(f"Error while publishing task queue positions: {e}")
+
+    def _retry_after_locked(self) -> int:
+        # تخمین: زمان لازم برای اینکه کارگرها یک دور کامل از صف را خالی کنند
+        rounds = max(1, len(self._queue) // self.max_workers)
+        return max(30, int(self._avg_duration * rounds / 2))
+
+    def _ensure_workers_locked(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"task-worker-{len(self._workers) + 1}", daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, task_id, func, args = heapq.heappop(self._queue)
+                self._running += 1
+                self._active.add(task_id)
+                positions = self._positions_locked()
+            self._notify_queue_change(positions)
+
+            started = time.monotonic()
+            try:
+                func(task_id, *args)
+            except Exception as e:
+                logger.error(f"Task [{task_id}]: Unhandled error in worker: {e}")
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._active.discard(task_id)
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
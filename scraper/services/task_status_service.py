@@ -0,0 +1,254 @@
+import copy
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class InMemoryTaskStatusStore:
+    """
+    نگهداری وضعیت تسک‌ها در حافظه همین پروسه (مناسب اجرای تک‌پروسه‌ای و توسعه).
+    انقضا با یک heap مرتب بر اساس زمان انقضا انجام می‌شود تا نیازی به پیمایش کامل نباشد.
+    """
+
+    def __init__(self, retention: timedelta, active_ttl: timedelta):
+        self.retention = retention
+        self.active_ttl = active_ttl
+        self._tasks = {}
+        self._versions = {}
+        self._expires_at = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+        # [جدید] منتظران تغییر وضعیت (استریم وضعیت) با هر تغییر بیدار می‌شوند
+        self._changed = threading.Condition(self._lock)
+
+    def create(self, task_id: str, info: dict):
+        with self._lock:
+            self._tasks[task_id] = copy.deepcopy(info)
+            self._versions[task_id] = 1
+            self._set_expiry_locked(task_id)
+            self._changed.notify_all()
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """یک کپی مستقل از وضعیت تسک (یا None) برمی‌گرداند."""
+        with self._lock:
+            info = self._tasks.get(task_id)
+            return copy.deepcopy(info) if info is not None else None
+
+    def get_versioned(self, task_id: str) -> Tuple[Optional[dict], Optional[int]]:
+        """[جدید] وضعیت تسک به همراه شماره نسخه آن (که با هر تغییر یک واحد زیاد می‌شود)."""
+        with self._lock:
+            return self._get_versioned_locked(task_id)
+
+    def wait_for_change(self, task_id: str, version: Optional[int], timeout: float) -> Tuple[Optional[dict], Optional[int]]:
+        """
+        [جدید] تا زمانی که نسخه تسک با version متفاوت شود (یا timeout ثانیه بگذرد) منتظر می‌ماند
+        و آخرین وضعیت و نسخه را برمی‌گرداند.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(task_id) != version, timeout=max(0.0, timeout))
+            return self._get_versioned_locked(task_id)
+
+    def _get_versioned_locked(self, task_id: str) -> Tuple[Optional[dict], Optional[int]]:
+        info = self._tasks.get(task_id)
+        if info is None:
+            return None, None
+        return copy.deepcopy(info), self._versions[task_id]
+
+    def update(self, task_id: str, mutator: Callable[[dict], None]) -> bool:
+        """
+        mutator را به صورت اتمیک روی وضعیت تسک اجرا می‌کند. اگر تسک وجود نداشته باشد False برمی‌گرداند.
+        """
+        with self._lock:
+            info = self._tasks.get(task_id)
+            if info is None:
+                return False
+            mutator(info)
+            self._versions[task_id] += 1
+            self._set_expiry_locked(task_id)
+            self._changed.notify_all()
+            return True
+
+    def claim(self, task_id: str, condition: Callable[[dict], bool], mutator: Callable[[dict], None]) -> bool:
+        """
+        [جدید] mutator را فقط وقتی اجرا می‌کند که condition روی وضعیت فعلی تسک برقرار باشد
+        (بررسی و تغییر با هم و به صورت اتمیک). در صورت اعمال تغییر True برمی‌گرداند.
+        """
+        with self._lock:
+            info = self._tasks.get(task_id)
+            if info is None or not condition(info):
+                return False
+            mutator(info)
+            self._versions[task_id] += 1
+            self._set_expiry_locked(task_id)
+            self._changed.notify_all()
+            return True
+
+    def delete(self, task_id: str):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._versions.pop(task_id, None)
+            self._expires_at.pop(task_id, None)
+            self._changed.notify_all()
+
+    def purge_expired(self) -> int:
+        now = datetime.utcnow()
+        removed = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, task_id = heapq.heappop(self._expiry_heap)
+                # ورودی‌های قدیمی heap (که انقضای آن‌ها بعداً تمدید شده) نادیده گرفته می‌شوند
+                if self._expires_at.get(task_id) == expires_at:
+                    self._tasks.pop(task_id, None)
+                    self._versions.pop(task_id, None)
+                    self._expires_at.pop(task_id, None)
+                    removed += 1
+            if removed:
+                self._changed.notify_all()
+        return removed
+
+    def _set_expiry_locked(self, task_id: str):
+        expires_at = _expiry_for(self._tasks[task_id], self.retention, self.active_ttl)
+        if self._expires_at.get(task_id) != expires_at:
+            self._expires_at[task_id] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, task_id))
+
+
+class DatabaseTaskStatusStore:
+    """
+    نگهداری وضعیت تسک‌ها در دیتابیس Django (مدل TaskStatus) تا تمام پروسه‌های WSGI
+    تسک‌های یکدیگر را ببینند. جستجو با کلید اصلی و حذف با ایندکس expires_at انجام می‌شود.
+    """
+
+    def __init__(self, retention: timedelta, active_ttl: timedelta, poll_interval: float = 1.0):
+        self.retention = retention
+        self.active_ttl = active_ttl
+        # تغییرات یک تسک همیشه از پروسه اجراکننده آن انجام می‌شود؛ این قفل از تداخل نخ‌های همان پروسه جلوگیری می‌کند
+        self._lock = threading.Lock()
+        # [جدید] تغییرات همین پروسه منتظران را فوراً بیدار می‌کنند؛ تغییرات سایر پروسه‌ها با پرس‌وجوی دوره‌ای دیده می‌شوند
+        self.poll_interval = poll_interval
+        self._changed = threading.Condition()
+
+    def create(self, task_id: str, info: dict):
+        from ..models import TaskStatus
+
+        TaskStatus.objects.create(
+            task_id=task_id, data=info, version=1,
+            expires_at=self._aware(_expiry_for(info, self.retention, self.active_ttl)),
+        )
+
+    def get(self, task_id: str) -> Optional[dict]:
+        from ..models import TaskStatus
+
+        return TaskStatus.objects.filter(pk=task_id).values_list('data', flat=True).first()
+
+    def get_versioned(self, task_id: str) -> Tuple[Optional[dict], Optional[int]]:
+        from ..models import TaskStatus
+
+        row = TaskStatus.objects.filter(pk=task_id).values_list('data', 'version').first()
+        return row if row else (None, None)
+
+    def wait_for_change(self, task_id: str, version: Optional[int], timeout: float) -> Tuple[Optional[dict], Optional[int]]:
+        from ..models import TaskStatus
+
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            # ابتدا فقط شماره نسخه (با کلید اصلی) خوانده می‌شود
+            current = TaskStatus.objects.filter(pk=task_id).values_list('version', flat=True).first()
+            remaining = deadline - time.monotonic()
+            if current != version or remaining <= 0:
+                return self.get_versioned(task_id)
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+
+    def update(self, task_id: str, mutator: Callable[[dict], None]) -> bool:
+        from django.db import transaction
+        from ..models import TaskStatus
+
+        with self._lock, transaction.atomic():
+            task = TaskStatus.objects.select_for_update().filter(pk=task_id).first()
+            if task is None:
+                return False
+            mutator(task.data)
+            task.version += 1
+            task.expires_at = self._aware(_expiry_for(task.data, self.retention, self.active_ttl))
+            task.save(update_fields=['data', 'version', 'expires_at', 'updated_at'])
+        with self._changed:
+            self._changed.notify_all()
+        return True
+
+    def claim(self, task_id: str, condition: Callable[[dict], bool], mutator: Callable[[dict], None]) -> bool:
+        """
+        [جدید] mutator را فقط وقتی اجرا می‌کند که condition روی وضعیت فعلی تسک برقرار باشد.
+        برخلاف update که فقط نخ‌های همین پروسه را هماهنگ می‌کند، این متد میان پروسه‌ها و میزبان‌ها هم
+        اتمیک است: ردیف با یک UPDATE شرطی روی شماره نسخه خوانده شده نوشته می‌شود و اگر پروسه دیگری
+        در این فاصله آن را تغییر داده باشد، بررسی شرط با وضعیت جدید تکرار می‌شود.
+        """
+        from django.utils import timezone
+        from ..models import TaskStatus
+
+        while True:
+            data, version = self.get_versioned(task_id)
+            if data is None or not condition(data):
+                return False
+            mutator(data)
+            updated = TaskStatus.objects.filter(pk=task_id, version=version).update(
+                data=data, version=version + 1, updated_at=timezone.now(),
+                expires_at=self._aware(_expiry_for(data, self.retention, self.active_ttl)),
+            )
+            if updated:
+                break
+        with self._changed:
+            self._changed.notify_all()
+        return True
+
+    def delete(self, task_id: str):
+        from ..models import TaskStatus
+
+        TaskStatus.objects.filter(pk=task_id).delete()
+
+    def purge_expired(self) -> int:
+        from django.utils import timezone
+        from ..models import TaskStatus
+
+        removed, _ = TaskStatus.objects.filter(expires_at__lte=timezone.now()).delete()
+        return removed
+
+    @staticmethod
+    def _aware(value: datetime) -> datetime:
+        from django.utils import timezone
+
+        return timezone.make_aware(value, dt_timezone.utc) if timezone.is_naive(value) else value
+
+
+def _expiry_for(info: dict, retention: timedelta, active_ttl: timedelta) -> datetime:
+    """
+    زمان انقضای یک تسک: زمان پایان + مدت نگهداری برای تسک‌های تمام شده، و زمان شروع + active_ttl
+    برای بقیه (تا تسک‌هایی که به هر دلیل هرگز تمام نشده‌اند هم در نهایت حذف شوند).
+    """
+    finished_at = _as_datetime(info.get('finished_at'))
+    if info.get('status') in FINISHED_STATUSES and finished_at:
+        return finished_at + retention
+    return (_as_datetime(info.get('started_at')) or datetime.utcnow()) + active_ttl
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    # مقادیر خوانده شده از دیتابیس به صورت رشته ISO ذخیره شده‌اند
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def get_task_status_store(backend: str, retention: timedelta, active_ttl: timedelta, poll_interval: float = 1.0):
+    """پیاده‌سازی مخزن وضعیت تسک‌ها را بر اساس نام backend ('database' یا 'memory') برمی‌گرداند."""
+    if backend == 'memory':
+        return InMemoryTaskStatusStore(retention, active_ttl)
+    if backend == 'database':
+        return DatabaseTaskStatusStore(retention, active_ttl, poll_interval=poll_interval)
+    raise ValueError(f"Unknown task status backend '{backend}'. Expected 'database' or 'memory'.")
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from scraper.services.output_sink_service import JsonlRowStore, LocalRowWriter, SqliteRowStore
+
+HEADERS = ['title', 'link']
+
+
+class FlakyStore:
+    """خروجی حافظه‌ای که failures بار اول نوشتن را با خطا رد می‌کند."""
+
+    kind = 'flaky'
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.rows = []
+
+    def write_rows(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.rows.extend(rows)
+
+
+class LocalRowWriterRetryTests(SimpleTestCase):
+    """ارسال مجدد صف نوشتن محلی پس از خطای یکی از خروجی‌ها."""
+
+    def setUp(self):
+        self.flushed = []
+        self.healthy = FlakyStore()
+        self.failing = FlakyStore(failures=1)
+        self.writer = LocalRowWriter([self.healthy, self.failing], max_rows=100, on_flush=self.flushed.extend)
+
+    def test_failed_rows_stay_queued(self):
+        self.writer.add(['a', 'link-a'])
+        self.writer.add(['b', 'link-b'])
+
+        with self.assertRaises(OSError):
+            self.writer.flush()
+        self.assertEqual(self.writer.pending_count, 2)
+        self.assertEqual(self.writer.queued_rows(), [['a', 'link-a'], ['b', 'link-b']])
+        self.assertEqual(self.flushed, [])
+
+    def test_retry_writes_each_row_once_per_store(self):
+        self.writer.add(['a', 'link-a'])
+        with self.assertRaises(OSError):
+            self.writer.flush()
+        self.writer.add(['b', 'link-b'])
+
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(self.healthy.rows, [['a', 'link-a'], ['b', 'link-b']])
+        self.assertEqual(self.failing.rows, [['a', 'link-a'], ['b', 'link-b']])
+        self.assertEqual(self.flushed, [['a', 'link-a'], ['b', 'link-b']])
+        self.assertEqual((self.writer.pending_count, self.writer.flushed_count), (0, 2))
+
+    def test_flush_retries(self):
+        self.writer.add(['a', 'link-a'])
+
+        self.assertEqual(self.writer.flush(retries=1, retry_delay=0), 1)
+        self.assertEqual(self.failing.rows, [['a', 'link-a']])
+
+
+class LocalRowStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+
+    def test_jsonl_rows_are_appended(self):
+        store = JsonlRowStore(os.path.join(self.dir, "rows.jsonl"), HEADERS)
+        self.addCleanup(store.close)
+        store.write_rows([['a', 'link-a']])
+        store.write_rows([['b', 'link-b']])
+
+        with open(store.path, encoding='utf-8') as file:
+            self.assertEqual([json.loads(line)['link'] for line in file], ['link-a', 'link-b'])
+
+    def test_sqlite_ignores_rewritten_links(self):
+        store = SqliteRowStore(os.path.join(self.dir, "rows.sqlite3"), HEADERS)
+        self.addCleanup(store.close)
+        store.write_rows([['a', 'link-a']])
+        store.write_rows([['a', 'link-a'], ['b', 'link-b']])
+
+        self.assertEqual([row for _, row in store.rows_after(0, 10)], [['a', 'link-a'], ['b', 'link-b']])
@@ -0,0 +1,95 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+
+from scraper import views
+from scraper.services.combination_queue_service import CombinationQueue
+from scraper.services.job_reservation_service import JobKeyReservations
+from scraper.services.scrape_worker_service import ScrapeWorker
+from scraper.services.task_status_service import DatabaseTaskStatusStore
+
+
+class ScrapeWorkerFinalizationTests(TestCase):
+    """پایان دادن تسک توسط کارگرها: انتظار برای lease سایر کارگرها و گرفتن پایان تسک کارگر از کار افتاده."""
+
+    def setUp(self):
+        self.store = DatabaseTaskStatusStore(timedelta(hours=1), timedelta(hours=1))
+        settings = views.use_pipeline_settings(views.default_pipeline_settings()._replace(task_store=self.store))
+        settings.__enter__()
+        self.addCleanup(settings.__exit__, None, None, None)
+
+        self.task_id = str(uuid.uuid4())
+        self.store.create(self.task_id, {'status': 'running', 'combinations': [], 'total_combinations': 0})
+        self.queue = CombinationQueue()
+        self.worker = ScrapeWorker(queue=self.queue, worker_id='worker-a', visibility_timeout=30)
+
+        restore = mock.patch.object(views, 'restore_checkpoint')
+        finish = mock.patch.object(views, 'finish_task')
+        self.restore_checkpoint = restore.start()
+        self.finish_task = finish.start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_waits_while_another_worker_holds_the_task(self):
+        self.queue.hold_task(self.task_id, 'worker-b', 30)
+
+        self.worker._finalize_if_done(self.task_id, mock.Mock())
+        self.finish_task.assert_not_called()
+        self.assertEqual(self.store.get(self.task_id)['status'], 'running')
+
+        self.queue.release_task(self.task_id, 'worker-b')
+        self.worker._finalize_if_done(self.task_id, mock.Mock())
+        self.restore_checkpoint.assert_called_once()
+        self.finish_task.assert_called_once()
+        self.assertFalse(self.queue.is_held(self.task_id))
+
+    def test_waits_for_open_combinations(self):
+        self.queue.enqueue(self.task_id, [{'country': 'US', 'job': 'dev'}])
+
+        self.worker._finalize_if_done(self.task_id, mock.Mock())
+        self.finish_task.assert_not_called()
+
+    def test_reclaims_finalization_of_a_stopped_worker(self):
+        self.store.update(self.task_id, lambda task: task.update(status='finalizing', finalizing_by='worker-c'))
+        self.queue.hold_task(self.task_id, 'worker-c', -1)
+
+        self.assertEqual(self.queue.expire_task_leases(), [self.task_id])
+        self.worker._finalize_if_done(self.task_id, mock.Mock())
+        self.finish_task.assert_called_once()
+        self.assertEqual(self.store.get(self.task_id)['finalizing_by'], 'worker-a')
+
+    def test_does_not_take_over_a_live_finalizer(self):
+        self.store.update(self.task_id, lambda task: task.update(status='finalizing', finalizing_by='worker-c'))
+        self.queue.hold_task(self.task_id, 'worker-c', 30)
+
+        self.assertFalse(self.worker._claim_finalization(self.task_id))
+
+    def test_failed_task_keeps_its_status(self):
+        self.store.update(self.task_id, lambda task: task.update(status='failed'))
+
+        self.worker._finalize_if_done(self.task_id, mock.Mock())
+        self.finish_task.assert_called_once()
+        self.assertEqual(self.store.get(self.task_id)['status'], 'failed')
+
+
+class JobKeyReservationTests(TestCase):
+    """رزروهایی که تلاش ناموفق یک ترکیب به صف نوشتن نرسانده با تلاش بعدی آزاد می‌شوند."""
+
+    def test_retry_releases_only_unqueued_keys(self):
+        task_id = str(uuid.uuid4())
+        first_attempt = JobKeyReservations(task_id)
+        self.assertEqual(first_attempt.reserve('scope', ['a', 'b', 'c'], combination=1), {'a', 'b', 'c'})
+        first_attempt.mark_queued('scope', ['a'])
+
+        retry = JobKeyReservations(task_id)
+        self.assertEqual(retry.release_unqueued(1), {'b', 'c'})
+        self.assertEqual(retry.reserve('scope', ['a', 'b', 'c'], combination=1), {'b', 'c'})
+
+    def test_other_combinations_are_not_released(self):
+        task_id = str(uuid.uuid4())
+        reservations = JobKeyReservations(task_id)
+        reservations.reserve('scope', ['a'], combination=1)
+
+        self.assertEqual(reservations.release_unqueued(2), set())
+        self.assertEqual(JobKeyReservations(task_id).reserve('scope', ['a'], combination=2), set())
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.test import SimpleTestCase
+
+from scraper.services.processing_service import build_linkedin_url
+from scraper.services.search_history_service import SearchHistory, SearchPlan
+
+
+class SearchHistoryPlanTests(SimpleTestCase):
+    """برنامه‌ریزی بازه جستجوهای افزایشی بر اساس آخرین اجرای موفق و سقف نتایج."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.history = SearchHistory(os.path.join(temp_dir.name, "history.sqlite3"))
+        self.addCleanup(self.history._conn.close)
+
+    def test_first_search_is_complete(self):
+        plan = self.history.plan('dev', 'US', 100)
+        self.assertIsNone(plan.posted_within)
+        self.assertEqual(plan.max_results, 100)
+
+    def test_next_search_starts_at_the_last_success(self):
+        first = self.history.plan('dev', 'US', 100)
+        self.history.record_success('dev', 'US', first, 40)
+
+        plan = self.history.plan('Dev ', 'us', 100)
+        # یک ساعت همپوشانی، گرد شده به ساعت کامل بعدی
+        self.assertEqual(plan.posted_within, 7200)
+        self.assertEqual(plan.result_limit, 100)
+
+    def test_capped_window_is_searched_again_with_a_larger_limit(self):
+        first = self.history.plan('dev', 'US', 100)
+        self.history.record_success('dev', 'US', first, 40)
+        capped = SearchPlan(3600, 20, time.time(), 100)
+        self.history.record_success('dev', 'US', capped, 20)
+
+        self.assertEqual(self._row(), (first.started_at, 20))
+        retry = self.history.plan('dev', 'US', 100)
+        self.assertGreaterEqual(retry.max_results, 40)
+
+    def test_window_moves_on_when_capped_at_the_result_limit(self):
+        self.history.record_success('dev', 'US', self.history.plan('dev', 'US', 20), 10)
+        capped = SearchPlan(3600, 20, time.time(), 20)
+        self.history.record_success('dev', 'US', capped, 20)
+
+        self.assertEqual(self._row(), (capped.started_at, None))
+        self.assertEqual(self.history.plan('dev', 'US', 20).max_results, 20)
+
+    def _row(self):
+        """(last_success_at، capped_at) ذخیره شده."""
+        return self.history._conn.execute("SELECT last_success_at, capped_at FROM searches").fetchone()
+
+
+class IncrementalSearchUrlTests(SimpleTestCase):
+
+    def test_incremental_search_is_sorted_by_date(self):
+        query = parse_qs(urlparse(build_linkedin_url('dev', 'US', posted_within=7200)).query)
+        self.assertEqual(query['f_TPR'], ['r7200'])
+        self.assertEqual(query['sortBy'], ['DD'])
+
+    def test_complete_search_keeps_the_default_order(self):
+        query = parse_qs(urlparse(build_linkedin_url('dev', 'US')).query)
+        self.assertNotIn('sortBy', query)
+        self.assertNotIn('f_TPR', query)
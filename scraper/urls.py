@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ScrapeJobsView, ScrapeStatusView
+from .views import ApifyWebhookView, MetricsView, ScrapeJobsView, ScrapeResumeView, ScrapeStatusStreamView, ScrapeStatusView
 
 urlpatterns = [
     # The main endpoint to start the scraping process
@@ -7,4 +7,16 @@ urlpatterns = [
     
     # [NEW] The endpoint to check the status of a running task
     path('scrapStatus/<str:task_id>', ScrapeStatusView.as_view(), name='scrap-status'),
+
+    # [NEW] Server-Sent Events stream of status updates for a task
+    path('scrapStatus/<str:task_id>/stream', ScrapeStatusStreamView.as_view(), name='scrap-status-stream'),
+
+    # [NEW] Continue an interrupted task from its last checkpoint
+    path('scrapResume/<str:task_id>', ScrapeResumeView.as_view(), name='scrap-resume'),
+
+    # [NEW] Completion webhook for actor runs started in webhook mode
+    path('apifyWebhook', ApifyWebhookView.as_view(), name='apify-webhook'),
+
+    # [NEW] Aggregated pipeline metrics in Prometheus text format
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,19 +1,49 @@
+import asyncio
+import contextvars
+import hmac
+import json
 import logging
 import threading
 import os
+import socket
 import uuid
 import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Mapping, NamedTuple, Optional, Union
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
 
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections
+from django.http import HttpResponse, StreamingHttpResponse
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .services.apify_service import ApifyService
-from .services.google_sheets_service import GoogleSheetsService
-from .services.processing_service import build_linkedin_url, process_contact_data
+from .services.actor_webhook_service import get_actor_run_waiter, webhook_token
+from .services.apify_service import ApifyService, AsyncApifyService
+from .services.checkpoint_service import TaskCheckpointStore
+from .services.combination_queue_service import CombinationQueue
+from .services.contact_cache_service import ContactCache
+from .services.contact_crawl_service import (
+    AdaptiveContactCrawl, ContactCrawlPartialError, ContactCrawlStats, parse_crawl_ladder,
+)
+from .services.google_sheets_service import BufferedSheetWriter, GoogleSheetsService, SheetsFeeder
+from .services.job_reservation_service import JobKeyReservations
+from .services.link_index_service import LinkIndex
+from .services.metrics_service import StageTimings, bind_task_timings, metrics, timed
+from .services.output_sink_service import LocalRowWriter, get_row_store, parse_output_sinks
+from .services.search_coalescer_service import SearchCoalescer, SharedSearch
+from .services.search_history_service import SearchHistory, SearchPlan
+from .services.sheets_quota_service import get_sheets_quota
+from .services.task_status_service import get_task_status_store
+from .services.task_queue_service import QueueFullError, TaskExecutor
+from .services.processing_service import (
+    JobRecord, build_linkedin_url, canonical_job_key, normalize_domain, process_contact_data, project_job_items
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,9 +51,120 @@ load_dotenv()
 # Get the logger
 logger = logging.getLogger(__name__)
 
+# حداکثر تعداد اجرای همزمان اکتور اطلاعات تماس در هر ترکیب کشور/شغل
+CONTACT_SCRAPER_MAX_WORKERS = int(os.environ.get("CONTACT_SCRAPER_MAX_WORKERS", "5"))
+# تعداد وب‌سایت‌هایی که در یک اجرای اکتور اطلاعات تماس ارسال می‌شوند
+CONTACT_SCRAPER_BATCH_SIZE = max(1, int(os.environ.get("CONTACT_SCRAPER_BATCH_SIZE", "10")))
+# آستانه‌های ارسال دسته‌ای ردیف‌ها به Google Sheets (تعداد ردیف و ثانیه)
+SHEETS_WRITE_BATCH_SIZE = int(os.environ.get("SHEETS_WRITE_BATCH_SIZE", "50"))
+SHEETS_WRITE_MAX_DELAY = float(os.environ.get("SHEETS_WRITE_MAX_DELAY", "30"))
+# مدت اعتبار نشست مشترک Google Sheets در پروسه (ثانیه)
+SHEETS_SESSION_TTL = float(os.environ.get("SHEETS_SESSION_TTL", "1800"))
+# [جدید] خروجی ردیف‌ها (جدا شده با کاما): 'sheets' (پیش‌فرض) و/یا خروجی‌های محلی 'jsonl'، 'csv' و 'sqlite'.
+# با خروجی محلی ردیف‌ها بدون انتظار برای سهمیه گوگل ثبت می‌شوند؛ اگر 'sheets' هم در فهرست باشد شیت در پس‌زمینه
+# از خروجی SQLite تغذیه می‌شود (و sqlite در این حالت به طور خودکار اضافه می‌شود).
+OUTPUT_SINKS = parse_output_sinks(os.environ.get("OUTPUT_SINKS", "sheets"))
+LOCAL_OUTPUT_SINKS = [sink for sink in OUTPUT_SINKS if sink != 'sheets']
+if 'sheets' in OUTPUT_SINKS and LOCAL_OUTPUT_SINKS and 'sqlite' not in LOCAL_OUTPUT_SINKS:
+    LOCAL_OUTPUT_SINKS.append('sqlite')
+OUTPUT_SINK_PATHS = {
+    'jsonl': os.environ.get("OUTPUT_JSONL_PATH", "jobs_output.jsonl"),
+    'csv': os.environ.get("OUTPUT_CSV_PATH", "jobs_output.csv"),
+    'sqlite': os.environ.get("OUTPUT_SQLITE_PATH", "jobs_output.sqlite3"),
+}
+# آستانه‌های نوشتن دسته‌ای در خروجی‌های محلی (تعداد ردیف و ثانیه)
+OUTPUT_WRITE_BATCH_SIZE = int(os.environ.get("OUTPUT_WRITE_BATCH_SIZE", "200"))
+OUTPUT_WRITE_MAX_DELAY = float(os.environ.get("OUTPUT_WRITE_MAX_DELAY", "2"))
+# اندازه هر دسته و فاصله بررسی ردیف‌های جدید در ارسال پس‌زمینه خروجی SQLite به شیت (ثانیه)
+SHEETS_FEED_BATCH_SIZE = int(os.environ.get("SHEETS_FEED_BATCH_SIZE", "500"))
+SHEETS_FEED_INTERVAL = float(os.environ.get("SHEETS_FEED_INTERVAL", "5"))
+# مسیر فایل SQLite ایندکس محلی لینک‌های ثبت شده در شیت
+LINK_INDEX_PATH = os.environ.get("LINK_INDEX_PATH", "link_index.sqlite3")
+# کش اطلاعات تماس شرکت‌ها بر اساس دامنه: مسیر فایل، مدت اعتبار (ثانیه) و حداکثر تعداد رکورد
+CONTACT_CACHE_PATH = os.environ.get("CONTACT_CACHE_PATH", "contact_cache.sqlite3")
+CONTACT_CACHE_TTL = float(os.environ.get("CONTACT_CACHE_TTL", str(7 * 24 * 3600)))
+CONTACT_CACHE_NEGATIVE_TTL = float(os.environ.get("CONTACT_CACHE_NEGATIVE_TTL", str(24 * 3600)))
+CONTACT_CACHE_MAX_ENTRIES = int(os.environ.get("CONTACT_CACHE_MAX_ENTRIES", "50000"))
+# [جدید] پیمایش تطبیقی اطلاعات تماس: ابتدا پیمایش سطحی و فقط در صورت نبود ایمیل یا تلفن، پله‌های عمیق‌تر
+# (عمق:درخواست به ازای هر وب‌سایت) و مسیر فایل SQLite آمار پله موفق هر دامنه
+CONTACT_CRAWL_ADAPTIVE = os.environ.get("CONTACT_CRAWL_ADAPTIVE", "false").lower() in ('true', '1', 't')
+CONTACT_CRAWL_LADDER = parse_crawl_ladder(os.environ.get("CONTACT_CRAWL_LADDER", "0:1,1:4,2:10"))
+CONTACT_CRAWL_STATS_PATH = os.environ.get("CONTACT_CRAWL_STATS_PATH", "contact_crawl_stats.sqlite3")
+# حداکثر تعداد ترکیب‌های کشور/شغل که در یک تسک همزمان اجرا می‌شوند
+COMBINATION_MAX_WORKERS = int(os.environ.get("COMBINATION_MAX_WORKERS", "3"))
+# دریافت نتایج اکتور لینکدین به صورت استریم در حین اجرا و اندازه هر صفحه
+APIFY_STREAM_RESULTS = os.environ.get("APIFY_STREAM_RESULTS", "true").lower() in ('true', '1', 't')
+APIFY_STREAM_PAGE_SIZE = int(os.environ.get("APIFY_STREAM_PAGE_SIZE", "25"))
+# پارامترهای اجرای اکتور جستجوی لینکدین
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "10"))
+SEARCH_PROXY_GROUP = "DATACENTER"
+# حالت افزایشی: فقط آگهی‌های منتشر شده پس از آخرین جستجوی موفق هر (کلیدواژه، کشور) درخواست می‌شوند
+INCREMENTAL_SEARCH = os.environ.get("INCREMENTAL_SEARCH", "false").lower() in ('true', '1', 't')
+SEARCH_HISTORY_PATH = os.environ.get("SEARCH_HISTORY_PATH", "search_history.sqlite3")
+# موتور اجرای تسک‌ها: 'sync' (نخ‌ها) یا 'async' (asyncio)
+PIPELINE_ENGINE = os.environ.get("PIPELINE_ENGINE", "sync").lower()
+# تعداد تسک‌هایی که همزمان اجرا می‌شوند و ظرفیت صف انتظار؛ درخواست‌های اضافه با 429 رد می‌شوند
+TASK_MAX_WORKERS = int(os.environ.get("TASK_MAX_WORKERS", "2"))
+TASK_QUEUE_SIZE = int(os.environ.get("TASK_QUEUE_SIZE", "20"))
+# مخزن وضعیت تسک‌ها ('database' یا 'memory')، مدت نگهداری تسک‌های تمام شده و حداکثر عمر تسک‌های فعال (ثانیه)
+TASK_STATUS_BACKEND = os.environ.get("TASK_STATUS_BACKEND", "database")
+TASK_STATUS_RETENTION = float(os.environ.get("TASK_STATUS_RETENTION", "3600"))
+TASK_STATUS_ACTIVE_TTL = float(os.environ.get("TASK_STATUS_ACTIVE_TTL", str(24 * 3600)))
+TASK_STATUS_PURGE_INTERVAL = float(os.environ.get("TASK_STATUS_PURGE_INTERVAL", "600"))
+# [جدید] استریم وضعیت: حداکثر انتظار long-poll، حداکثر عمر اتصال SSE، فاصله keep-alive و
+# فاصله بررسی تغییرات دیتابیس (برای تغییراتی که در پروسه‌های دیگر انجام می‌شوند)
+TASK_STATUS_LONG_POLL_TIMEOUT = float(os.environ.get("TASK_STATUS_LONG_POLL_TIMEOUT", "30"))
+TASK_STATUS_STREAM_MAX_DURATION = float(os.environ.get("TASK_STATUS_STREAM_MAX_DURATION", "120"))
+TASK_STATUS_STREAM_KEEPALIVE = float(os.environ.get("TASK_STATUS_STREAM_KEEPALIVE", "15"))
+TASK_STATUS_POLL_INTERVAL = float(os.environ.get("TASK_STATUS_POLL_INTERVAL", "1"))
+# [اصلاح شد] حداکثر تعداد اتصال‌های SSE و long-poll همزمان در هر پروسه؛ هر کدام در سرور WSGI همگام یک نخ
+# را در تمام مدت اتصال اشغال می‌کنند و درخواست‌های اضافه با 503 و Retry-After رد می‌شوند
+TASK_STATUS_MAX_WAITERS = max(1, int(os.environ.get("TASK_STATUS_MAX_WAITERS", "8")))
+# [جدید] checkpoint ردیف‌های استخراج شده ولی ثبت نشده در دیتابیس تا تسک‌ها پس از راه‌اندازی مجدد ادامه یابند
+# (فقط با مخزن وضعیت دیتابیسی؛ وضعیت تسک‌های مخزن حافظه با راه‌اندازی مجدد از بین می‌رود)
+TASK_CHECKPOINTS = (
+    os.environ.get("TASK_CHECKPOINTS", "true").lower() in ('true', '1', 't') and TASK_STATUS_BACKEND == 'database'
+)
+# [جدید] اجرای ترکیب‌ها: 'thread' (Worker Pool همین پروسه وب) یا 'database' (صف پایدار در دیتابیس؛ پروسه وب فقط
+# ترکیب‌ها را در صف قرار می‌دهد و کارگرهای manage.py scrape_worker روی هر تعداد میزبان آن‌ها را اجرا می‌کنند).
+# صف دیتابیسی فقط با مخزن وضعیت دیتابیسی قابل استفاده است.
+TASK_QUEUE_BACKEND = os.environ.get("TASK_QUEUE_BACKEND", "thread").lower()
+
 # --- Task Status Tracking ---
-tasks_status = {}
-tasks_lock = threading.Lock()  # قفل برای مدیریت دسترسی همزمان به دیکشنری تسک‌ها
+# [جدید] وضعیت تسک‌ها در یک مخزن مشترک (پیش‌فرض: دیتابیس Django) نگهداری می‌شود تا
+# تمام پروسه‌های WSGI تسک‌های یکدیگر را ببینند.
+task_store = get_task_status_store(
+    TASK_STATUS_BACKEND,
+    retention=timedelta(seconds=TASK_STATUS_RETENTION),
+    active_ttl=timedelta(seconds=TASK_STATUS_ACTIVE_TTL),
+    poll_interval=TASK_STATUS_POLL_INTERVAL,
+)
+
+
+def publish_queue_positions(positions: dict):
+    """جایگاه تسک‌های در انتظار را در مخزن وضعیت ثبت می‌کند تا از هر پروسه‌ای قابل مشاهده باشد."""
+    for queued_task_id, position in positions.items():
+        task_store.update(queued_task_id, lambda task, position=position: task.update(queue_position=position))
+
+
+# [جدید] اجرای تسک‌ها با تعداد نخ ثابت و صف اولویت‌دار محدود
+task_executor = TaskExecutor(
+    max_workers=TASK_MAX_WORKERS, max_queue_size=TASK_QUEUE_SIZE, on_queue_change=publish_queue_positions
+)
+
+# [جدید] checkpoint ردیف‌های هر تسک (یا None اگر غیرفعال باشد)
+checkpoint_store = TaskCheckpointStore() if TASK_CHECKPOINTS else None
+
+# [جدید] صف پایدار ترکیب‌ها برای کارگرهای جداگانه (یا None در حالت 'thread')
+combination_queue = (
+    CombinationQueue() if TASK_QUEUE_BACKEND == 'database' and TASK_STATUS_BACKEND == 'database' else None
+)
+
+# [جدید] ادغام جستجوهای یکسان همزمان (Single-flight) در سطح پروسه
+search_coalescer = SearchCoalescer()
+
+# [اصلاح شد] سهمیه اتصال‌های منتظر تغییر وضعیت (SSE و long-poll) در این پروسه
+status_waiter_slots = threading.BoundedSemaphore(TASK_STATUS_MAX_WAITERS)
 
 # هدرها برای هماهنگی با داکیومنت جدید و n8n
 EXPECTED_HEADERS = [
@@ -32,200 +173,1170 @@ EXPECTED_HEADERS = [
     'twitter', 'instagram', 'facebook', 'youtube', 'tiktok', 'pinterest', 'discord', 'email sent'
 ]
 
-def format_address(job_dict: dict) -> str:
+# [جدید] صف نوشتن ردیف‌ها: مستقیم در شیت یا در خروجی‌های محلی (با رابط یکسان)
+RowWriter = Union[BufferedSheetWriter, LocalRowWriter]
+
+# [جدید] منبع مقدار هر ستون EXPECTED_HEADERS: فیلد JobRecord یا کلید اطلاعات تماس
+_JOB_RECORD_COLUMNS = {
+    'employmentType': 'employment_type', 'companyName': 'company_name', 'companyCountry': 'company_country',
+    'companyWebsite': 'company_website', 'postedAt': 'posted_datetime', 'title': 'title', 'link': 'job_url',
+    'fullCompanyAddress': 'company_address',
+}
+_CONTACT_COLUMNS = {
+    'phones', 'emails', 'linkedin', 'twitter', 'instagram', 'facebook', 'youtube', 'tiktok', 'pinterest', 'discord',
+}
+# نگاشت رکورد به ردیف شیت یک بار ساخته می‌شود: (از رکورد شغل؟، نام فیلد یا None برای ستون خالی)
+SHEET_ROW_SPEC = tuple(
+    (True, _JOB_RECORD_COLUMNS[header]) if header in _JOB_RECORD_COLUMNS
+    else (False, header if header in _CONTACT_COLUMNS else None)
+    for header in EXPECTED_HEADERS
+)
+
+class PipelineSettings(NamedTuple):
     """
-    آدرس را از فیلدهای مستقیم آبجکت شغل می‌خواند و به رشته تبدیل می‌کند.
+    [جدید] وابستگی‌ها و تنظیمات پایپ‌لاین که یک اجرا (مثلاً بنچمارک) می‌تواند با use_pipeline_settings فقط برای
+    context خود جایگزین کند، بدون تغییر متغیرهای ماژول که پروسه وب و سایر تسک‌ها از آن‌ها استفاده می‌کنند.
+    مقدار پیش‌فرض هر فیلد متغیر هم‌نام ماژول است (default_pipeline_settings)؛ فیلدهای *_class کلاس سرویس
+    یا جایگزینی با همان رابط ساخت (مثلاً get_shared) هستند.
     """
-    if not isinstance(job_dict, dict):
-        return ""
+    apify_service_class: Callable
+    async_apify_service_class: Callable
+    sheets_service_class: object
+    task_store: object
+    checkpoint_store: Optional[TaskCheckpointStore]
+    environ: Mapping[str, str]
+    search_max_results: int
+    search_history_path: str
+    link_index_path: str
+    contact_cache_path: str
+    contact_crawl_adaptive: bool
+    contact_crawl_stats_path: str
+    output_sinks: list
+    local_output_sinks: list
+    output_sink_paths: dict
+    sheets_feed_interval: float
+    record_flushed_rows: Callable
+
+    @property
+    def output_target(self) -> str:
+        """نام مقصد ردیف‌ها در لاگ‌ها."""
+        if self.local_output_sinks:
+            return f"local output ({', '.join(self.local_output_sinks)})"
+        return "Google Sheets"
+
+
+# تنظیمات جایگزین context فعلی (در نخ‌ها و taskهای asyncio از طریق کپی context منتقل می‌شود)
+_pipeline_settings: contextvars.ContextVar[Optional[PipelineSettings]] = contextvars.ContextVar(
+    'pipeline_settings', default=None
+)
+
+
+def default_pipeline_settings() -> PipelineSettings:
+    return PipelineSettings(
+        apify_service_class=ApifyService,
+        async_apify_service_class=AsyncApifyService,
+        sheets_service_class=GoogleSheetsService,
+        task_store=task_store,
+        checkpoint_store=checkpoint_store,
+        environ=os.environ,
+        search_max_results=SEARCH_MAX_RESULTS,
+        search_history_path=SEARCH_HISTORY_PATH,
+        link_index_path=LINK_INDEX_PATH,
+        contact_cache_path=CONTACT_CACHE_PATH,
+        contact_crawl_adaptive=CONTACT_CRAWL_ADAPTIVE,
+        contact_crawl_stats_path=CONTACT_CRAWL_STATS_PATH,
+        output_sinks=OUTPUT_SINKS,
+        local_output_sinks=LOCAL_OUTPUT_SINKS,
+        output_sink_paths=OUTPUT_SINK_PATHS,
+        sheets_feed_interval=SHEETS_FEED_INTERVAL,
+        record_flushed_rows=record_flushed_rows,
+    )
 
-    parts = [
-        job_dict.get('company_street'),
-        job_dict.get('company_locality'),
-        job_dict.get('company_region'),
-        job_dict.get('company_postal_code'),
-        job_dict.get('company_country')
-    ]
-    return ', '.join(filter(None, parts))
 
+def pipeline_settings() -> PipelineSettings:
+    """تنظیمات پایپ‌لاین در context فعلی."""
+    return _pipeline_settings.get() or default_pipeline_settings()
 
-def run_scraping_task(country: str, job_keyword: str, task_id: str, current_job_index: int, total_jobs: int):
+
+@contextmanager
+def use_pipeline_settings(settings: PipelineSettings) -> Iterator[PipelineSettings]:
     """
-    منطق اصلی اسکرپینگ برای یک ترکیب کشور و کلیدواژه شغل.
+    [جدید] تسک‌هایی که در این context (و نخ‌ها و taskهایی که آن را کپی می‌کنند) اجرا شوند از settings استفاده می‌کنند.
     """
-    status_message = f"Processing {current_job_index}/{total_jobs}: '{job_keyword}' in '{country}'"
-    with tasks_lock:
-        tasks_status[task_id]['status'] = 'running'
-        tasks_status[task_id]['progress'] = status_message
-    logger.info(f"Task [{task_id}]: {status_message}")
+    token = _pipeline_settings.set(settings)
+    try:
+        yield settings
+    finally:
+        _pipeline_settings.reset(token)
+
 
+class TaskContext:
+    """
+    [جدید] منابع مشترک یک تسک که یک بار ساخته شده و بین تمام ترکیبات آن استفاده می‌شوند:
+    سرویس‌ها، ورک‌شیت، نگاشت هدرها، ایندکس لینک‌ها و صف نوشتن در شیت.
+    [جدید] با خروجی‌های محلی بدون شیت، sheets_service و worksheet برابر None هستند و writer یک LocalRowWriter است.
+    [جدید] settings تنظیمات پایپ‌لاین در زمان ساخت context است (pipeline_settings).
+    """
+
+    def __init__(self, apify_service: ApifyService, sheets_service: Optional[GoogleSheetsService], worksheet,
+                 header_map: dict, link_index: LinkIndex, link_scope: str, writer: RowWriter,
+                 contact_cache: ContactCache, timings: Optional[StageTimings] = None,
+                 checkpoints: Optional[TaskCheckpointStore] = None,
+                 crawl_stats: Optional[ContactCrawlStats] = None,
+                 reservations: Optional[JobKeyReservations] = None,
+                 settings: Optional[PipelineSettings] = None):
+        self.apify_service = apify_service
+        self.sheets_service = sheets_service
+        self.worksheet = worksheet
+        self.header_map = header_map
+        self.link_index = link_index
+        self.link_scope = link_scope
+        self.writer = writer
+        self.contact_cache = contact_cache
+        # [جدید] خلاصه زمان‌بندی مراحل این تسک برای نمایش در scrapStatus
+        self.timings = timings or StageTimings()
+        # [جدید] checkpoint ردیف‌هایی که اطلاعات تماس آن‌ها استخراج شده ولی هنوز در شیت ثبت نشده‌اند
+        self.checkpoints = checkpoints
+        # [جدید] آمار پیمایش تطبیقی اطلاعات تماس (فقط در صورت فعال بودن CONTACT_CRAWL_ADAPTIVE)
+        self.crawl_stats = crawl_stats
+        # کلید آگهی‌هایی که در این تسک رزرو یا در صف نوشتن قرار گرفته‌اند ولی هنوز در ایندکس ثبت نشده‌اند
+        self.queued_keys = set()
+        self._links_lock = threading.Lock()
+        # [جدید] با صف دیتابیسی، رزرو کلیدها در دیتابیس مشترک بین کارگرهای همه میزبان‌ها
+        self.reservations = reservations
+        self.settings = settings or pipeline_settings()
+
+    def reserve_new_links(self, links: list, restoring: bool = False, combination: Optional[int] = None) -> set:
+        """
+        کلید canonical لینک‌های جدید (نه در ایندکس و نه در صف این تسک) را برمی‌گرداند و آن‌ها را رزرو می‌کند
+        تا ترکیب‌هایی که همزمان اجرا می‌شوند یک شغل را دو بار پردازش نکنند.
+        [جدید] با reservations، کلیدهایی که کارگر دیگری (در هر میزبانی) رزرو کرده هم کنار گذاشته می‌شوند؛
+        restoring=True (بازیابی checkpoint) رزروهای قبلی همین تسک را هم می‌پذیرد.
+        """
+        with self._links_lock:
+            new_keys = self.link_index.filter_new(self.link_scope, links) - self.queued_keys
+            if self.reservations is not None and new_keys:
+                new_keys = self.reservations.reserve(
+                    self.link_scope, new_keys, include_task=restoring, combination=combination
+                )
+            self.queued_keys.update(new_keys)
+        return new_keys
+
+    def mark_queued(self, job_key: str):
+        """[جدید] ردیف این آگهی در صف نوشتن قرار گرفت (رزرو آن با تلاش مجدد ترکیب آزاد نمی‌شود)."""
+        if self.reservations is not None and job_key:
+            self.reservations.mark_queued(self.link_scope, [job_key])
+
+    def release_combination(self, combination: int) -> int:
+        """
+        [جدید] پیش از هر اجرای ترکیب، کلیدهایی که اجرای قبلی همان ترکیب (ناموفق یا روی کارگری که از کار افتاده)
+        رزرو کرده ولی ردیفی برایشان در صف قرار نداده آزاد می‌شوند تا از دست نروند. تعداد کلیدها برمی‌گردد.
+        """
+        if self.reservations is None:
+            return 0
+        released = self.reservations.release_unqueued(combination)
+        with self._links_lock:
+            self.queued_keys.difference_update(released)
+        return len(released)
+
+
+def mark_task_failed(task_id: str, error_message: str):
+    logger.error(f"Task [{task_id}]: {error_message}")
+    pipeline_settings().task_store.update(task_id, lambda task: task.update(
+        status='failed', error=error_message, finished_at=datetime.utcnow()
+    ))
+    metrics.inc('scraper_tasks_total', labels={'status': 'failed'}, help_text='Finished scraping tasks by status.')
+
+
+def prepare_task_context(task_id: str, timings: Optional[StageTimings] = None):
+    """
+    سرویس‌ها را می‌سازد، شیت را اعتبارسنجی می‌کند و هدرها و ستون link را یک بار برای کل تسک می‌خواند.
+    در صورت خطا، تسک را ناموفق علامت زده و None برمی‌گرداند.
+    [جدید] صف نوشتن بر اساس OUTPUT_SINKS ساخته می‌شود؛ بدون 'sheets' متغیرهای Google لازم نیستند.
+    """
+    settings = pipeline_settings()
+    local_sinks, sink_paths = settings.local_output_sinks, settings.output_sink_paths
+    use_sheets = 'sheets' in settings.output_sinks
     try:
-        apify_api_token = os.environ["APIFY_API_TOKEN"]
-        google_sheet_id = os.environ["GOOGLE_SHEET_ID"]
-        google_service_account_path = os.environ["GOOGLE_SERVICE_ACCOUNT_PATH"]
+        apify_api_token = settings.environ["APIFY_API_TOKEN"]
+        if use_sheets:
+            google_sheet_id = settings.environ["GOOGLE_SHEET_ID"]
+            google_service_account_path = settings.environ["GOOGLE_SERVICE_ACCOUNT_PATH"]
     except KeyError as e:
-        error_message = f"Missing essential environment variable: {e}. Please check your .env file."
-        logger.error(f"Task [{task_id}]: {error_message}")
-        with tasks_lock:
-            tasks_status[task_id]['status'] = 'failed'
-            tasks_status[task_id]['error'] = error_message
-            tasks_status[task_id]['finished_at'] = datetime.utcnow()
-        return
+        mark_task_failed(task_id, f"Missing essential environment variable: {e}. Please check your .env file.")
+        return None
 
-    apify_service = ApifyService(apify_api_token)
     try:
-        sheets_service = GoogleSheetsService(google_service_account_path, google_sheet_id)
-        worksheet = sheets_service.get_worksheet("Sheet1")
-        
-        header_map = sheets_service.get_header_map(worksheet)
-        if not header_map:
-            raise Exception("Could not read headers from the Google Sheet.")
-
-        # [اصلاح شد] بررسی وجود تمام هدرهای مورد انتظار در شیت
-        missing_headers = set(EXPECTED_HEADERS) - set(header_map.keys())
-        if missing_headers:
-            raise Exception(f"The following required columns are missing from the Google Sheet: {', '.join(missing_headers)}")
-            
-        link_column_index = header_map.get('link')
-        if not link_column_index:
-            raise Exception("Column 'link' not found in the Google Sheet.")
-
-        existing_links = sheets_service.get_column_values(worksheet, link_column_index)
-        logger.info(f"Task [{task_id}]: Successfully read {len(existing_links)} existing job links from Google Sheets.")
+        apify_service = settings.apify_service_class(apify_api_token)
+        link_index = LinkIndex.get_shared(settings.link_index_path)
+        link_position = EXPECTED_HEADERS.index('link')
+        if use_sheets:
+            sheets_service, worksheet, header_map, link_scope = prepare_sheet(
+                task_id, link_index, google_service_account_path, google_sheet_id, settings
+            )
+        else:
+            sheets_service = worksheet = None
+            header_map = {header: column for column, header in enumerate(EXPECTED_HEADERS, start=1)}
+            link_scope = "local:" + os.path.abspath(sink_paths[local_sinks[0]])
+
+        def on_flush(rows: list):
+            # ممکن است در نخ SheetsFeeder اجرا شود؛ تنظیمات به صورت صریح منتقل می‌شوند
+            settings.record_flushed_rows(link_index, link_scope, link_position, rows, task_id,
+                                         sheet_rows=not local_sinks, settings=settings)
+
+        if local_sinks:
+            writer = LocalRowWriter(
+                [get_row_store(kind, sink_paths[kind], EXPECTED_HEADERS) for kind in local_sinks],
+                max_rows=OUTPUT_WRITE_BATCH_SIZE,
+                max_delay=OUTPUT_WRITE_MAX_DELAY,
+                on_flush=on_flush,
+            )
+            if use_sheets:
+                SheetsFeeder.get_shared(
+                    get_row_store('sqlite', sink_paths['sqlite'], EXPECTED_HEADERS),
+                    sheets_service, worksheet, link_scope,
+                    link_column_index=header_map['link'],
+                    link_position=link_position,
+                    batch_size=SHEETS_FEED_BATCH_SIZE,
+                    interval=settings.sheets_feed_interval,
+                )
+        else:
+            writer = BufferedSheetWriter(
+                sheets_service, worksheet,
+                link_column_index=header_map['link'],
+                link_position=link_position,
+                max_rows=SHEETS_WRITE_BATCH_SIZE,
+                max_delay=SHEETS_WRITE_MAX_DELAY,
+                on_flush=on_flush,
+            )
     except Exception as e:
-        error_message = f"Error connecting to or validating Google Sheets: {e}"
-        logger.error(f"Task [{task_id}]: {error_message}")
-        with tasks_lock:
-            tasks_status[task_id]['status'] = 'failed'
-            tasks_status[task_id]['error'] = error_message
-            tasks_status[task_id]['finished_at'] = datetime.utcnow()
-        return
+        target = "Google Sheets" if use_sheets else "the local output sinks"
+        mark_task_failed(task_id, f"Error connecting to or validating {target}: {e}")
+        return None
 
-    logger.info(f"Task [{task_id}]: Module 1: Running job scraper actor...")
-    search_url = build_linkedin_url(keyword=job_keyword, location_name=country)
-    logger.info(f"Task [{task_id}]: Built search URL: {search_url}")
+    contact_cache = ContactCache.get_shared(
+        settings.contact_cache_path,
+        ttl=CONTACT_CACHE_TTL,
+        negative_ttl=CONTACT_CACHE_NEGATIVE_TTL,
+        max_entries=CONTACT_CACHE_MAX_ENTRIES,
+    )
+    crawl_stats = (
+        ContactCrawlStats.get_shared(settings.contact_crawl_stats_path) if settings.contact_crawl_adaptive else None
+    )
+    reservations = JobKeyReservations(task_id) if combination_queue is not None else None
+    return TaskContext(apify_service, sheets_service, worksheet, header_map, link_index, link_scope, writer,
+                       contact_cache, timings, settings.checkpoint_store, crawl_stats, reservations, settings)
 
-    job_items = apify_service.run_linkedin_job_scraper(search_url, max_results=10, proxy_group="DATACENTER")
 
-    if not job_items:
-        logger.warning(f"Task [{task_id}]: Module 1: No jobs found for this query. Moving to the next item.")
+def prepare_sheet(task_id: str, link_index: LinkIndex, service_account_path: str, sheet_id: str,
+                  settings: PipelineSettings):
+    """
+    [جدید] شیت را باز و اعتبارسنجی کرده و ایندکس لینک‌ها را با آن همگام می‌کند.
+    خروجی: (سرویس شیت، ورک‌شیت، نگاشت هدرها، scope ایندکس لینک‌ها).
+    """
+    sheets_service = settings.sheets_service_class.get_shared(service_account_path, sheet_id, ttl=SHEETS_SESSION_TTL)
+    worksheet = sheets_service.get_worksheet("Sheet1")
+
+    # [جدید] به جای خواندن کل ستون link، فقط ردیف‌های جدید در ایندکس محلی همگام می‌شوند
+    link_scope = LinkIndex.scope_for(sheet_id, worksheet)
+    unsent_links = None
+    if settings.local_output_sinks:
+        # [اصلاح شد] ردیف‌های محلی که SheetsFeeder هنوز ارسال نکرده در همگام‌سازی کامل حذف نمی‌شوند.
+        # مکان‌نما پیش از خواندن شیت گرفته می‌شود تا ردیفی که در این فاصله ارسال شود از هر دو طرف جا نماند.
+        feed_store = get_row_store('sqlite', settings.output_sink_paths['sqlite'], EXPECTED_HEADERS)
+        feed_cursor = feed_store.feed_cursor(SheetsFeeder.feed_name(link_scope))
+        unsent_links = lambda: feed_store.links_after(feed_cursor)
+    header_map, synced_rows = link_index.sync(sheets_service, worksheet, link_scope, unsent_links=unsent_links)
+    if not header_map:
+        raise Exception("Could not read headers from the Google Sheet.")
+
+    # [اصلاح شد] بررسی وجود تمام هدرهای مورد انتظار در شیت
+    missing_headers = set(EXPECTED_HEADERS) - set(header_map.keys())
+    if missing_headers:
+        raise Exception(f"The following required columns are missing from the Google Sheet: {', '.join(missing_headers)}")
+
+    if not header_map.get('link'):
+        raise Exception("Column 'link' not found in the Google Sheet.")
+
+    logger.info(
+        f"Task [{task_id}]: Synced {synced_rows} new sheet rows into the link index "
+        f"({link_index.count(link_scope)} known job links)."
+    )
+    return sheets_service, worksheet, header_map, link_scope
+
+
+def record_flushed_rows(link_index: LinkIndex, link_scope: str, link_position: int, rows: list,
+                        task_id: Optional[str] = None, sheet_rows: bool = True,
+                        settings: Optional[PipelineSettings] = None):
+    """
+    ردیف‌های ثبت شده در شیت را به ایندکس لینک‌ها اضافه کرده و در متریک‌ها می‌شمارد.
+    [جدید] checkpoint همین ردیف‌ها حذف می‌شود چون دیگر نیازی به بازیابی ندارند.
+    [جدید] rows_flushed تسک افزایشی به‌روز می‌شود تا با چند صف نوشتن (کارگرهای مختلف یا ادامه تسک) درست بماند.
+    [جدید] ردیف‌های خروجی‌های محلی (sheet_rows=False) را LocalRowWriter و SheetsFeeder در متریک‌ها می‌شمارند.
+    """
+    settings = settings or pipeline_settings()
+    link_index.add(link_scope, (row[link_position] for row in rows))
+    if sheet_rows:
+        metrics.inc('scraper_sheet_rows_written_total', len(rows), help_text='Rows appended to Google Sheets.')
+    if task_id:
+        settings.task_store.update(
+            task_id, lambda task: task.update(rows_flushed=task.get('rows_flushed', 0) + len(rows))
+        )
+    if settings.checkpoint_store is not None and task_id:
+        settings.checkpoint_store.remove_rows(task_id, {canonical_job_key(row[link_position]) for row in rows})
+
+
+def restore_checkpoint(context: "TaskContext", task_id: str) -> int:
+    """
+    [جدید] ردیف‌هایی را که در اجرای قبلی تسک استخراج شده ولی ثبت نشده بودند دوباره در صف نوشتن قرار می‌دهد
+    تا بدون اسکرپ مجدد نوشته شوند. ردیف‌هایی که در واقع ثبت شده بودند (ایندکس لینک‌ها پیش‌تر با شیت
+    همگام شده است) کنار گذاشته می‌شوند.
+    """
+    if context.checkpoints is None:
+        return 0
+    pending = context.checkpoints.pending_rows(task_id)
+    if not pending:
+        return 0
+
+    link_position = EXPECTED_HEADERS.index('link')
+    # [اصلاح شد] ردیف‌هایی که هنوز در صف نوشتن همین context هستند نه دوباره در صف قرار می‌گیرند و نه
+    # checkpoint آن‌ها (به عنوان ثبت شده) حذف می‌شود
+    queued_keys = {canonical_job_key(row[link_position]) for row in context.writer.queued_rows()}
+    pending = [(job_key, row) for job_key, row in pending if job_key not in queued_keys]
+    new_keys = context.reserve_new_links([row[link_position] for _, row in pending], restoring=True)
+    rows = [row for job_key, row in pending if job_key in new_keys]
+    written_keys = {job_key for job_key, _ in pending} - new_keys
+    if written_keys:
+        context.checkpoints.remove_rows(task_id, written_keys)
+    context.writer.restore(rows)
+    logger.info(
+        f"Task [{task_id}]: Restored {len(rows)} enriched rows from the last checkpoint "
+        f"({len(written_keys)} were already in the sheet)."
+    )
+    update_writer_status(task_id, context.writer)
+    return len(rows)
+
+
+def enrich_batch(context: "TaskContext", websites: list, task_id: str) -> dict:
+    """
+    اطلاعات تماس چند وب‌سایت را با یک اجرای اکتور استخراج می‌کند (ماژول دوم).
+    خروجی یک دیکشنری از دامنه به آیتم‌های خام همان دامنه است.
+    این تابع در نخ‌های جداگانه اجرا می‌شود و خطاهای آن به فراخواننده منتقل می‌شود.
+    [جدید] در حالت پیمایش تطبیقی، وب‌سایت‌هایی که ایمیل یا تلفن آن‌ها پیدا نشد با بودجه بیشتر دوباره پیمایش می‌شوند.
+    """
+    logger.info(f"Task [{task_id}]: Module 2: Scraping contact info from {len(websites)} websites: {websites}")
+    apify_service = context.apify_service
+    if not context.settings.contact_crawl_adaptive:
+        return apify_service.run_contact_detail_scraper_batch(websites)
+    return new_adaptive_crawl(context, websites).run(apify_service.run_contact_detail_scraper_batch)
+
+
+def submit_enrich_batch(context: "TaskContext", websites: list, task_id: str) -> Future:
+    """
+    [جدید] معادل غیرمسدود enrich_batch در حالت وب‌هوک: اجرا شروع شده و Future نتیجه برمی‌گردد.
+    خطای شروع اجرا هم از طریق Future منتقل می‌شود تا مانند خطای سایر دسته‌ها مدیریت شود.
+    """
+    logger.info(f"Task [{task_id}]: Module 2: Starting contact scrape for {len(websites)} websites: {websites}")
+    apify_service = context.apify_service
+    try:
+        if context.settings.contact_crawl_adaptive:
+            return new_adaptive_crawl(context, websites).submit(apify_service.submit_contact_detail_scraper_batch)
+        return apify_service.submit_contact_detail_scraper_batch(websites)
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+def new_adaptive_crawl(context: "TaskContext", websites: list) -> AdaptiveContactCrawl:
+    """[جدید] پیمایش تطبیقی یک دسته وب‌سایت با پله‌های CONTACT_CRAWL_LADDER و آمار مشترک دامنه‌ها."""
+    websites_by_domain = {normalize_domain(website): website for website in websites}
+    websites_by_domain.pop('', None)
+    return AdaptiveContactCrawl(websites_by_domain, CONTACT_CRAWL_LADDER, context.crawl_stats)
+
+
+def resolve_contact_batch(context: "TaskContext", batch: list, future, jobs_by_domain: dict, task_id: str) -> dict:
+    """
+    نتیجه یک دسته اسکرپ را به رکورد پردازش شده هر دامنه تبدیل کرده و در کش ثبت می‌کند.
+    خطای اسکرپ در کش ذخیره نمی‌شود و مشاغل آن دسته بدون اطلاعات تماس نوشته می‌شوند.
+    [اصلاح شد] در پیمایش تطبیقی فقط دامنه‌هایی که پیمایش آن‌ها ناموفق بود خطا می‌گیرند.
+    """
+    failed = {}
+    try:
+        results_by_domain = future.result()
+    except ContactCrawlPartialError as e:
+        logger.error(f"Task [{task_id}]: Error scraping contact info for {sorted(e.errors)}: {e}. Continuing without contact info.")
+        results_by_domain, failed = e.results, e.errors
+    except Exception as e:
+        logger.error(f"Task [{task_id}]: Error scraping contact info for {batch}: {e}. Continuing without contact info.")
+        for domain in batch:
+            context.contact_cache.fail(domain, e)
+        return {domain: {} for domain in batch}
+
+    contact_records = {}
+    for domain in batch:
+        if domain in failed:
+            context.contact_cache.fail(domain, failed[domain])
+            contact_records[domain] = {}
+            continue
+        contact_results = results_by_domain.get(domain)
+        contact_info = {}
+        if contact_results:
+            try:
+                with timed('process_contact_data'):
+                    contact_info = process_contact_data(contact_results, jobs_by_domain[domain][0])
+                logger.info(f"Task [{task_id}]: Successfully processed contact info for {domain}.")
+            except Exception as e:
+                logger.error(f"Task [{task_id}]: Error processing contact info for {domain}: {e}.")
+                context.contact_cache.fail(domain, e)
+                contact_records[domain] = {}
+                continue
+        context.contact_cache.resolve(domain, contact_info)
+        contact_records[domain] = contact_info
+    return contact_records
+
+
+def append_job_row(context: TaskContext, job: JobRecord, contact_info: dict, task_id: str):
+    """
+    ردیف یک شغل را می‌سازد و به صف نوشتن در شیت اضافه می‌کند (ماژول سوم).
+    خطای هر شغل فقط همان شغل را رد می‌کند.
+    """
+    job_title = job.title or 'Unknown'
+    try:
+        new_row = build_sheet_row(job, contact_info)
+    except Exception as e:
+        logger.error(f"Task [{task_id}]: Error processing job '{job_title}': {e}. Continuing to the next job.")
         return
-        
-    logger.info(f"Task [{task_id}]: Module 1: Successfully scraped {len(job_items)} jobs.")
 
-    for job in job_items:
+    if context.checkpoints is not None:
+        # [جدید] ردیف پیش از ورود به صف ذخیره می‌شود تا در صورت توقف پروسه اسکرپ مجدد لازم نباشد
         try:
-            job_link = job.get('job_url')
-            job_title = job.get('title')
+            context.checkpoints.save_row(task_id, job.key, new_row)
+        except Exception as e:
+            logger.error(f"Task [{task_id}]: Could not checkpoint job '{job_title}': {e}")
+    try:
+        context.mark_queued(job.key)
+    except Exception as e:
+        logger.error(f"Task [{task_id}]: Could not mark the reservation of job '{job_title}' as queued: {e}")
 
-            if not job_link:
-                logger.warning(f"Task [{task_id}]: Job '{job_title}' has no link and will be skipped.")
-                continue
+    writer = context.writer
+    try:
+        with timed('sheet_row_append'):
+            flushed = writer.add(new_row)
+        logger.info(f"Task [{task_id}]: Job '{job_title}' queued for {context.settings.output_target}.")
+        if flushed:
+            logger.info(f"Task [{task_id}]: Module 3: Flushed {flushed} rows to {context.settings.output_target}.")
+    except Exception as e:
+        # ردیف‌ها در صف باقی می‌مانند و در ارسال بعدی دوباره تلاش می‌شوند
+        logger.error(
+            f"Task [{task_id}]: Error flushing rows to {context.settings.output_target}: {e}. Rows will be retried."
+        )
+    update_writer_status(task_id, writer)
 
-            if job_link in existing_links:
-                logger.info(f"Task [{task_id}]: Job '{job_title}' already exists in the sheet. Skipping.")
-                continue
 
-            logger.info(f"Task [{task_id}]: Starting processing for job: '{job_title}'")
-            company_website = job.get('company_website')
-            contact_info = {}
-
-            if company_website:
-                logger.info(f"Task [{task_id}]: Module 2: Scraping contact info from: {company_website}")
-                contact_results = apify_service.run_contact_detail_scraper(company_website)
-                
-                if contact_results:
-                    contact_info = process_contact_data(contact_results, job)
-                    logger.info(f"Task [{task_id}]: Successfully processed contact info for '{job.get('company_name')}'.")
-                else:
-                    logger.warning(f"Task [{task_id}]: No contact info found for website {company_website}.")
+def update_writer_status(task_id: str, writer: RowWriter):
+    """
+    تعداد ردیف‌های در انتظار ثبت را در وضعیت تسک به‌روز می‌کند.
+    [اصلاح شد] rows_flushed هنگام ثبت هر دسته در record_flushed_rows افزایش می‌یابد.
+    """
+    pending_count = writer.pending_count
+    pipeline_settings().task_store.update(task_id, lambda task: task.update(rows_pending=pending_count))
+
+
+def flush_writer(task_id: str, writer: RowWriter):
+    """ردیف‌های باقی‌مانده در صف را (با چند تلاش مجدد) به شیت ارسال می‌کند."""
+    output_target = pipeline_settings().output_target
+    try:
+        flushed = writer.flush(retries=3)
+        logger.info(f"Task [{task_id}]: Module 3: Flushed {flushed} remaining rows to {output_target}.")
+    except Exception as e:
+        logger.error(f"Task [{task_id}]: Could not flush {writer.pending_count} rows to {output_target}: {e}")
+    update_writer_status(task_id, writer)
+
+
+def build_sheet_row(job: JobRecord, contact_info: dict) -> list:
+    """
+    داده‌های شغل و اطلاعات تماس را به یک ردیف به ترتیب EXPECTED_HEADERS تبدیل می‌کند.
+    [اصلاح شد] به جای ساختن یک دیکشنری برای هر ردیف، از نگاشت از پیش ساخته SHEET_ROW_SPEC استفاده می‌شود.
+    """
+    return [
+        getattr(job, name) if from_job else (contact_info.get(name, '') if name else '')
+        for from_job, name in SHEET_ROW_SPEC
+    ]
+
+
+def process_job_page(context: "TaskContext", job_items: list, task_id: str, current_job_index: int, counters: dict):
+    """
+    [جدید] یک صفحه از نتایج اکتور لینکدین را پردازش می‌کند: حذف تکراری‌ها، استخراج اطلاعات تماس
+    و قرار دادن ردیف‌ها در صف نوشتن شیت.
+    """
+    apify_service = context.apify_service
+
+    # [جدید] ابتدا مشاغل تکراری حذف می‌شوند تا فقط برای مشاغل جدید اکتور تماس اجرا شود
+    # [اصلاح شد] مقایسه با شناسه canonical آگهی انجام می‌شود تا لینک‌هایی که فقط در پارامترهای ردیابی،
+    # زیردامنه یا اسلش انتهایی متفاوتند (در شیت یا داخل همین صفحه) تکراری شناخته شوند
+    new_keys = context.reserve_new_links([job.job_url for job in job_items], combination=current_job_index)
+    new_jobs = []
+    scheduled_keys = set()
+    for job in job_items:
+        job_key = job.key
+        job_title = job.title
+
+        if not job_key:
+            logger.warning(f"Task [{task_id}]: Job '{job_title}' has no link and will be skipped.")
+            continue
+
+        if job_key not in new_keys or job_key in scheduled_keys:
+            logger.info(f"Task [{task_id}]: Job '{job_title}' already exists in the sheet. Skipping.")
+            continue
+
+        scheduled_keys.add(job_key)
+        new_jobs.append(job)
+
+    counters['new_jobs'] += len(new_jobs)
+    record_page_metrics(len(job_items), len(new_jobs))
+    update_combination_status(task_id, current_job_index, **counters)
+    if not new_jobs:
+        logger.info(f"Task [{task_id}]: No new jobs to process in this page.")
+        return
+
+    # [جدید] مشاغل بر اساس دامنه وب‌سایت شرکت گروه‌بندی می‌شوند تا هر دامنه فقط یک بار اسکرپ شود
+    jobs_by_domain = {}
+    websites_by_domain = {}
+    for job in new_jobs:
+        domain = normalize_domain(job.company_website)
+        if not domain:
+            logger.info(f"Task [{task_id}]: Company website not found for '{job.title}', skipping contact info scraping.")
+            append_job_row(context, job, {}, task_id)
+            continue
+        jobs_by_domain.setdefault(domain, []).append(job)
+        websites_by_domain.setdefault(domain, job.company_website)
+
+    # [جدید] دامنه‌های موجود در کش اطلاعات تماس بدون اجرای اکتور نوشته می‌شوند و برای
+    # دامنه‌هایی که تسک دیگری در حال اسکرپ آن‌هاست، منتظر همان نتیجه می‌مانیم.
+    contact_cache = context.contact_cache
+    cached_records, domains, waiting = contact_cache.claim(jobs_by_domain)
+    for domain, contact_info in cached_records.items():
+        logger.info(f"Task [{task_id}]: Contact info for {domain} served from cache.")
+        for job in jobs_by_domain[domain]:
+            append_job_row(context, job, contact_info, task_id)
+
+    # [جدید] چند وب‌سایت در یک اجرای اکتور ارسال می‌شوند و دسته‌ها به صورت همزمان
+    # و با تعداد محدود نخ اجرا می‌شوند؛ نتیجه هر دسته به محض آماده شدن در شیت نوشته می‌شود.
+    batches = [domains[i:i + CONTACT_SCRAPER_BATCH_SIZE] for i in range(0, len(domains), CONTACT_SCRAPER_BATCH_SIZE)]
+    max_workers = max(1, min(CONTACT_SCRAPER_MAX_WORKERS, len(batches)))
+    logger.info(
+        f"Task [{task_id}]: Module 2: Enriching {len(new_jobs)} new jobs from {len(jobs_by_domain)} websites "
+        f"({len(cached_records)} cached, {len(waiting)} shared with other tasks) "
+        f"in {len(batches)} batches with {max_workers} workers."
+    )
+
+    # [جدید] در حالت وب‌هوک اجراها بدون نخ منتظر شروع می‌شوند و فقط Future نتیجه آن‌ها نگهداری می‌شود
+    executor = None
+    if apify_service.uses_webhooks:
+        futures = {
+            submit_enrich_batch(context, [websites_by_domain[d] for d in batch], task_id): batch
+            for batch in batches
+        }
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"enrich-{task_id[:8]}")
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run,
+                enrich_batch, context, [websites_by_domain[d] for d in batch], task_id
+            ): batch
+            for batch in batches
+        }
+    shared_futures = {future: domain for domain, future in waiting.items()}
+
+    try:
+        for future in as_completed([*futures, *shared_futures]):
+            if future in shared_futures:
+                domain = shared_futures[future]
+                try:
+                    contact_records = {domain: future.result()}
+                except Exception as e:
+                    logger.error(f"Task [{task_id}]: Shared contact scrape for {domain} failed: {e}. Continuing without contact info.")
+                    contact_records = {domain: {}}
             else:
-                logger.info(f"Task [{task_id}]: Company website not found, skipping contact info scraping.")
-
-            logger.info(f"Task [{task_id}]: Module 3: Preparing and appending new row to Google Sheets...")
-
-            row_data = {
-                'employmentType': job.get('employment_type', ''),
-                'companyName': job.get('company_name', ''),
-                'companyCountry': job.get('company_country', ''),
-                'companyWebsite': job.get('company_website', ''),
-                'postedAt': job.get('posted_datetime', ''),
-                'phones': contact_info.get('phones', ''),
-                'emails': contact_info.get('emails', ''),
-                'title': job.get('title', ''),
-                'linkedin': contact_info.get('linkedin', ''),
-                'link': job.get('job_url', ''),
-                'fullCompanyAddress': format_address(job),
-                'twitter': contact_info.get('twitter', ''),
-                'instagram': contact_info.get('instagram', ''),
-                'facebook': contact_info.get('facebook', ''),
-                'youtube': contact_info.get('youtube', ''),
-                'tiktok': contact_info.get('tiktok', ''),
-                'pinterest': contact_info.get('pinterest', ''),
-                'discord': contact_info.get('discord', ''),
-                'email sent': '',
-            }
-            new_row = [row_data.get(header, '') for header in EXPECTED_HEADERS]
-
-            sheets_service.append_row(worksheet, new_row)
-            logger.info(f"Task [{task_id}]: Job '{job_title}' successfully added to Google Sheets.")
-            existing_links.add(job_link)
+                contact_records = resolve_contact_batch(context, futures[future], future, jobs_by_domain, task_id)
 
-        except Exception as e:
-            logger.error(f"Task [{task_id}]: Error processing job '{job.get('title', 'Unknown')}': {e}. Continuing to the next job.")
+            for domain, contact_info in contact_records.items():
+                if not contact_info:
+                    logger.warning(f"Task [{task_id}]: No contact info found for website {websites_by_domain[domain]}.")
+                for job in jobs_by_domain[domain]:
+                    append_job_row(context, job, contact_info, task_id)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        # دامنه‌هایی که به هر دلیل نتیجه‌ای برایشان ثبت نشد آزاد می‌شوند تا منتظران گیر نکنند
+        for domain in domains:
+            contact_cache.fail(domain, RuntimeError("Contact scrape was abandoned."))
+
+    publish_page_stats(task_id, context)
+
+
+def run_scraping_task(context: "TaskContext", country: str, job_keyword: str, task_id: str,
+                      current_job_index: int, total_jobs: int, incremental: bool = False):
+    """
+    منطق اصلی اسکرپینگ برای یک ترکیب کشور و کلیدواژه شغل.
+    """
+    status_message = f"Processing {current_job_index}/{total_jobs}: '{job_keyword}' in '{country}'"
+    update_combination_status(task_id, current_job_index, status='running', started_at=datetime.utcnow())
+    logger.info(f"Task [{task_id}]: {status_message}")
+
+    apify_service = context.apify_service
+    writer = context.writer
+
+    logger.info(f"Task [{task_id}]: Module 1: Running job scraper actor...")
+    search_url, plan = plan_search(job_keyword, country, incremental)
+    logger.info(f"Task [{task_id}]: Built search URL: {search_url} (max_results={plan.max_results})")
+
+    # [جدید] در حالت استریم، نتایج در حین اجرای اکتور صفحه به صفحه پردازش می‌شوند؛
+    # در غیر این صورت کل نتایج پس از پایان اجرا به عنوان یک صفحه پردازش می‌شوند.
+    # [جدید] هر صفحه بلافاصله به JobRecord تبدیل می‌شود (برای تسک‌های متصل به همین جستجو هم)
+    def produce_pages():
+        if APIFY_STREAM_RESULTS:
+            pages = apify_service.stream_linkedin_job_scraper(
+                search_url, max_results=plan.max_results, proxy_group=SEARCH_PROXY_GROUP,
+                page_size=APIFY_STREAM_PAGE_SIZE
+            )
+            return (project_job_items(page) for page in pages)
+        return [project_job_items(apify_service.run_linkedin_job_scraper(
+            search_url, max_results=plan.max_results, proxy_group=SEARCH_PROXY_GROUP
+        ))]
+
+    # [جدید] اگر تسک دیگری همین جستجو را در حال اجرا داشته باشد، به نتایج همان اجرا متصل می‌شویم
+    # (shared_run همراه شمارنده‌ها در وضعیت ترکیب ثبت می‌شود)
+    job_pages, shared_run = search_coalescer.fetch(search_key(search_url, plan.max_results), produce_pages)
+    if shared_run:
+        logger.info(f"Task [{task_id}]: Module 1: Attached to an identical search already running in another task.")
+
+    counters = {'scraped_jobs': 0, 'new_jobs': 0, 'shared_run': shared_run}
+    for job_items in job_pages:
+        if not job_items:
             continue
+        counters['scraped_jobs'] += len(job_items)
+        logger.info(f"Task [{task_id}]: Module 1: Received {len(job_items)} jobs ({counters['scraped_jobs']} so far).")
+        process_job_page(context, job_items, task_id, current_job_index, counters)
+
+    if not counters['scraped_jobs']:
+        logger.warning(f"Task [{task_id}]: Module 1: No jobs found for this query. Moving to the next item.")
+        if incremental:
+            record_search_success(job_keyword, country, plan, 0)
+        update_combination_status(task_id, current_job_index, **counters)
+        return
+
+    # [جدید] در پایان هر ترکیب، ردیف‌های باقی‌مانده در صف به شیت ارسال می‌شوند
+    flush_writer(task_id, writer)
+    if incremental:
+        record_search_success(job_keyword, country, plan, counters['scraped_jobs'])
 
     logger.info(f"Task [{task_id}]: Finished processing all jobs for '{job_keyword}' in '{country}'.")
 
 
-def run_task_for_all_combinations(task_id: str, job_combinations: list):
+def search_key(search_url: str, max_results: int) -> tuple:
+    """[جدید] کلید ادغام جستجوهای یکسان: آدرس جستجو به همراه پارامترهای اجرای اکتور."""
+    return (search_url, max_results, SEARCH_PROXY_GROUP, APIFY_STREAM_RESULTS)
+
+
+def plan_search(job_keyword: str, country: str, incremental: bool):
     """
-    اجراکننده اصلی تسک که تمام ترکیبات کشور و شغل را پیمایش می‌کند.
+    [جدید] آدرس جستجو و پارامترهای آن را می‌سازد. در حالت افزایشی فیلتر زمان انتشار و تعداد نتایج
+    بر اساس آخرین جستجوی موفق همین (کلیدواژه، کشور) تعیین می‌شوند.
     """
-    total_jobs = len(job_combinations)
-    logger.info(f"Task [{task_id}]: Starting main task runner for {total_jobs} combinations.")
-    
-    for i, combo in enumerate(job_combinations):
+    settings = pipeline_settings()
+    if incremental:
+        plan = SearchHistory.get_shared(settings.search_history_path).plan(
+            job_keyword, country, settings.search_max_results
+        )
+    else:
+        plan = SearchPlan(None, settings.search_max_results, time.time(), settings.search_max_results)
+    search_url = build_linkedin_url(keyword=job_keyword, location_name=country, posted_within=plan.posted_within)
+    return search_url, plan
+
+
+def record_search_success(job_keyword: str, country: str, plan: SearchPlan, scraped_jobs: int):
+    # [اصلاح شد] خطای اکتور به نتیجه خالی تبدیل نمی‌شود (ActorRunError) و ترکیب را ناموفق می‌کند، پس اجرای بدون
+    # نتیجه هم یک جستجوی موفق است و ثبت می‌شود تا نرخ انتشار کاهش یابد و بازه جستجوی بعدی جلو برود
+    SearchHistory.get_shared(pipeline_settings().search_history_path).record_success(
+        job_keyword, country, plan, scraped_jobs
+    )
+
+
+def update_combination_status(task_id: str, combination_index: int, **fields):
+    """
+    [جدید] وضعیت یک ترکیب را به‌روز کرده و خلاصه پیشرفت کل تسک را از روی همه ترکیب‌ها محاسبه می‌کند.
+    """
+    def apply(task: dict):
+        combinations = task.get('combinations')
+        if not combinations:
+            return
+        combinations[combination_index - 1].update(fields)
+
+        finished = sum(1 for c in combinations if c['status'] in ('completed', 'failed'))
+        running = sum(1 for c in combinations if c['status'] == 'running')
+        task['completed_combinations'] = finished
+        if task['status'] != 'failed':
+            task['status'] = 'running'
+            task['progress'] = f"Processed {finished}/{len(combinations)} combinations ({running} running)."
+
+    pipeline_settings().task_store.update(task_id, apply)
+
+
+def run_combination(context: "TaskContext", task_id: str, combo: dict, index: int,
+                    total_jobs: int) -> Optional[str]:
+    """
+    یک ترکیب را اجرا کرده و خطای آن را فقط به همان ترکیب محدود می‌کند.
+    [جدید] پیام خطا (یا None در صورت موفقیت) برگردانده می‌شود تا کارگر صف بتواند ترکیب را دوباره در صف قرار دهد.
+    """
+    try:
         run_scraping_task(
+            context,
             country=combo['country'],
             job_keyword=combo['job'],
             task_id=task_id,
-            current_job_index=i + 1,
-            total_jobs=total_jobs
+            current_job_index=index,
+            total_jobs=total_jobs,
+            incremental=combo.get('incremental', False)
+        )
+        update_combination_status(task_id, index, status='completed', finished_at=datetime.utcnow())
+        return None
+    except Exception as e:
+        logger.error(f"Task [{task_id}]: Combination '{combo['job']}' in '{combo['country']}' failed: {e}")
+        update_combination_status(task_id, index, status='failed', error=str(e), finished_at=datetime.utcnow())
+        return str(e)
+    finally:
+        # اتصال دیتابیس این نخ (برای مخزن وضعیت) بسته می‌شود
+        connections.close_all()
+
+
+def run_task_for_all_combinations(task_id: str, job_combinations: list, resume: bool = False):
+    """
+    اجراکننده اصلی تسک که تمام ترکیبات کشور و شغل را پیمایش می‌کند.
+    [جدید] ترکیب‌ها به صورت موازی (حداکثر COMBINATION_MAX_WORKERS همزمان) اجرا می‌شوند؛
+    تعداد اجرای همزمان اکتورهای Apify در کل پروسه توسط ApifyService محدود می‌شود.
+    [جدید] با resume، تسک از آخرین checkpoint ادامه می‌یابد: ترکیب‌های تمام شده اجرا نمی‌شوند
+    و ردیف‌های استخراج شده ولی ثبت نشده مستقیماً نوشته می‌شوند.
+    """
+    total_jobs = len(job_combinations)
+    logger.info(f"Task [{task_id}]: Starting main task runner for {total_jobs} combinations.")
+    pending_indexes = start_task_status(task_id, job_combinations, resume)
+
+    # [جدید] زمان‌بندی مراحل در تمام نخ‌های این تسک (با کپی context) به همین تسک نسبت داده می‌شود
+    timings = StageTimings()
+    bind_task_timings(timings)
+
+    # [جدید] احراز هویت، خواندن هدرها و ستون link فقط یک بار برای کل تسک انجام می‌شود
+    context = prepare_task_context(task_id, timings)
+    if context is None:
+        bind_task_timings(None)
+        return
+    if resume:
+        restore_checkpoint(context, task_id)
+
+    max_workers = max(1, min(COMBINATION_MAX_WORKERS, len(pending_indexes)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"combo-{task_id[:8]}") as executor:
+        for index in pending_indexes:
+            executor.submit(
+                contextvars.copy_context().run, run_combination, context, task_id,
+                job_combinations[index - 1], index, total_jobs
+            )
+
+    finish_task(task_id, context, total_jobs)
+    bind_task_timings(None)
+    logger.info(f"Task [{task_id}]: All combinations have been processed. Task completed.")
+
+
+def start_task_status(task_id: str, job_combinations: list, resume: bool = False) -> list:
+    """
+    تسک را در حال اجرا علامت زده و وضعیت اولیه تمام ترکیب‌ها را ثبت می‌کند.
+    [جدید] در ادامه یک تسک، وضعیت ترکیب‌های تمام شده حفظ می‌شود. خروجی شماره (از ۱) ترکیب‌هایی است که باید اجرا شوند.
+    """
+    pending_indexes = []
+    settings = pipeline_settings()
+
+    def start(task: dict):
+        previous = task.get('combinations') if resume else None
+        if not previous or len(previous) != len(job_combinations):
+            previous = [None] * len(job_combinations)
+
+        task.pop('queue_position', None)
+        task['status'] = 'running'
+        task['progress'] = (
+            f"Preparing {'Google Sheets' if 'sheets' in settings.output_sinks else settings.output_target} and services."
+        )
+        task['runner'] = runner_identity()
+        if resume:
+            task['resume_count'] = task.get('resume_count', 0) + 1
+            task['resumed_at'] = datetime.utcnow()
+            task['error'] = None
+            task['finished_at'] = None
+
+        pending_indexes.clear()
+        combinations = []
+        for index, (combo, checkpoint) in enumerate(zip(job_combinations, previous), start=1):
+            if checkpoint and checkpoint.get('status') == 'completed':
+                combinations.append(checkpoint)
+                continue
+            combinations.append({
+                'country': combo['country'], 'job': combo['job'], 'incremental': combo.get('incremental', False),
+                'status': 'queued'
+            })
+            pending_indexes.append(index)
+        task['combinations'] = combinations
+        task['completed_combinations'] = len(combinations) - len(pending_indexes)
+
+    settings.task_store.update(task_id, start)
+    if resume:
+        logger.info(
+            f"Task [{task_id}]: Resuming with {len(pending_indexes)} of {len(job_combinations)} combinations left."
         )
-    
-    with tasks_lock:
-        if tasks_status.get(task_id) and tasks_status[task_id]['status'] != 'failed':
-            tasks_status[task_id]['status'] = 'completed'
-            tasks_status[task_id]['progress'] = f"Completed all {total_jobs} tasks."
-            tasks_status[task_id]['finished_at'] = datetime.utcnow()
-    
+    return pending_indexes
+
+
+def runner_identity() -> dict:
+    """[جدید] پروسه‌ای که تسک را در صف دارد یا اجرا می‌کند (برای تشخیص تسک‌های رها شده هنگام ادامه)."""
+    return {'host': socket.gethostname(), 'pid': os.getpid()}
+
+
+def runner_is_alive(runner: Optional[dict]) -> Optional[bool]:
+    """
+    [جدید] آیا پروسه ثبت شده برای تسک هنوز زنده است؛ برای پروسه‌ای روی میزبان دیگر None (نامعلوم).
+    اگر همین پروسه باشد، زنده بودن تسک از روی task_executor بررسی می‌شود و این تابع False برمی‌گرداند.
+    """
+    if not runner:
+        return False
+    if runner.get('host') != socket.gethostname():
+        return None
+    pid = runner.get('pid')
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def finish_task(task_id: str, context: "TaskContext", total_jobs: int):
+    """ردیف‌های باقی‌مانده را ارسال کرده و تسک را تمام شده علامت می‌زند."""
+    flush_writer(task_id, context.writer)
+    if context.checkpoints is not None and not context.writer.pending_count:
+        # ردیف‌هایی که در ارسال ناموفق قبلی در واقع ثبت شده بودند هم دیگر نیازی به checkpoint ندارند
+        context.checkpoints.clear(task_id)
+    timings = context.timings.snapshot()
+    quota = get_sheets_quota().snapshot()
+
+    def complete(task: dict):
+        task['timings'] = timings
+        task['sheets_quota'] = quota
+        if task['status'] != 'failed':
+            task['status'] = 'completed'
+            task['progress'] = f"Completed all {total_jobs} tasks."
+            task['finished_at'] = datetime.utcnow()
+
+    context.settings.task_store.update(task_id, complete)
+    if context.reservations is not None:
+        context.reservations.release_task(task_id)
+    metrics.inc('scraper_tasks_total', labels={'status': 'completed'}, help_text='Finished scraping tasks by status.')
+    connections.close_all()
+
+
+def record_page_metrics(scraped_jobs: int, new_jobs: int):
+    metrics.inc('scraper_jobs_scraped_total', scraped_jobs, help_text='Jobs returned by the LinkedIn actor.')
+    metrics.inc('scraper_jobs_new_total', new_jobs, help_text='Jobs that were not already in the sheet.')
+
+
+def publish_page_stats(task_id: str, context: "TaskContext"):
+    """
+    [جدید] آمار کش اطلاعات تماس، زمان‌بندی مراحل و میزان استفاده از سهمیه Google Sheets (در سطح پروسه)
+    را پس از هر صفحه در وضعیت تسک ثبت می‌کند.
+    """
+    cache_stats = context.contact_cache.stats()
+    timings = context.timings.snapshot()
+    quota = get_sheets_quota().snapshot()
+    context.settings.task_store.update(
+        task_id, lambda task: task.update(contact_cache=cache_stats, timings=timings, sheets_quota=quota)
+    )
+
+# --- [جدید] موتور اجرای asyncio ---
+# به جای یک نخ برای هر ترکیب و هر دسته اسکرپ، یک event loop برای هر تسک تمام اجراهای
+# اکتور را مدیریت می‌کند؛ فراخوانی‌های Google Sheets و دیتابیس در نخ‌های جانبی اجرا می‌شوند.
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    [اصلاح شد] معادل asyncio.to_thread برای موتور async. اتصال‌های دیتابیس Django که در نخ‌های executor باز
+    می‌شوند پس از هر فراخوانی (طبق CONN_MAX_AGE) بسته می‌شوند تا در اجرای طولانی نشت نکنند.
+    """
+    return await asyncio.to_thread(_close_connections_after, func, *args, **kwargs)
+
+
+def _close_connections_after(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def process_job_page_async(context: "TaskContext", async_apify: AsyncApifyService, job_items: list,
+                                 task_id: str, current_job_index: int, counters: dict):
+    """معادل async تابع process_job_page."""
+    new_keys = await run_in_thread(
+        context.reserve_new_links, [job.job_url for job in job_items], combination=current_job_index
+    )
+    new_jobs = []
+    scheduled_keys = set()
+    for job in job_items:
+        job_key = job.key
+        if not job_key:
+            logger.warning(f"Task [{task_id}]: Job '{job.title}' has no link and will be skipped.")
+            continue
+        if job_key not in new_keys or job_key in scheduled_keys:
+            logger.info(f"Task [{task_id}]: Job '{job.title}' already exists in the sheet. Skipping.")
+            continue
+        scheduled_keys.add(job_key)
+        new_jobs.append(job)
+
+    counters['new_jobs'] += len(new_jobs)
+    record_page_metrics(len(job_items), len(new_jobs))
+    await run_in_thread(update_combination_status, task_id, current_job_index, **counters)
+    if not new_jobs:
+        return
+
+    jobs_by_domain = {}
+    websites_by_domain = {}
+    for job in new_jobs:
+        domain = normalize_domain(job.company_website)
+        if not domain:
+            await run_in_thread(append_job_row, context, job, {}, task_id)
+            continue
+        jobs_by_domain.setdefault(domain, []).append(job)
+        websites_by_domain.setdefault(domain, job.company_website)
+
+    contact_cache = context.contact_cache
+    cached_records, domains, waiting = await run_in_thread(contact_cache.claim, list(jobs_by_domain))
+    for domain, contact_info in cached_records.items():
+        for job in jobs_by_domain[domain]:
+            await run_in_thread(append_job_row, context, job, contact_info, task_id)
+
+    batches = [domains[i:i + CONTACT_SCRAPER_BATCH_SIZE] for i in range(0, len(domains), CONTACT_SCRAPER_BATCH_SIZE)]
+    logger.info(
+        f"Task [{task_id}]: Module 2 (async): Enriching {len(new_jobs)} new jobs from {len(jobs_by_domain)} websites "
+        f"({len(cached_records)} cached, {len(waiting)} shared with other tasks) in {len(batches)} batches."
+    )
+
+    async def scrape(batch):
+        websites = [websites_by_domain[d] for d in batch]
+        if context.settings.contact_crawl_adaptive:
+            crawl = await run_in_thread(new_adaptive_crawl, context, websites)
+            return await crawl.run_async(async_apify.run_contact_detail_scraper_batch)
+        return await async_apify.run_contact_detail_scraper_batch(websites)
+
+    batch_tasks = {asyncio.create_task(scrape(batch)): batch for batch in batches}
+    shared_tasks = {asyncio.wrap_future(future): domain for domain, future in waiting.items()}
+    pending = set(batch_tasks) | set(shared_tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for finished in done:
+                if finished in shared_tasks:
+                    domain = shared_tasks[finished]
+                    try:
+                        contact_records = {domain: finished.result()}
+                    except Exception as e:
+                        logger.error(f"Task [{task_id}]: Shared contact scrape for {domain} failed: {e}. Continuing without contact info.")
+                        contact_records = {domain: {}}
+                else:
+                    contact_records = await run_in_thread(
+                        resolve_contact_batch, context, batch_tasks[finished], finished, jobs_by_domain, task_id
+                    )
+                for domain, contact_info in contact_records.items():
+                    for job in jobs_by_domain[domain]:
+                        await run_in_thread(append_job_row, context, job, contact_info, task_id)
+    finally:
+        for task in pending:
+            task.cancel()
+        for domain in domains:
+            contact_cache.fail(domain, RuntimeError("Contact scrape was abandoned."))
+
+    await run_in_thread(publish_page_stats, task_id, context)
+
+
+async def run_scraping_task_async(context: "TaskContext", async_apify: AsyncApifyService, combo: dict,
+                                  task_id: str, current_job_index: int, total_jobs: int):
+    """معادل async تابع run_scraping_task برای یک ترکیب."""
+    country, job_keyword = combo['country'], combo['job']
+    await run_in_thread(
+        update_combination_status, task_id, current_job_index, status='running', started_at=datetime.utcnow()
+    )
+    logger.info(f"Task [{task_id}]: Processing {current_job_index}/{total_jobs} (async): '{job_keyword}' in '{country}'")
+
+    incremental = combo.get('incremental', False)
+    search_url, plan = await run_in_thread(plan_search, job_keyword, country, incremental)
+    search, is_leader = search_coalescer.join(search_key(search_url, plan.max_results))
+    counters = {'scraped_jobs': 0, 'new_jobs': 0, 'shared_run': not is_leader}
+    try:
+        if is_leader:
+            pages = lead_search_async(async_apify, search_url, plan.max_results, search)
+        else:
+            logger.info(f"Task [{task_id}]: Module 1: Attached to an identical search already running in another task.")
+            pages = follow_search_async(search)
+
+        async for job_items in pages:
+            if not job_items:
+                continue
+            counters['scraped_jobs'] += len(job_items)
+            await process_job_page_async(context, async_apify, job_items, task_id, current_job_index, counters)
+
+        if counters['scraped_jobs']:
+            await run_in_thread(flush_writer, task_id, context.writer)
+            if incremental:
+                await run_in_thread(record_search_success, job_keyword, country, plan, counters['scraped_jobs'])
+        else:
+            logger.warning(f"Task [{task_id}]: Module 1: No jobs found for this query. Moving to the next item.")
+            if incremental:
+                await run_in_thread(record_search_success, job_keyword, country, plan, 0)
+        await run_in_thread(
+            update_combination_status, task_id, current_job_index,
+            status='completed', finished_at=datetime.utcnow(), **counters
+        )
+    except Exception as e:
+        logger.error(f"Task [{task_id}]: Combination '{job_keyword}' in '{country}' failed: {e}")
+        await run_in_thread(
+            update_combination_status, task_id, current_job_index,
+            status='failed', error=str(e), finished_at=datetime.utcnow()
+        )
+
+
+async def lead_search_async(async_apify: AsyncApifyService, search_url: str, max_results: int, search: SharedSearch):
+    """اجرای جستجو در event loop؛ صفحه‌ها برای تسک‌های متصل به همین جستجو هم منتشر می‌شوند."""
+    if APIFY_STREAM_RESULTS:
+        pages = async_apify.stream_linkedin_job_scraper(
+            search_url, max_results=max_results, proxy_group=SEARCH_PROXY_GROUP,
+            page_size=APIFY_STREAM_PAGE_SIZE
+        )
+    else:
+        async def single_page():
+            yield await async_apify.run_linkedin_job_scraper(
+                search_url, max_results=max_results, proxy_group=SEARCH_PROXY_GROUP
+            )
+        pages = single_page()
+
+    error = None
+    try:
+        async for items in pages:
+            # [جدید] هر صفحه بلافاصله به JobRecord تبدیل می‌شود
+            page = project_job_items(items)
+            search.publish(page)
+            yield page
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        search.finish(error)
+
+
+async def follow_search_async(search: SharedSearch):
+    """صفحه‌های جستجویی که تسک دیگری اجرا می‌کند را بدون مسدود کردن event loop می‌خواند."""
+    page_iterator = search.iter_pages()
+    while True:
+        page = await run_in_thread(next, page_iterator, None)
+        if page is None:
+            return
+        yield page
+
+
+async def _run_all_combinations_async(task_id: str, job_combinations: list, resume: bool = False):
+    total_jobs = len(job_combinations)
+    pending_indexes = await run_in_thread(start_task_status, task_id, job_combinations, resume)
+
+    # taskهای asyncio و نخ‌های to_thread context را کپی می‌کنند؛ زمان‌بندی‌ها به همین تسک نسبت داده می‌شوند
+    timings = StageTimings()
+    bind_task_timings(timings)
+    context = await run_in_thread(prepare_task_context, task_id, timings)
+    if context is None:
+        return
+    if resume:
+        await run_in_thread(restore_checkpoint, context, task_id)
+    async_apify = context.settings.async_apify_service_class(context.settings.environ["APIFY_API_TOKEN"])
+
+    combination_slots = asyncio.Semaphore(max(1, COMBINATION_MAX_WORKERS))
+
+    async def run_limited(index: int, combo: dict):
+        async with combination_slots:
+            await run_scraping_task_async(context, async_apify, combo, task_id, index, total_jobs)
+
+    await asyncio.gather(*(run_limited(index, job_combinations[index - 1]) for index in pending_indexes))
+    await run_in_thread(finish_task, task_id, context, total_jobs)
+
+
+def run_task_for_all_combinations_async(task_id: str, job_combinations: list, resume: bool = False):
+    """
+    [جدید] جایگزین async برای run_task_for_all_combinations؛ یک event loop برای کل تسک اجرا می‌کند.
+    """
+    logger.info(f"Task [{task_id}]: Starting async task runner for {len(job_combinations)} combinations.")
+    try:
+        asyncio.run(_run_all_combinations_async(task_id, job_combinations, resume))
+    finally:
+        connections.close_all()
     logger.info(f"Task [{task_id}]: All combinations have been processed. Task completed.")
 
+
+# موتور اجرای تسک‌ها بر اساس PIPELINE_ENGINE
+TASK_RUNNERS = {
+    'sync': run_task_for_all_combinations,
+    'async': run_task_for_all_combinations_async,
+}
+
+
 def cleanup_old_tasks():
     """
-    این تابع به صورت دوره‌ای اجرا شده و تسک‌های قدیمی را از حافظه پاک می‌کند تا از نشت حافظه جلوگیری شود.
+    این تابع به صورت دوره‌ای اجرا شده و تسک‌های منقضی شده را از مخزن وضعیت پاک می‌کند تا از نشت حافظه جلوگیری شود.
+    [اصلاح شد] حذف بر اساس زمان انقضای ایندکس‌شده انجام می‌شود و نیازی به پیمایش همه تسک‌ها نیست.
     """
     while True:
         try:
-            time.sleep(3600)  # هر یک ساعت یک بار اجرا می‌شود
-            
-            with tasks_lock:
-                tasks_to_delete = []
-                cleanup_threshold = datetime.utcnow() - timedelta(hours=1)
-                
-                for task_id, info in tasks_status.items():
-                    finished_at = info.get('finished_at')
-                    if finished_at and finished_at < cleanup_threshold:
-                        tasks_to_delete.append(task_id)
-                
-                if tasks_to_delete:
-                    logger.info(f"Cleaning up {len(tasks_to_delete)} old tasks.")
-                    for task_id in tasks_to_delete:
-                        del tasks_status[task_id]
+            time.sleep(TASK_STATUS_PURGE_INTERVAL)
+
+            removed = task_store.purge_expired()
+            if removed:
+                logger.info(f"Cleaning up {removed} old tasks.")
+            if checkpoint_store is not None:
+                checkpoint_store.purge_orphaned()
+            if combination_queue is not None:
+                combination_queue.purge_orphaned()
+                JobKeyReservations.purge_orphaned()
         except Exception as e:
             logger.error(f"Error during task cleanup: {e}")
 
+def enqueue_combinations(task_id: str, job_combinations: list, priority: str) -> int:
+    """
+    [جدید] ترکیب‌های تسک را در صف دیتابیسی کارگرها قرار می‌دهد و جایگاه تسک در صف را برمی‌گرداند.
+    اگر تعداد تسک‌های در انتظار به TASK_QUEUE_SIZE رسیده باشد QueueFullError پرتاب می‌شود.
+    """
+    if combination_queue.queued_task_count() >= TASK_QUEUE_SIZE:
+        raise QueueFullError(retry_after=60)
+
+    combinations = [
+        {'country': combo['country'], 'job': combo['job'], 'incremental': combo.get('incremental', False),
+         'status': 'queued'}
+        for combo in job_combinations
+    ]
+    task_store.update(task_id, lambda task: task.update(combinations=combinations, completed_combinations=0))
+    combination_queue.enqueue(task_id, job_combinations, priority=TaskExecutor.PRIORITIES[priority])
+    return combination_queue.queue_position(task_id)
+
+
+def current_queue_position(task_id: str, task_info: dict) -> Optional[int]:
+    """جایگاه تسک در صف همین پروسه یا صف دیتابیسی، وگرنه آخرین جایگاه ثبت شده."""
+    if combination_queue is not None:
+        return combination_queue.queue_position(task_id)
+    return task_executor.queue_position(task_id) or task_info.get('queue_position')
+
+
 class ScrapeJobsView(APIView):
     """
     این View درخواست POST را برای شروع فرآیند اسکرپینگ دریافت می‌کند.
@@ -233,6 +1344,17 @@ class ScrapeJobsView(APIView):
     def post(self, request, *args, **kwargs):
         countries = request.data.get('country')
         jobs = request.data.get('job')
+        priority = request.data.get('priority') or 'normal'
+        # [جدید] حالت افزایشی را می‌توان برای هر درخواست جداگانه فعال یا غیرفعال کرد
+        incremental = request.data.get('incremental', INCREMENTAL_SEARCH)
+        if isinstance(incremental, str):
+            incremental = incremental.lower() in ('true', '1', 't')
+
+        if priority not in TaskExecutor.PRIORITIES:
+            return Response(
+                {"error": f"'priority' must be one of: {', '.join(TaskExecutor.PRIORITIES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         if not countries or not jobs:
             return Response(
@@ -245,7 +1367,9 @@ class ScrapeJobsView(APIView):
         if isinstance(jobs, str):
             jobs = [jobs]
 
-        job_combinations = [{'country': c, 'job': j} for c in countries for j in jobs if c and j]
+        job_combinations = [
+            {'country': c, 'job': j, 'incremental': bool(incremental)} for c in countries for j in jobs if c and j
+        ]
 
         if not job_combinations:
             return Response(
@@ -254,43 +1378,366 @@ class ScrapeJobsView(APIView):
             )
 
         task_id = str(uuid.uuid4())
-        with tasks_lock:
-            tasks_status[task_id] = {
-                'status': 'queued',
-                'progress': 'Task is waiting to be processed.',
-                'total_combinations': len(job_combinations),
-                'started_at': datetime.utcnow(),
-                'finished_at': None
-            }
+        task_store.create(task_id, {
+            'status': 'queued',
+            'progress': 'Task is waiting to be processed.',
+            'total_combinations': len(job_combinations),
+            'rows_flushed': 0,
+            'rows_pending': 0,
+            'priority': priority,
+            # [جدید] درخواست اصلی و پروسه صاحب صف برای ادامه تسک پس از راه‌اندازی مجدد نگهداری می‌شوند
+            'job_combinations': job_combinations,
+            'runner': runner_identity(),
+            'started_at': datetime.utcnow(),
+            'finished_at': None
+        })
+
+        # [جدید] به جای ساختن نخ جدید، تسک در صف محدود Worker Pool قرار می‌گیرد؛
+        # [جدید] در حالت صف دیتابیسی ترکیب‌ها فقط در صف کارگرها قرار می‌گیرند
+        try:
+            if combination_queue is not None:
+                queue_position = enqueue_combinations(task_id, job_combinations, priority)
+            else:
+                queue_position = task_executor.submit(
+                    task_id, TASK_RUNNERS[PIPELINE_ENGINE], job_combinations, priority=priority
+                )
+        except QueueFullError as e:
+            task_store.delete(task_id)
+            logger.warning(f"Rejected request for {len(job_combinations)} combinations: task queue is full.")
+            metrics.inc('scraper_tasks_rejected_total', help_text='Requests rejected because the task queue was full.')
+            return Response(
+                {"error": "Too many scraping tasks are queued. Please retry later.", "retry_after": e.retry_after},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(e.retry_after)}
+            )
         logger.info(f"New request received. Task ID [{task_id}] created for {len(job_combinations)} combinations.")
 
-        task_thread = threading.Thread(target=run_task_for_all_combinations, args=(task_id, job_combinations))
-        task_thread.start()
+        return Response(
+            {
+                "message": "Your request has been successfully submitted. The scraping process will run in the background.",
+                "task_id": task_id,
+                "queue_position": queue_position
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ScrapeResumeView(APIView):
+    """
+    [جدید] ادامه یک تسک ناتمام (مثلاً پس از راه‌اندازی مجدد سرور) از آخرین checkpoint: ترکیب‌های تمام شده
+    دوباره اجرا نمی‌شوند و ردیف‌هایی که اطلاعات تماس آن‌ها استخراج شده بدون اسکرپ مجدد نوشته می‌شوند.
+    تسکی که هنوز توسط پروسه زنده‌ای اجرا می‌شود ادامه داده نمی‌شود، مگر با "force": true برای پروسه‌ای
+    روی میزبان دیگر که وضعیت آن از اینجا قابل تشخیص نیست.
+    [جدید] در حالت صف دیتابیسی، ترکیب‌های کارگرهای از کار افتاده خودکار دوباره برداشته می‌شوند؛ اینجا فقط
+    ترکیب‌های ناموفق دوباره در صف قرار می‌گیرند.
+    """
+    def post(self, request, task_id, *args, **kwargs):
+        if combination_queue is not None:
+            return self.requeue_failed(task_id)
+
+        if checkpoint_store is None:
+            return Response(
+                {"error": "Resuming tasks requires TASK_STATUS_BACKEND=database and TASK_CHECKPOINTS enabled."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        task_info = task_store.get(task_id)
+        if not task_info:
+            return Response({"error": "Task ID not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        job_combinations = task_info.get('job_combinations')
+        if not job_combinations:
+            return Response(
+                {"error": "This task was created without checkpoints and cannot be resumed."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if task_executor.is_active(task_id):
+            return Response(
+                {"error": "Task is already queued or running."}, status=status.HTTP_409_CONFLICT
+            )
+
+        force = request.data.get('force', False)
+        if isinstance(force, str):
+            force = force.lower() in ('true', '1', 't')
+        if task_info['status'] in ('queued', 'running', 'finalizing'):
+            alive = runner_is_alive(task_info.get('runner'))
+            if alive or (alive is None and not force):
+                return Response(
+                    {"error": "Task is still owned by another server process. "
+                              "Pass \"force\": true if that process is known to be gone."},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        completed = sum(1 for c in task_info.get('combinations') or [] if c.get('status') == 'completed')
+        pending_rows = checkpoint_store.pending_count(task_id)
+        if completed == len(job_combinations) and not pending_rows:
+            return Response({"error": "Task has already completed."}, status=status.HTTP_409_CONFLICT)
+
+        previous = {key: task_info.get(key) for key in ('status', 'progress', 'runner')}
+        task_store.update(task_id, lambda task: task.update(
+            status='queued', progress='Task is waiting to be resumed.', runner=runner_identity()
+        ))
+        try:
+            queue_position = task_executor.submit(
+                task_id, TASK_RUNNERS[PIPELINE_ENGINE], job_combinations, True,
+                priority=task_info.get('priority') or 'normal'
+            )
+        except QueueFullError as e:
+            task_store.update(task_id, lambda task: task.update(previous))
+            metrics.inc('scraper_tasks_rejected_total', help_text='Requests rejected because the task queue was full.')
+            return Response(
+                {"error": "Too many scraping tasks are queued. Please retry later.", "retry_after": e.retry_after},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        logger.info(
+            f"Task [{task_id}] resumed: {completed}/{len(job_combinations)} combinations already completed, "
+            f"{pending_rows} checkpointed rows pending."
+        )
+
+        return Response(
+            {
+                "message": "The task will continue from its last checkpoint.",
+                "task_id": task_id,
+                "queue_position": queue_position,
+                "completed_combinations": completed,
+                "pending_rows": pending_rows,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+    def requeue_failed(self, task_id: str):
+        task_info = task_store.get(task_id)
+        if not task_info:
+            return Response({"error": "Task ID not found."}, status=status.HTTP_404_NOT_FOUND)
+        if combination_queue.has_open(task_id):
+            return Response(
+                {"error": "Task still has queued or running combinations. "
+                          "Combinations of stopped workers are reclaimed automatically."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        requeued = combination_queue.requeue_failed(task_id)
+        if not requeued:
+            return Response({"error": "Task has no failed combinations to retry."}, status=status.HTTP_409_CONFLICT)
 
+        def reopen(task: dict):
+            for combination in task.get('combinations') or []:
+                if combination.get('status') == 'failed':
+                    combination.update(status='queued', error=None, finished_at=None)
+            task['completed_combinations'] = sum(
+                1 for c in task.get('combinations') or [] if c['status'] == 'completed'
+            )
+            task.update(status='queued', progress='Failed combinations are waiting for a worker.',
+                        error=None, finished_at=None)
+
+        task_store.update(task_id, reopen)
+        logger.info(f"Task [{task_id}]: Requeued {requeued} failed combinations.")
         return Response(
             {
-                "message": "Your request has been successfully submitted. The scraping process has started in the background.",
-                "task_id": task_id
+                "message": "Failed combinations have been queued again.",
+                "task_id": task_id,
+                "queue_position": combination_queue.queue_position(task_id),
+                "requeued_combinations": requeued,
             },
             status=status.HTTP_202_ACCEPTED
         )
 
 
+def parse_etag_version(header_value: Optional[str]) -> Optional[int]:
+    """شماره نسخه را از هدر If-None-Match (مثلاً "12" یا W/"12") استخراج می‌کند."""
+    if not header_value:
+        return None
+    value = header_value.split(',')[0].strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    value = value.strip('"')
+    return int(value) if value.isdigit() else None
+
+
 class ScrapeStatusView(APIView):
     """
     این View به کلاینت‌ها اجازه می‌دهد تا وضعیت یک تسک را با استفاده از شناسه آن بررسی کنند.
+    [جدید] پاسخ شامل ETag (شماره نسخه وضعیت) است. اگر If-None-Match با نسخه فعلی برابر باشد،
+    با پارامتر wait (ثانیه) درخواست تا تغییر بعدی نگه داشته می‌شود (long-poll) و در غیر این صورت 304 برمی‌گردد.
     """
     def get(self, request, task_id, *args, **kwargs):
-        with tasks_lock:
-            task_info = tasks_status.get(task_id)
+        known_version = parse_etag_version(request.headers.get('If-None-Match'))
+        if known_version is None and request.query_params.get('version', '').isdigit():
+            known_version = int(request.query_params['version'])
+
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), TASK_STATUS_LONG_POLL_TIMEOUT)
+        except ValueError:
+            return Response({"error": "'wait' must be a number of seconds."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if known_version is not None and wait > 0:
+            if not status_waiter_slots.acquire(blocking=False):
+                return status_waiters_busy_response()
+            try:
+                task_info, version = task_store.wait_for_change(task_id, known_version, wait)
+            finally:
+                status_waiter_slots.release()
+        else:
+            task_info, version = task_store.get_versioned(task_id)
 
         if not task_info:
             return Response(
                 {"error": "Task ID not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        return Response(task_info.copy(), status=status.HTTP_200_OK)
+
+        headers = {'ETag': f'"{version}"', 'Cache-Control': 'no-cache'}
+        if version == known_version:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if task_info['status'] == 'queued':
+            # اگر تسک در صف همین پروسه (یا صف دیتابیسی) باشد جایگاه دقیق آن، وگرنه آخرین جایگاه ثبت شده گزارش می‌شود
+            task_info['queue_position'] = current_queue_position(task_id, task_info)
+        task_info['version'] = version
+
+        return Response(task_info, status=status.HTTP_200_OK, headers=headers)
+
+
+class ScrapeStatusStreamView(APIView):
+    """
+    [جدید] استریم وضعیت تسک با Server-Sent Events. با هر تغییر وضعیت (پیشرفت ترکیب‌ها، ردیف‌های ثبت شده،
+    خطاها) یک رویداد status ارسال می‌شود و پس از پایان تسک رویداد done و بسته شدن اتصال.
+    کلاینت می‌تواند با هدر Last-Event-ID (شماره نسخه) از همان نقطه ادامه دهد.
+    """
+    def get(self, request, task_id, *args, **kwargs):
+        task_info, version = task_store.get_versioned(task_id)
+        if not task_info:
+            return Response({"error": "Task ID not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if not status_waiter_slots.acquire(blocking=False):
+            return status_waiters_busy_response()
+        last_version = parse_etag_version(request.headers.get('Last-Event-ID'))
+        response = StreamingHttpResponse(
+            ReleasingStream(stream_task_events(task_id, last_version), status_waiter_slots.release),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # غیرفعال کردن بافر پراکسی‌هایی مانند nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def status_waiters_busy_response() -> Response:
+    """[اصلاح شد] پاسخ 503 زمانی که تمام سهمیه اتصال‌های منتظر وضعیت این پروسه در حال استفاده است."""
+    return Response(
+        {"error": "Too many open status streams. Retry later or poll without 'wait'."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(int(TASK_STATUS_STREAM_KEEPALIVE))},
+    )
+
+
+class ReleasingStream:
+    """
+    [اصلاح شد] iterator محتوای StreamingHttpResponse که با بسته شدن پاسخ (پایان استریم یا قطع اتصال کلاینت)
+    سهمیه اتصال را آزاد می‌کند، حتی اگر استریم هرگز شروع نشده باشد.
+    """
+
+    def __init__(self, iterator, release):
+        self._iterator = iterator
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        try:
+            self._iterator.close()
+        finally:
+            with self._lock:
+                released, self._released = self._released, True
+            if not released:
+                self._release()
+
+
+def stream_task_events(task_id: str, last_version: Optional[int]):
+    """رویدادهای SSE وضعیت یک تسک را تا پایان تسک یا گذشتن TASK_STATUS_STREAM_MAX_DURATION تولید می‌کند."""
+    deadline = time.monotonic() + TASK_STATUS_STREAM_MAX_DURATION
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            task_info, version = task_store.wait_for_change(
+                task_id, last_version, min(TASK_STATUS_STREAM_KEEPALIVE, remaining)
+            )
+            if task_info is None:
+                yield "event: error\ndata: {\"error\": \"Task ID not found.\"}\n\n"
+                return
+            if version == last_version:
+                # خط توضیح برای زنده نگه داشتن اتصال
+                yield ": keep-alive\n\n"
+                continue
+
+            last_version = version
+            if task_info['status'] == 'queued':
+                task_info['queue_position'] = current_queue_position(task_id, task_info)
+            task_info['version'] = version
+            payload = json.dumps(task_info, cls=DjangoJSONEncoder)
+            yield f"id: {version}\nevent: status\ndata: {payload}\n\n"
+            if task_info['status'] in ('completed', 'failed'):
+                yield f"id: {version}\nevent: done\ndata: {payload}\n\n"
+                return
+    finally:
+        connections.close_all()
+
+
+class ApifyWebhookView(APIView):
+    """
+    [جدید] مقصد وب‌هوک پایان اجرای اکتورها (حالت APIFY_WEBHOOK_URL). مرحله‌ای از پایپ‌لاین که منتظر این اجراست
+    ادامه پیدا می‌کند. درخواست با توکن موجود در آدرس وب‌هوک احراز هویت می‌شود.
+    """
+    def post(self, request, *args, **kwargs):
+        if not hmac.compare_digest(request.query_params.get('token', ''), webhook_token()):
+            return Response({"error": "Invalid webhook token."}, status=status.HTTP_403_FORBIDDEN)
+
+        run = request.data.get('resource') or {}
+        run_id = run.get('id') or (request.data.get('eventData') or {}).get('actorRunId')
+        if not run_id:
+            return Response({"error": "Webhook payload does not contain a run ID."}, status=status.HTTP_400_BAD_REQUEST)
+
+        matched = get_actor_run_waiter().complete(run_id, run)
+        logger.info(f"Actor run {run_id} finished ({request.data.get('eventType')}); waiting stage found: {matched}.")
+        metrics.inc('scraper_actor_webhooks_total', labels={'matched': str(matched).lower()},
+                    help_text='Actor completion webhooks received.')
+        return Response({"matched": matched}, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    [جدید] متریک‌های تجمیعی پروسه (هیستوگرام زمان مراحل و شمارنده‌ها) با فرمت متنی Prometheus.
+    """
+    def get(self, request, *args, **kwargs):
+        queue_stats = task_executor.stats()
+        quota = get_sheets_quota().snapshot()
+        gauges = {}
+        if combination_queue is not None:
+            combination_stats = combination_queue.stats()
+            gauges['scraper_combination_queue_depth'] = combination_stats['queued']
+            gauges['scraper_combinations_running'] = combination_stats['running']
+        body = metrics.render(gauges={
+            **gauges,
+            'scraper_sheets_read_quota_utilization': quota['read']['utilization'],
+            'scraper_sheets_write_quota_utilization': quota['write']['utilization'],
+            'scraper_task_queue_depth': queue_stats['queued'],
+            'scraper_tasks_running': queue_stats['running'],
+            'scraper_searches_inflight': search_coalescer.inflight_count(),
+            'scraper_actor_runs_awaiting_webhook': get_actor_run_waiter().pending_count(),
+            'scraper_sheets_feed_backlog': SheetsFeeder.total_backlog(),
+        })
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # اجرای نخ پاکسازی در پس‌زمینه به صورت دائم
 cleanup_thread = threading.Thread(target=cleanup_old_tasks, daemon=True)